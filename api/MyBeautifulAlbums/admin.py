@@ -0,0 +1,39 @@
+"""Shared admin building blocks for the large catalog and user tables."""
+
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+# Changelists count at most this many rows, and show "10,000+" above it.
+ESTIMATED_COUNT_THRESHOLD = 10_000
+
+
+class CappedCount(int):
+    """A row count that hit the cap, shown as e.g. "10,000+"."""
+
+    def __str__(self) -> str:
+        return f"{ESTIMATED_COUNT_THRESHOLD:,}+"
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids an unbounded ``COUNT(*)`` on large tables.
+
+    At most ESTIMATED_COUNT_THRESHOLD + 1 rows are counted, so the page links
+    end at rows that exist instead of at an estimate of the table size.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        count = self.object_list[: ESTIMATED_COUNT_THRESHOLD + 1].count()
+        if count > ESTIMATED_COUNT_THRESHOLD:
+            return CappedCount(count)
+        return count
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """ModelAdmin for large tables: capped counts and no full result count."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
@@ -0,0 +1,15 @@
+"""
+libSQL backend with a real connection health check, so persistent
+connections (CONN_MAX_AGE) can be reused safely with CONN_HEALTH_CHECKS.
+"""
+
+from libsql.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def is_usable(self):
+        try:
+            self.connection.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
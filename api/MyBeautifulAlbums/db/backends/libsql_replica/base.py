@@ -0,0 +1,109 @@
+"""
+libSQL embedded replica backend.
+
+Reads are served from a local SQLite file that is kept in sync with the
+Turso primary, while writes are forwarded to the primary by libSQL itself.
+"""
+
+from collections.abc import Mapping
+
+import libsql_experimental
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.asyncio import async_unsafe
+from django.utils.regex_helper import _lazy_re_compile
+
+from MyBeautifulAlbums.db.backends.libsql import base
+from libsql.db.backends.sqlite3.base import FORMAT_QMARK_REGEX
+from libsql.db.backends.sqlite3.operations import DatabaseOperations
+
+NAMED_PARAM_REGEX = _lazy_re_compile(r"%\((\w+)\)s")
+
+
+class ReplicaCursorWrapper:
+    """
+    Convert Django's "format" placeholders for the libSQL cursor.
+
+    The cursor only binds tuples, so lists are converted and named
+    parameters are bound by position.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor.fetchone, None)
+
+    def execute(self, query, params=None):
+        if params is None:
+            return self.cursor.execute(query)
+        query, convert = self.convert_query(query, params)
+        return self.cursor.execute(query, convert(params))
+
+    def executemany(self, query, param_list):
+        param_list = list(param_list)
+        if not param_list:
+            return self.cursor
+        query, convert = self.convert_query(query, param_list[0])
+        return self.cursor.executemany(
+            query, [convert(params) for params in param_list]
+        )
+
+    def convert_query(self, query, params):
+        """Return the query with "?" placeholders and a converter of its params."""
+        if isinstance(params, Mapping):
+            names = NAMED_PARAM_REGEX.findall(query)
+            query = NAMED_PARAM_REGEX.sub("?", query).replace("%%", "%")
+            return query, lambda params: tuple(params[name] for name in names)
+        return FORMAT_QMARK_REGEX.sub("?", query).replace("%%", "%"), tuple
+
+
+class ReplicaDatabaseOperations(DatabaseOperations):
+    def _quote_params_for_last_executed_query(self, params):
+        return super()._quote_params_for_last_executed_query(tuple(params))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    display_name = "libSQL embedded replica"
+    ops_class = ReplicaDatabaseOperations
+
+    def get_connection_params(self):
+        settings_dict = self.settings_dict
+        if not settings_dict["NAME"]:
+            raise ImproperlyConfigured(
+                "settings.DATABASES is improperly configured. "
+                "Please supply the NAME value."
+            )
+        options = settings_dict["OPTIONS"]
+        return {
+            "database": str(settings_dict["NAME"]),
+            "sync_url": options.get("sync_url"),
+            "sync_interval": options.get("sync_interval"),
+            "auth_token": options.get("auth_token") or "",
+            "isolation_level": None,
+            "check_same_thread": False,
+        }
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        conn = libsql_experimental.connect(**conn_params)
+        if conn_params["sync_url"]:
+            conn.sync()
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def create_cursor(self, name=None):
+        return ReplicaCursorWrapper(self.connection.cursor())
+
+    def _set_autocommit(self, autocommit):
+        # Connections are opened in autocommit mode and transactions are
+        # started explicitly, the same way Django handles sqlite3.
+        pass
+
+    def sync(self):
+        """Pull the latest frames from the primary into the local file."""
+        self.ensure_connection()
+        if self.get_connection_params()["sync_url"]:
+            self.connection.sync()
@@ -0,0 +1,124 @@
+"""
+Read/write splitting between the ``default`` primary and an optional
+``replica`` database alias.
+
+Catalog and profile reads of a request go to the replica. Writes, and every
+read that follows a write in the same request, go to the primary. Users who
+wrote recently stay pinned to the primary for READ_REPLICA_STICKY_SECONDS so
+they always read their own writes despite replication lag; the pin is kept in
+the shared cache so every worker process honours it. Work outside a request,
+like background syncs, timers and management commands, always uses the
+primary.
+"""
+
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = "default"
+REPLICA = "replica"
+REPLICA_MODELS = {
+    "albums.album",
+    "albums.albumneighbour",
+    "albums.artist",
+    "albums.genre",
+    "albums.record",
+    "albums.track",
+    "user.userprofile",
+}
+
+# None outside a request, False for a request reading from the replica.
+_use_primary: ContextVar[Optional[bool]] = ContextVar("use_primary", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA in connections
+
+
+def pin_to_primary() -> None:
+    """Send every following read of the current request to the primary."""
+    if _use_primary.get() is not None:
+        _use_primary.set(True)
+
+
+def _sticky_key(user_id) -> str:
+    return f"db-routing:wrote:{user_id}"
+
+
+def mark_user_write(user_id) -> None:
+    """Remember that the user just wrote, so their next reads use the primary."""
+    cache.set(
+        _sticky_key(user_id), True, getattr(settings, "READ_REPLICA_STICKY_SECONDS", 10)
+    )
+
+
+def user_recently_wrote(user_id) -> bool:
+    return cache.get(_sticky_key(user_id), False)
+
+
+class ReadReplicaRouter:
+    """Route catalog and profile reads to the replica when one is configured."""
+
+    def db_for_read(self, model, **hints):
+        if not replica_configured() or _use_primary.get() is not False:
+            return PRIMARY
+        # Not label_lower: the database cache routes a stand-in with bare Options.
+        if f"{model._meta.app_label}.{model._meta.model_name}" in REPLICA_MODELS:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReadReplicaMiddleware:
+    """Start every request routed to the replica."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_primary.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+
+class ReadYourWritesMixin:
+    """
+    Pin unsafe requests and requests of users who wrote recently to the
+    primary, and record successful unsafe requests as writes. Without a
+    replica there is nothing to pin, so the shared cache is not consulted.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not replica_configured():
+            return
+        if request.method not in SAFE_METHODS or (
+            request.user.is_authenticated and user_recently_wrote(request.user.pk)
+        ):
+            pin_to_primary()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            replica_configured()
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and getattr(request, "user", None) is not None
+            and request.user.is_authenticated
+        ):
+            mark_user_write(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
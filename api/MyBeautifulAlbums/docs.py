@@ -0,0 +1,41 @@
+"""
+Schema and docs views that stay out of worker boot.
+
+drf_spectacular and its YAML and schema generation modules are imported on
+the first docs request instead of at URLconf import. When
+OPENAPI_SCHEMA_FILE points at a schema built ahead of time with
+``manage.py spectacular --file``, the schema endpoint serves that file and
+never generates one.
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.module_loading import import_string
+
+
+def lazy_view(view_path: str, **initkwargs):
+    """Return a view that imports and builds ``view_path`` on its first request."""
+    view = None
+
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return dispatch
+
+
+generate_schema = lazy_view("drf_spectacular.views.SpectacularAPIView")
+
+
+def schema_view(request, *args, **kwargs):
+    """Serve the prebuilt OpenAPI schema, or generate it when there is none."""
+    schema_file = getattr(settings, "OPENAPI_SCHEMA_FILE", None)
+    if schema_file and Path(schema_file).is_file():
+        return FileResponse(
+            open(schema_file, "rb"), content_type="application/vnd.oai.openapi"
+        )
+    return generate_schema(request, *args, **kwargs)
@@ -0,0 +1,374 @@
+"""
+Offline fake of the Spotify Web API and accounts service.
+
+A plain WSGI app serving deterministic generated fixtures, for integration
+and load tests of the sync and ingest paths. Point SPOTIFY_API_URL at
+``http://<host>:<port>/v1`` and SPOTIFY_ACCOUNTS_URL at ``http://<host>:<port>``
+and run it with ``manage.py fake_spotify``.
+
+Served endpoints:
+
+- ``GET /authorize`` redirects to ``redirect_uri`` with ``code=<user>``; the
+  ``user`` query parameter picks the fake user (default "listener").
+- ``POST /api/token`` for the authorization_code, refresh_token and
+  client_credentials grants. Access tokens carry the user name.
+- ``GET /v1/me`` for the user of the bearer token.
+- ``GET /v1/me/albums`` pages through the user's saved albums with
+  ``limit`` (max 50) and ``offset``.
+- ``GET /v1/albums/<id>`` and ``GET /v1/albums?ids=`` (max 20 IDs).
+
+Every library draws ``library_size`` albums from a shared catalog of
+``catalog_size`` albums, so users overlap the way real libraries do.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+ALBUM_ID_PREFIX = "fakealbum"
+ARTIST_ID_PREFIX = "fakeartist"
+TOKEN_PREFIX = "fake-access."
+REFRESH_PREFIX = "fake-refresh."
+GENRES = ["rock", "pop", "jazz", "hip hop", "electronic", "folk", "metal", "soul"]
+
+
+@dataclass
+class FakeSpotifyConfig:
+    catalog_size: int = 5000
+    library_size: int = 200
+    tracks_per_album: int = 12
+    artists: int = 800
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    rate_limit_ratio: float = 0.0
+    retry_after: int = 1
+    token_expires_in: int = 3600
+    seed: int = 0
+
+
+def _spotify_id(prefix: str, number: int) -> str:
+    return f"{prefix}{number:0{22 - len(prefix)}d}"
+
+
+def _number(spotify_id: str, prefix: str) -> int | None:
+    if not spotify_id.startswith(prefix):
+        return None
+    try:
+        return int(spotify_id[len(prefix) :])
+    except ValueError:
+        return None
+
+
+def _artist(number: int) -> dict:
+    spotify_id = _spotify_id(ARTIST_ID_PREFIX, number)
+    return {
+        "id": spotify_id,
+        "name": f"Fake Artist {number}",
+        "type": "artist",
+        "uri": f"spotify:artist:{spotify_id}",
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{spotify_id}"},
+    }
+
+
+class FakeSpotify:
+    """WSGI app emulating the parts of Spotify this project calls."""
+
+    def __init__(self, config: FakeSpotifyConfig | None = None):
+        self.config = config or FakeSpotifyConfig()
+        self.random = random.Random(self.config.seed)
+        self.random_lock = threading.Lock()
+        self.album = lru_cache(maxsize=4096)(self._build_album)
+        self.requests = 0
+        self.rate_limited = 0
+
+    def _build_album(self, number: int) -> dict:
+        config = self.config
+        spotify_id = _spotify_id(ALBUM_ID_PREFIX, number)
+        artists = [_artist(number % config.artists)]
+        if number % 7 == 0:
+            artists.append(_artist((number * 31 + 1) % config.artists))
+        tracks = [
+            {
+                "id": _spotify_id("faketrack", number * 100 + position),
+                "name": f"Track {position} of Fake Album {number}",
+                "artists": artists,
+                "duration_ms": 120_000
+                + (number * 7919 + position * 104_729) % 240_000,
+                "track_number": position,
+                "disc_number": 1,
+                "explicit": (number + position) % 5 == 0,
+                "type": "track",
+                "external_urls": {
+                    "spotify": "https://open.spotify.com/track/"
+                    + _spotify_id("faketrack", number * 100 + position)
+                },
+            }
+            for position in range(1, config.tracks_per_album + 1)
+        ]
+        return {
+            "id": spotify_id,
+            "album_type": "album",
+            "name": f"Fake Album {number}",
+            "release_date": f"{1960 + number % 65}-01-01",
+            "release_date_precision": "day",
+            "images": [
+                {
+                    "url": f"https://i.scdn.co/image/{spotify_id}-{size}",
+                    "width": size,
+                    "height": size,
+                }
+                for size in (640, 300, 64)
+            ],
+            "external_urls": {
+                "spotify": f"https://open.spotify.com/album/{spotify_id}"
+            },
+            "copyrights": [
+                {"text": f"(C) {1960 + number % 65} Fake Records", "type": "C"}
+            ],
+            "label": "Fake Records",
+            "popularity": number % 101,
+            "genres": sorted(
+                {GENRES[number % len(GENRES)], GENRES[(number // 3) % len(GENRES)]}
+            ),
+            "artists": artists,
+            "total_tracks": len(tracks),
+            "tracks": {
+                "href": None,
+                "items": tracks,
+                "limit": 50,
+                "next": None,
+                "offset": 0,
+                "previous": None,
+                "total": len(tracks),
+            },
+        }
+
+    def library(self, user: str) -> list:
+        """Return the album numbers saved by ``user``."""
+        config = self.config
+        start = int(hashlib.sha1(user.encode()).hexdigest(), 16) % config.catalog_size
+        size = min(config.library_size, config.catalog_size)
+        return [(start + i * 7) % config.catalog_size for i in range(size)]
+
+    # WSGI plumbing
+
+    def __call__(self, environ, start_response):
+        self.requests += 1
+        config = self.config
+        if config.latency_ms or config.jitter_ms:
+            with self.random_lock:
+                jitter = self.random.uniform(0, config.jitter_ms)
+            time.sleep((config.latency_ms + jitter) / 1000)
+
+        if config.rate_limit_ratio:
+            with self.random_lock:
+                limited = self.random.random() < config.rate_limit_ratio
+            if limited:
+                self.rate_limited += 1
+                return self._json(
+                    start_response,
+                    429,
+                    {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                    [("Retry-After", str(config.retry_after))],
+                )
+
+        method = environ["REQUEST_METHOD"]
+        path = environ.get("PATH_INFO", "")
+        query = {
+            key: values[-1]
+            for key, values in parse_qs(environ.get("QUERY_STRING", "")).items()
+        }
+
+        if path == "/authorize" and method == "GET":
+            return self.authorize(start_response, query)
+        if path == "/api/token" and method == "POST":
+            return self.token(environ, start_response)
+        if not path.startswith("/v1/") or method != "GET":
+            return self._error(start_response, 404, "Service not found")
+
+        user = self._bearer_user(environ)
+        if user is None:
+            return self._error(start_response, 401, "Invalid access token")
+        if path == "/v1/me":
+            return self.me(start_response, user)
+        if path == "/v1/me/albums":
+            return self.saved_albums(environ, start_response, user, query)
+        if path == "/v1/albums":
+            return self.several_albums(start_response, query)
+        if path.startswith("/v1/albums/"):
+            return self.one_album(start_response, path[len("/v1/albums/") :])
+        return self._error(start_response, 404, "Service not found")
+
+    def _json(self, start_response, status: int, data, headers=()):
+        body = json.dumps(data).encode()
+        start_response(
+            f"{status} {'OK' if status < 400 else 'Error'}",
+            [
+                ("Content-Type", "application/json; charset=utf-8"),
+                ("Content-Length", str(len(body))),
+                *headers,
+            ],
+        )
+        return [body]
+
+    def _error(self, start_response, status: int, message: str):
+        return self._json(
+            start_response, status, {"error": {"status": status, "message": message}}
+        )
+
+    def _bearer_user(self, environ) -> str | None:
+        authorization = environ.get("HTTP_AUTHORIZATION", "")
+        token = authorization.removeprefix("Bearer ")
+        if not token.startswith(TOKEN_PREFIX):
+            return None
+        return token[len(TOKEN_PREFIX) :].rsplit(".", 1)[0]
+
+    def _tokens(self, user: str) -> dict:
+        return {
+            "access_token": f"{TOKEN_PREFIX}{user}.{time.time_ns()}",
+            "token_type": "Bearer",
+            "expires_in": self.config.token_expires_in,
+            "refresh_token": f"{REFRESH_PREFIX}{user}",
+            "scope": "user-library-read user-read-email user-read-private",
+        }
+
+    # Endpoints
+
+    def authorize(self, start_response, query):
+        redirect_uri = query.get("redirect_uri")
+        if not redirect_uri:
+            return self._error(start_response, 400, "Missing redirect_uri")
+        code = urlencode({"code": query.get("user", "listener")})
+        separator = "&" if "?" in redirect_uri else "?"
+        location = f"{redirect_uri}{separator}{code}"
+        start_response("302 Found", [("Location", location)])
+        return [b""]
+
+    def token(self, environ, start_response):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        form = {
+            key: values[-1]
+            for key, values in parse_qs(
+                environ["wsgi.input"].read(length).decode()
+            ).items()
+        }
+        grant_type = form.get("grant_type")
+        if grant_type == "authorization_code" and form.get("code"):
+            return self._json(start_response, 200, self._tokens(form["code"]))
+        if grant_type == "refresh_token" and form.get("refresh_token", "").startswith(
+            REFRESH_PREFIX
+        ):
+            tokens = self._tokens(form["refresh_token"][len(REFRESH_PREFIX) :])
+            del tokens["refresh_token"]
+            return self._json(start_response, 200, tokens)
+        if grant_type == "client_credentials":
+            tokens = self._tokens("app")
+            del tokens["refresh_token"], tokens["scope"]
+            return self._json(start_response, 200, tokens)
+        return self._json(start_response, 400, {"error": "invalid_grant"})
+
+    def me(self, start_response, user: str):
+        return self._json(
+            start_response,
+            200,
+            {
+                "id": user,
+                "display_name": user.title(),
+                "email": f"{user}@example.com",
+                "type": "user",
+                "images": [
+                    {"url": f"https://i.scdn.co/image/{user}-{size}", "width": size}
+                    for size in (64, 300)
+                ],
+                "external_urls": {"spotify": f"https://open.spotify.com/user/{user}"},
+            },
+        )
+
+    def saved_albums(self, environ, start_response, user: str, query):
+        try:
+            limit = int(query.get("limit", 20))
+            offset = int(query.get("offset", 0))
+        except ValueError:
+            return self._error(start_response, 400, "Invalid limit or offset")
+        if not 1 <= limit <= 50 or offset < 0:
+            return self._error(start_response, 400, "Invalid limit or offset")
+
+        library = self.library(user)
+        base = (
+            f"{environ['wsgi.url_scheme']}://{environ['HTTP_HOST']}/v1/me/albums"
+            if environ.get("HTTP_HOST")
+            else "/v1/me/albums"
+        )
+
+        def page_url(page_offset: int) -> str:
+            return f"{base}?{urlencode({'limit': limit, 'offset': page_offset})}"
+
+        return self._json(
+            start_response,
+            200,
+            {
+                "href": page_url(offset),
+                "items": [
+                    {"added_at": "2024-01-01T00:00:00Z", "album": self.album(number)}
+                    for number in library[offset : offset + limit]
+                ],
+                "limit": limit,
+                "next": (
+                    page_url(offset + limit) if offset + limit < len(library) else None
+                ),
+                "offset": offset,
+                "previous": page_url(max(offset - limit, 0)) if offset else None,
+                "total": len(library),
+            },
+        )
+
+    def _catalog_album(self, spotify_id: str) -> dict | None:
+        number = _number(spotify_id, ALBUM_ID_PREFIX)
+        if number is None or not 0 <= number < self.config.catalog_size:
+            return None
+        return self.album(number)
+
+    def one_album(self, start_response, spotify_id: str):
+        album = self._catalog_album(spotify_id)
+        if album is None:
+            return self._error(start_response, 404, "Non existing id")
+        return self._json(start_response, 200, album)
+
+    def several_albums(self, start_response, query):
+        ids = [album_id for album_id in query.get("ids", "").split(",") if album_id]
+        if not 1 <= len(ids) <= 20:
+            return self._error(start_response, 400, "Invalid ids")
+        return self._json(
+            start_response,
+            200,
+            {"albums": [self._catalog_album(spotify_id) for spotify_id in ids]},
+        )
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def make_fake_spotify_server(
+    host: str = "127.0.0.1", port: int = 0, config: FakeSpotifyConfig | None = None
+) -> WSGIServer:
+    """Return a threaded server for the fake; port 0 picks a free port."""
+    return make_server(
+        host,
+        port,
+        FakeSpotify(config),
+        server_class=ThreadingWSGIServer,
+        handler_class=_QuietHandler,
+    )
@@ -0,0 +1,63 @@
+"""
+JSON encoding and decoding that uses orjson when it is installed and falls
+back to the standard library otherwise.
+"""
+
+import json
+
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def dumps(data) -> bytes:
+    """Serialize data to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _reject_constant(name: str):
+    raise ValueError(f"{name} is not valid JSON")
+
+
+def loads(content: bytes | str):
+    """Deserialize JSON bytes or text, rejecting NaN and Infinity like orjson."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content, parse_constant=_reject_constant)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer that encodes compact output with the fast backend."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser that decodes request bodies with the fast backend."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
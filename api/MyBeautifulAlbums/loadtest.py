@@ -0,0 +1,328 @@
+"""
+Asyncio load driver for the REST API.
+
+Virtual users log in through the Spotify callback of a running deployment
+(pointed at the fake from ``manage.py fake_spotify``), which creates them and
+syncs their library into its database. Each stage then runs a fixed number of
+concurrent workers for a fixed time. Every worker holds one keep-alive
+connection and picks endpoints from a weighted mix. The driver only uses the
+standard library, so it can run next to the server without extra installs.
+
+Run it with ``manage.py load_test``.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+# How long a new user's record count must hold still to count as synced.
+SEED_SETTLE_SECONDS = 2.0
+
+TOGGLE_TYPES = ["isLiked", "isLoved", "isListened", "wantToListen"]
+
+# Endpoint weights per scenario. The endpoints are the ones the frontend calls.
+MIXES = {
+    "browse": {"profile": 20, "albums": 5, "album": 35, "records": 30, "record": 10},
+    "default": {
+        "profile": 15,
+        "albums": 5,
+        "album": 25,
+        "records": 25,
+        "record": 10,
+        "add_album": 19,
+        "sync": 1,
+    },
+    "toggle": {"profile": 10, "album": 10, "records": 20, "add_album": 60},
+    "sync": {"profile": 30, "records": 60, "sync": 10},
+}
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(
+        self, method: str, path: str, headers: dict | None = None, body=None
+    ) -> tuple[int, bytes]:
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        try:
+            return await asyncio.wait_for(
+                self._exchange(method, path, headers or {}, body), self.timeout
+            )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        except BaseException:
+            self.close()
+            raise
+        # The server dropped an idle keep-alive connection; retry once.
+        return await self.request(method, path, headers, body)
+
+    async def _exchange(
+        self, method: str, path: str, headers: dict, body
+    ) -> tuple[int, bytes]:
+        payload = b"" if body is None else json.dumps(body).encode()
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Connection: keep-alive",
+            f"Content-Length: {len(payload)}",
+        ]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        status = int(status_line.split()[1])
+
+        length, chunked, close = None, False, False
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding":
+                chunked = "chunked" in value
+            elif name == "connection":
+                close = value == "close"
+
+        if chunked:
+            content = await self._read_chunked()
+        elif length is not None:
+            content = await self.reader.readexactly(length)
+        else:
+            content, close = await self.reader.read(), True
+        if close:
+            self.close()
+        return status, content
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while size := int((await self.reader.readline()).split(b";")[0], 16):
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+
+@dataclass
+class VirtualUser:
+    name: str
+    token: str
+    record_pks: list = field(default_factory=list)
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+@dataclass
+class Catalog:
+    album_pks: list
+    spotify_ids: list
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, seconds: float) -> dict:
+        count = len(self.latencies_ms)
+        if count > 1:
+            cuts = statistics.quantiles(self.latencies_ms, n=100, method="inclusive")
+        else:
+            cuts = self.latencies_ms * 99 or [0.0] * 99
+        return {
+            "requests": count,
+            "rps": round(count / seconds, 1) if seconds else 0.0,
+            "p50_ms": round(cuts[49], 1),
+            "p95_ms": round(cuts[94], 1),
+            "p99_ms": round(cuts[98], 1),
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+        }
+
+
+class LoadTest:
+    """Log virtual users in, then run the mix at each concurrency level."""
+
+    def __init__(
+        self,
+        base_url: str,
+        mix: dict,
+        timeout: float = 30.0,
+        think_ms: float = 0.0,
+        seed: int = 0,
+    ):
+        url = urlsplit(base_url)
+        if url.scheme != "http" or not url.hostname:
+            raise ValueError("The load driver only speaks plain http://host:port")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.mix = mix
+        self.timeout = timeout
+        self.think = think_ms / 1000
+        self.seed = seed
+        self.users: list[VirtualUser] = []
+        self.catalog: Catalog | None = None
+
+    def connect(self) -> HTTPConnection:
+        return HTTPConnection(self.host, self.port, self.timeout)
+
+    async def _get_json(self, connection, path: str, headers: dict):
+        status, content = await connection.request("GET", path, headers)
+        if status != 200:
+            raise RuntimeError(f"GET {path} returned {status}")
+        return json.loads(content)
+
+    async def _record_pks(self, connection, user: VirtualUser) -> list:
+        records = await self._get_json(connection, "/records/?fields=id", user.headers)
+        return [record["id"] for record in records]
+
+    async def _login(self, name: str, seed_timeout: float) -> VirtualUser:
+        connection = HTTPConnection(self.host, self.port, seed_timeout)
+        try:
+            tokens = await self._get_json(
+                connection, f"/spotify/callback/?code={name}", {}
+            )
+            user = VirtualUser(name, tokens["jwt_access_token"])
+
+            # New users are synced in the background. Let that settle, then
+            # sync once in the foreground so every library is complete.
+            deadline = time.perf_counter() + seed_timeout
+            previous, current = None, await self._record_pks(connection, user)
+            while current != previous and time.perf_counter() < deadline:
+                await asyncio.sleep(SEED_SETTLE_SECONDS)
+                previous, current = current, await self._record_pks(connection, user)
+            status, _ = await connection.request(
+                "POST", "/sync-spotify-library/", user.headers
+            )
+            user.record_pks = await self._record_pks(connection, user)
+            if status != 200 or not user.record_pks:
+                raise RuntimeError(
+                    f"Could not seed {name}'s library (sync returned {status}); "
+                    "is the server's SPOTIFY_API_URL the fake Spotify?"
+                )
+            return user
+        finally:
+            connection.close()
+
+    async def setup(self, users: int, seed_timeout: float = 120.0) -> None:
+        """Log the virtual users in one by one and load the album catalog."""
+        self.users = [
+            await self._login(f"load-user-{i}", seed_timeout) for i in range(users)
+        ]
+        connection = self.connect()
+        try:
+            albums = await self._get_json(
+                connection, "/albums/?fields=id,spotify_id", self.users[0].headers
+            )
+        finally:
+            connection.close()
+        self.catalog = Catalog(
+            [album["id"] for album in albums],
+            [album["spotify_id"] for album in albums],
+        )
+
+    def _request(self, name: str, user: VirtualUser, rng: random.Random):
+        match name:
+            case "profile":
+                return "GET", "/profile/", None
+            case "albums":
+                return "GET", "/albums/", None
+            case "album":
+                return "GET", f"/albums/{rng.choice(self.catalog.album_pks)}/", None
+            case "records":
+                return "GET", "/records/", None
+            case "record":
+                return "GET", f"/records/{rng.choice(user.record_pks)}/", None
+            case "add_album":
+                return (
+                    "POST",
+                    "/add_album/",
+                    {
+                        "album_id": rng.choice(self.catalog.spotify_ids),
+                        "action": {"type": rng.choice(TOGGLE_TYPES), "value": True},
+                    },
+                )
+            case "sync":
+                return "POST", "/sync-spotify-library/", None
+        raise ValueError(f"Unknown endpoint {name!r}")
+
+    async def _worker(self, index: int, deadline: float, stats: dict) -> None:
+        user = self.users[index % len(self.users)]
+        rng = random.Random(self.seed * 100_003 + index)
+        names, weights = zip(*self.mix.items())
+        connection = self.connect()
+        try:
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                method, path, body = self._request(name, user, rng)
+                started = time.perf_counter()
+                try:
+                    status, _ = await connection.request(
+                        method, path, user.headers, body
+                    )
+                    failed = status >= 400
+                except (OSError, ValueError, asyncio.TimeoutError):
+                    failed = True
+                stats[name].latencies_ms.append(
+                    (time.perf_counter() - started) * 1000
+                )
+                stats[name].errors += failed
+                if self.think:
+                    await asyncio.sleep(self.think)
+        finally:
+            connection.close()
+
+    async def run_stage(self, concurrency: int, duration: float) -> dict:
+        """Run the mix with ``concurrency`` workers and summarise each endpoint."""
+        stats = defaultdict(EndpointStats)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                self._worker(index, started + duration, stats)
+                for index in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+        total = EndpointStats()
+        for entry in stats.values():
+            total.latencies_ms.extend(entry.latencies_ms)
+            total.errors += entry.errors
+        return {
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 2),
+            "endpoints": {
+                name: stats[name].summary(elapsed) for name in sorted(stats)
+            },
+            "total": total.summary(elapsed),
+        }
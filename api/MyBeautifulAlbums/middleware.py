@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+MIN_COMPRESS_LENGTH = 200
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses with brotli when the client accepts it and the
+    package is installed, falling back to Django's gzip handling.
+
+    Brotli has no header to hide random padding in, so responses marked
+    ``Cache-Control: no-store``, such as the ones carrying tokens, are left
+    to gzip, which pads them against BREACH.
+    """
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            # Compressing would hold events back in the compressor's buffer.
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or "no-store" in response.get("Cache-Control", "")
+            or len(response.content) < MIN_COMPRESS_LENGTH
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(
+            response.content, quality=getattr(settings, "BROTLI_QUALITY", 5)
+        )
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,172 @@
+"""
+Opt-in profiling for the ingest and sync pipelines.
+
+``profiled()`` opens a profile for a pipeline run, and ``span()`` times a
+stage inside it. Both are no-ops unless profiling is switched on, either for
+every run with the INGEST_PROFILING setting or per request with the
+``X-Profile-Ingest: 1`` header. Requests are only profiled for staff users,
+as the breakdown is returned to them. Nested runs, such as each album of a library
+sync, add their spans to the outer profile. The stage breakdown is logged
+and returned by ``IngestProfile.breakdown()``.
+
+When INGEST_PROFILER is "cprofile" or "pyinstrument", the run is also
+profiled with that tool and the output is written to INGEST_PROFILE_DIR,
+under a name unique to the process and run.
+"""
+
+import cProfile
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - optional dependency
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE_INGEST"
+
+
+class IngestProfile:
+    """Per-stage wall-clock time of one pipeline run."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.durations: dict = defaultdict(float)
+        self.counts: dict = defaultdict(int)
+        self.output_path: Optional[Path] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.durations[stage] += seconds
+        self.counts[stage] += 1
+
+    def breakdown(self) -> dict:
+        finished = self.finished or time.perf_counter()
+        return {
+            "name": self.name,
+            "total_ms": round((finished - self.started) * 1000, 1),
+            "stages": {
+                stage: {
+                    "ms": round(seconds * 1000, 1),
+                    "count": self.counts[stage],
+                }
+                for stage, seconds in sorted(
+                    self.durations.items(), key=lambda item: -item[1]
+                )
+            },
+            "output": str(self.output_path) if self.output_path else None,
+        }
+
+
+_current: ContextVar[Optional[IngestProfile]] = ContextVar(
+    "ingest_profile", default=None
+)
+
+
+def profiling_requested(request) -> bool:
+    """
+    Return whether the setting or the request header asks for profiling,
+    and the user is staff.
+    """
+    asked = getattr(settings, "INGEST_PROFILING", False) or request.META.get(
+        PROFILE_HEADER
+    ) in ("1", "true")
+    return asked and request.user.is_staff
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage of the active profile, if any."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(stage, time.perf_counter() - started)
+
+
+def _start_profiler():
+    kind = getattr(settings, "INGEST_PROFILER", None)
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == "pyinstrument" and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def _write_profiler_output(profiler, profile: IngestProfile) -> None:
+    directory = Path(getattr(settings, "INGEST_PROFILE_DIR", "profiles"))
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = directory / (
+        f"{profile.name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        f"-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+    )
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profile.output_path = stem.with_suffix(".prof")
+        profiler.dump_stats(profile.output_path)
+    else:
+        profiler.stop()
+        profile.output_path = stem.with_suffix(".html")
+        profile.output_path.write_text(profiler.output_html())
+
+
+@contextmanager
+def profiled(
+    name: str, enabled: Optional[bool] = None
+) -> Iterator[Optional[IngestProfile]]:
+    """
+    Profile a pipeline run.
+
+    Yields the active profile when one is already open, a new profile when
+    ``enabled`` (default: the INGEST_PROFILING setting) is true, else None.
+    """
+    profile = _current.get()
+    if profile is not None:
+        yield profile
+        return
+    if enabled is None:
+        enabled = getattr(settings, "INGEST_PROFILING", False)
+    if not enabled:
+        yield None
+        return
+
+    profile = IngestProfile(name)
+    token = _current.set(profile)
+    profiler = _start_profiler()
+    try:
+        yield profile
+    finally:
+        profile.finished = time.perf_counter()
+        _current.reset(token)
+        if profiler is not None:
+            _write_profiler_output(profiler, profile)
+        breakdown = profile.breakdown()
+        logger.info(
+            "%s took %.1f ms: %s",
+            name,
+            breakdown["total_ms"],
+            ", ".join(
+                f"{stage}={stats['ms']}ms/{stats['count']}"
+                for stage, stats in breakdown["stages"].items()
+            ),
+        )
@@ -0,0 +1,49 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render responses as MessagePack for clients that ask for it."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Accept ``text/event-stream`` for views that stream server-sent events.
+
+    Those views stream their events themselves; this only renders responses
+    returned before streaming starts, such as errors, as a single event.
+    """
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return f"event: error\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+def compact_renderer_classes() -> list:
+    """Return the default renderers plus the compact ones that are installed."""
+    renderers = list(api_settings.DEFAULT_RENDERER_CLASSES)
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer)
+    return renderers
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -20,6 +22,13 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
+# Point these at a fake Spotify (manage.py fake_spotify) for offline testing.
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+# Retries of a rate-limited or failed library page, and the longest
+# Retry-After waited out in place; longer waits fail the sync and requeue it.
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+SPOTIFY_MAX_RETRY_AFTER = 30
 TURSO_URI = os.getenv("TURSO_URI")
 TURSO_API_KEY = os.getenv("TURSO_API_KEY")
 is_local = os.getenv("IS_LOCAL")
@@ -45,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "MyBeautifulAlbums.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,6 +64,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "MyBeautifulAlbums.db.routing.ReadReplicaMiddleware",
 ]
 
 ROOT_URLCONF = "MyBeautifulAlbums.urls"
@@ -76,12 +87,69 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "MyBeautifulAlbums.wsgi.application"
 
-DATABASES = {
-    "default": {
-        "ENGINE": "libsql.db.backends.sqlite3",
-        "NAME": f"{TURSO_URI}?authToken={TURSO_API_KEY}",
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+TURSO_REPLICA_PATH = os.getenv("TURSO_REPLICA_PATH")
+TURSO_SYNC_INTERVAL = os.getenv("TURSO_SYNC_INTERVAL")
+
+if TURSO_REPLICA_PATH:
+    DATABASES = {
+        "default": {
+            "ENGINE": "MyBeautifulAlbums.db.backends.libsql_replica",
+            "NAME": TURSO_REPLICA_PATH,
+            "OPTIONS": {
+                "sync_url": TURSO_URI,
+                "auth_token": TURSO_API_KEY,
+                "sync_interval": (
+                    float(TURSO_SYNC_INTERVAL) if TURSO_SYNC_INTERVAL else None
+                ),
+            },
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "MyBeautifulAlbums.db.backends.libsql",
+            "NAME": f"{TURSO_URI}?authToken={TURSO_API_KEY}",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+
+TURSO_READ_REPLICA_URI = os.getenv("TURSO_READ_REPLICA_URI")
+READ_REPLICA_STICKY_SECONDS = int(os.getenv("READ_REPLICA_STICKY_SECONDS", "10"))
+
+if TURSO_READ_REPLICA_URI:
+    DATABASES["replica"] = {
+        "ENGINE": "MyBeautifulAlbums.db.backends.libsql",
+        "NAME": f"{TURSO_READ_REPLICA_URI}?authToken={TURSO_API_KEY}",
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["MyBeautifulAlbums.db.routing.ReadReplicaRouter"]
+
+# Shared by every worker process, e.g. for read-your-writes pins. A table on
+# the primary (manage.py createcachetable) unless REDIS_URL is set, which
+# needs the redis package.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
     }
-}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,8 +184,17 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        "MyBeautifulAlbums.fastjson.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "MyBeautifulAlbums.fastjson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.ClaimsJWTAuthentication",
     ),
 }
 
@@ -129,11 +206,67 @@ SPECTACULAR_SETTINGS = {
 }
 SITE_ID = 1
 
+BROTLI_QUALITY = 5
+
+USERPROFILE_CACHE_TTL = 30
+USERPROFILE_CACHE_SIZE = 10_000
+
+# Seconds record toggles of one user and album are merged before writing.
+RECORD_WRITE_WINDOW = float(os.getenv("RECORD_WRITE_WINDOW", "2"))
+
+# Seconds run_library_syncs waits between polls of an empty queue.
+LIBRARY_SYNC_POLL_INTERVAL = 5
+# Least seconds a sync that failed talking to Spotify waits before its retry.
+LIBRARY_SYNC_RETRY_DELAY = 60
+
+LIBRARY_EVENT_RETENTION = 60 * 60 * 24
+# Waiting readers poll from the first to the second interval, backing off
+# while idle; events published in the same process wake them at once.
+LIBRARY_EVENT_POLL_INTERVAL = 1
+LIBRARY_EVENT_MAX_POLL_INTERVAL = 5
+LIBRARY_EVENT_MAX_WAIT = 25
+# Every this many published events, events past the retention are pruned.
+LIBRARY_EVENT_PRUNE_EVERY = 1000
+# Each open stream or long poll holds a worker thread; see gunicorn.conf.py.
+# A process serves at most this many, and asks the rest to retry later.
+LIBRARY_EVENT_MAX_READERS = int(os.getenv("LIBRARY_EVENT_MAX_READERS", "8"))
+LIBRARY_EVENT_RETRY_AFTER = 5
+LIBRARY_EVENT_STREAM_SECONDS = 55
+LIBRARY_EVENT_HEARTBEAT = 15
+
+RECOMMENDATION_TOP_K = 20
+RECOMMENDATION_CONTENT_WEIGHT = 0.3
+RECOMMENDATION_RECORD_WEIGHTS = {"is_loved": 3.0, "is_liked": 2.0, "is_listened": 1.0}
+
+INGEST_PROFILING = os.getenv("INGEST_PROFILING", "False") == "True"
+INGEST_PROFILER = os.getenv("INGEST_PROFILER")  # "cprofile" or "pyinstrument"
+INGEST_PROFILE_DIR = os.getenv("INGEST_PROFILE_DIR", str(BASE_DIR / "profiles"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "MyBeautifulAlbums.profiling": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+THUMBNAILS_ENABLED = os.getenv("THUMBNAILS_ENABLED", "False") == "True"
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", str(BASE_DIR / "thumbnails"))
+THUMBNAIL_SIZES = [64, 150, 300, 640]
+THUMBNAIL_MAX_AGE = 60 * 60 * 24 * 365
+# Where album images may be fetched from; Spotify serves covers from i.scdn.co.
+THUMBNAIL_SOURCE_HOSTS = os.getenv("THUMBNAIL_SOURCE_HOSTS", "i.scdn.co").split(",")
+THUMBNAIL_SOURCE_SCHEMES = ["https"]
+# Thumbnail builds one client may trigger, counted in the shared cache.
+THUMBNAIL_BUILD_RATE = os.getenv("THUMBNAIL_BUILD_RATE", "30/min")
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "https://my-beautiful-albums.vercel.app",
     "https://mybeautifulalbums.vercel.app",
 ]
+CORS_ALLOW_HEADERS = (*default_headers, "x-profile-ingest")
 
 from datetime import timedelta
 
@@ -0,0 +1,23 @@
+"""
+Production settings: the base settings with debug features turned off.
+
+Use with DJANGO_SETTINGS_MODULE=MyBeautifulAlbums.settings_production.
+Build the OpenAPI schema once per deploy with
+``python manage.py spectacular --file openapi.yaml`` so workers serve it
+from disk instead of generating it.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, REST_FRAMEWORK
+
+# With DEBUG on, every connection keeps each executed query in memory.
+DEBUG = False
+
+OPENAPI_SCHEMA_FILE = os.getenv("OPENAPI_SCHEMA_FILE", str(BASE_DIR / "openapi.yaml"))
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ("MyBeautifulAlbums.fastjson.FastJSONRenderer",),
+}
@@ -0,0 +1,30 @@
+"""
+Test settings: the base settings on a local SQLite file.
+
+Routing tests add a replica alias on a second SQLite file themselves.
+
+Run the suite with
+``DJANGO_SETTINGS_MODULE=MyBeautifulAlbums.settings_test python manage.py test``.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import BASE_DIR  # noqa: E402
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "TEST": {
+            "NAME": Path(tempfile.gettempdir()) / "mybeautifulalbums-test.sqlite3"
+        },
+    }
+}
+
+# Tests that exercise coalescing set a window themselves.
+RECORD_WRITE_WINDOW = 0
@@ -0,0 +1,363 @@
+import asyncio
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+
+from albums.models import Album, Genre, Record
+from user.models import UserProfile
+from . import admin as shared_admin
+from . import fastjson
+from .db import routing
+from .db.routing import PRIMARY, REPLICA, ReadReplicaRouter
+from .loadtest import Catalog, HTTPConnection, LoadTest, VirtualUser
+
+
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """Routing between a primary and a replica, each on its own SQLite file."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.replica_path = Path(directory) / "replica.sqlite3"
+
+        self.writer = UserProfile.objects.create(
+            user=User.objects.create(username="writer")
+        )
+        self.reader = UserProfile.objects.create(
+            user=User.objects.create(username="reader")
+        )
+        album = Album.objects.create(name="Replicated", spotify_id="replicated")
+        self.record = Record.objects.create(userprofile=self.writer, album=album)
+        self.replicate()
+
+        connections.settings[REPLICA] = {
+            **connections[PRIMARY].settings_dict,
+            "NAME": str(self.replica_path),
+        }
+        self.addCleanup(self.remove_replica)
+
+        # Only on the primary until the next replicate().
+        self.lagging = Album.objects.create(name="Lagging", spotify_id="lagging")
+
+    def replicate(self):
+        """Copy the primary into the replica file, like replication catching up."""
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def album_ids(self, user: User) -> set:
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get("/albums/", {"fields": "id"})
+        self.assertEqual(response.status_code, 200)
+        return {album["id"] for album in response.json()}
+
+    def test_request_reads_go_to_the_replica(self):
+        self.assertNotIn(self.lagging.pk, self.album_ids(self.reader.user))
+
+    def test_reads_outside_requests_go_to_the_primary(self):
+        self.assertTrue(Album.objects.filter(pk=self.lagging.pk).exists())
+
+    def test_writer_reads_their_writes_in_later_requests(self):
+        client = APIClient()
+        client.force_authenticate(self.writer.user)
+        response = client.patch(
+            f"/records/{self.record.pk}/", {"is_loved": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertIn(self.lagging.pk, self.album_ids(self.writer.user))
+        self.assertNotIn(self.lagging.pk, self.album_ids(self.reader.user))
+
+    def test_pins_are_stored_in_the_primary_database(self):
+        routing.mark_user_write(self.writer.user.pk)
+
+        with connections[PRIMARY].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM django_cache")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertTrue(routing.user_recently_wrote(self.writer.user.pk))
+        self.assertFalse(routing.user_recently_wrote(self.reader.user.pk))
+
+    def test_writes_outside_requests_do_not_pin_the_thread(self):
+        result = {}
+
+        def background_write():
+            try:
+                Genre.objects.create(name="background")
+                result["pinned"] = routing._use_primary.get()
+                result["read_alias"] = ReadReplicaRouter().db_for_read(Album)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=background_write)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(result, {"pinned": None, "read_alias": PRIMARY})
+        self.assertIsNone(routing._use_primary.get())
+        self.assertNotIn(self.lagging.pk, self.album_ids(self.reader.user))
+
+    def test_new_users_authenticate_before_the_replica_catches_up(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        from user.authentication import USERPROFILE_CLAIM
+
+        user = User.objects.create(username="newcomer")
+        profile = UserProfile.objects.create(user=user)
+        token = RefreshToken.for_user(user)
+        token[USERPROFILE_CLAIM] = profile.pk
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.access_token}")
+
+        self.assertEqual(client.get("/albums/", {"fields": "id"}).status_code, 200)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        profile = UserProfile.objects.create(user=User.objects.create(username="u"))
+        for i in range(6):
+            record = Record.objects.create(
+                userprofile=profile,
+                album=Album.objects.create(name=f"album {i}", spotify_id=f"album{i}"),
+            )
+            if i % 2:
+                record.soft_delete()
+        self.admin = User.objects.create(
+            username="admin", is_staff=True, is_superuser=True
+        )
+
+    def test_changelist_links_only_pages_with_rows(self):
+        self.client.force_login(self.admin)
+        with (
+            mock.patch.object(shared_admin, "ESTIMATED_COUNT_THRESHOLD", 2),
+            mock.patch.object(shared_admin.EstimatedCountAdmin, "list_per_page", 1),
+        ):
+            response = self.client.get("/admin/albums/record/")
+            last_page = self.client.get("/admin/albums/record/", {"p": 3})
+
+        self.assertContains(response, "2+ records")
+        self.assertEqual(response.context["cl"].paginator.num_pages, 3)
+        self.assertEqual(len(last_page.context["cl"].result_list), 1)
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {"name": "Ágætis byrjun", "ids": [1, 2], 3: None, "score": Decimal("1.5")}
+
+    def backends(self) -> list:
+        """orjson, if installed, and the standard library fallback."""
+        backends = [("json", None)]
+        if fastjson.orjson is not None:
+            backends.insert(0, ("orjson", fastjson.orjson))
+        return backends
+
+    def test_renderer_output_parses_back(self):
+        for name, backend in self.backends():
+            with self.subTest(name), mock.patch.object(fastjson, "orjson", backend):
+                content = fastjson.FastJSONRenderer().render(self.data)
+                parsed = fastjson.FastJSONParser().parse(io.BytesIO(content))
+
+                self.assertEqual(
+                    parsed,
+                    {"name": "Ágætis byrjun", "ids": [1, 2], "3": None, "score": 1.5},
+                )
+
+    def test_parser_rejects_non_finite_numbers(self):
+        for name, backend in self.backends():
+            with self.subTest(name), mock.patch.object(fastjson, "orjson", backend):
+                for content in [b'{"a": NaN}', b"[Infinity]", b"-Infinity"]:
+                    with self.assertRaises(ParseError):
+                        fastjson.FastJSONParser().parse(io.BytesIO(content))
+
+
+class LibSQLBackendTests(SimpleTestCase):
+    def backend(self, engine: str, name: str):
+        """A connection of ``engine`` outside the connections the tests use."""
+        handler = ConnectionHandler(
+            {"default": {"ENGINE": engine, "NAME": name, "CONN_HEALTH_CHECKS": True}}
+        )
+        connection = handler["default"]
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_primary_health_check_reconnects_broken_connections(self):
+        connection = self.backend("MyBeautifulAlbums.db.backends.libsql", "libsql://db")
+        broken, fresh = mock.Mock(), mock.Mock()
+        with mock.patch.object(connection, "get_new_connection", return_value=broken):
+            connection.ensure_connection()
+        self.assertTrue(connection.is_usable())
+
+        broken.execute.side_effect = OSError("connection reset")
+        self.assertFalse(connection.is_usable())
+        # What Django does before reusing a persistent connection.
+        connection.health_check_done = False
+        connection.close_if_health_check_failed()
+        with mock.patch.object(connection, "get_new_connection", return_value=fresh):
+            connection.ensure_connection()
+
+        broken.close.assert_called_once()
+        self.assertIs(connection.connection, fresh)
+        self.assertTrue(connection.is_usable())
+
+    def test_replica_binds_every_placeholder_style(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connection = self.backend(
+            "MyBeautifulAlbums.db.backends.libsql_replica",
+            str(Path(directory) / "replica.sqlite3"),
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (name TEXT)")
+            cursor.execute("INSERT INTO t VALUES (%s)", ["50%"])
+            cursor.executemany("INSERT INTO t VALUES (%s)", [("a",), ["b"]])
+            cursor.executemany("INSERT INTO t VALUES (%(name)s)", [{"name": "c"}])
+            cursor.execute("SELECT name FROM t WHERE name = %(name)s", {"name": "c"})
+            self.assertEqual(cursor.fetchall(), [("c",)])
+            cursor.execute("SELECT name FROM t WHERE name LIKE '%%' ORDER BY name")
+            self.assertEqual(list(cursor), [("50%",), ("a",), ("b",), ("c",)])
+        self.assertTrue(connection.is_usable())
+        self.assertEqual(
+            connection.ops.last_executed_query(None, "SELECT %s", ["it's"]),
+            "SELECT 'it''s'",
+        )
+
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM t WHERE name != %s", ["a"])
+            self.assertEqual(cursor.fetchone(), (3,))
+
+
+class StubAPI:
+    """asyncio server answering the load driver with canned responses."""
+
+    RESPONSES = {
+        "/length/": b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n[]",
+        "/chunked/": (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"1;ext=1\r\n[\r\n1\r\n]\r\n0\r\nTrailer: 1\r\n\r\n"
+        ),
+        "/close/": b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n[]",
+    }
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        self.handlers = set()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.handlers.add(asyncio.current_task())
+        try:
+            while request_line := await reader.readline():
+                method, path, _ = request_line.decode().split()
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    headers[name.lower()] = value.strip()
+                body = await reader.readexactly(int(headers["content-length"]))
+                self.requests.append((method, path, headers, body))
+                path = path.split("?")[0]
+                writer.write(
+                    self.RESPONSES.get(
+                        path, b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+                    )
+                )
+                await writer.drain()
+                if path in ("/close/", "/drop/"):
+                    break
+        finally:
+            writer.close()
+
+
+class LoadTestDriverTests(SimpleTestCase):
+    def run_with_stub(self, scenario):
+        async def main():
+            stub = StubAPI()
+            port = await stub.start()
+            try:
+                return stub, await scenario(port)
+            finally:
+                stub.server.close()
+                # Every client closed its connection, so the handlers end.
+                await asyncio.wait_for(asyncio.gather(*stub.handlers), 5)
+
+        return asyncio.run(main())
+
+    def test_reads_every_response_framing_on_one_connection(self):
+        async def scenario(port):
+            connection = HTTPConnection("127.0.0.1", port, timeout=5)
+            try:
+                return [
+                    await connection.request("GET", path)
+                    for path in ["/length/", "/chunked/", "/close/", "/length/"]
+                ]
+            finally:
+                connection.close()
+
+        stub, responses = self.run_with_stub(scenario)
+
+        self.assertEqual(responses, [(200, b"[]")] * 4)
+        # The close-delimited response ends the first connection.
+        self.assertEqual(stub.connections, 2)
+
+    def test_retries_once_on_a_dropped_keep_alive_connection(self):
+        async def scenario(port):
+            connection = HTTPConnection("127.0.0.1", port, timeout=5)
+            try:
+                await connection.request("GET", "/drop/")
+                return await connection.request("GET", "/length/")
+            finally:
+                connection.close()
+
+        stub, response = self.run_with_stub(scenario)
+
+        self.assertEqual(response, (200, b"[]"))
+        self.assertEqual(stub.connections, 2)
+
+    def test_stage_sends_the_mix_and_summarises_it(self):
+        async def scenario(port):
+            load_test = LoadTest(
+                f"http://127.0.0.1:{port}", {"add_album": 1, "record": 1}
+            )
+            load_test.users = [VirtualUser("listener", "token", record_pks=[7])]
+            load_test.catalog = Catalog(album_pks=[1], spotify_ids=["album"])
+            return await load_test.run_stage(concurrency=2, duration=0.2)
+
+        stub, result = self.run_with_stub(scenario)
+
+        self.assertEqual(result["total"]["errors"], 0)
+        self.assertEqual(result["total"]["requests"], len(stub.requests))
+        self.assertEqual(set(result["endpoints"]), {"add_album", "record"})
+        for method, path, headers, body in stub.requests:
+            self.assertEqual(headers["authorization"], "Bearer token")
+            if method == "POST":
+                self.assertEqual(path, "/add_album/")
+                self.assertEqual(json.loads(body)["album_id"], "album")
+            else:
+                self.assertEqual(path, "/records/7/")
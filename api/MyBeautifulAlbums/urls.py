@@ -1,24 +1,21 @@
 from django.contrib import admin
 from django.urls import include, path
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+
+from .docs import lazy_view, schema_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("albums.urls")),
     path("", include("user.urls")),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", schema_view, name="schema"),
     path(
         "docs/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
+        lazy_view("drf_spectacular.views.SpectacularSwaggerView", url_name="schema"),
         name="swagger-ui",
     ),
     path(
         "redoc/",
-        SpectacularRedocView.as_view(url_name="schema"),
+        lazy_view("drf_spectacular.views.SpectacularRedocView", url_name="schema"),
         name="redoc",
     ),
 ]
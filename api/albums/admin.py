@@ -1,8 +1,94 @@
-from django.contrib import admin
-from .models import Album, Artist, Record, Genre, Track
-
-admin.site.register(Album)
-admin.site.register(Artist)
-admin.site.register(Record)
-admin.site.register(Genre)
-admin.site.register(Track)
+from django.contrib import admin, messages
+from django.db import transaction
+
+from MyBeautifulAlbums.admin import EstimatedCountAdmin
+from user.services import get_app_spotify_token
+from .models import Album, AlbumTrack, Artist, Record, Genre, Track
+from .services import fetch_spotify_albums, refresh_albums
+
+
+class AlbumTrackInline(admin.TabularInline):
+    model = AlbumTrack
+    raw_id_fields = ["track"]
+    extra = 0
+
+
+@admin.register(Album)
+class AlbumAdmin(EstimatedCountAdmin):
+    list_display = [
+        "id",
+        "name",
+        "primary_artist_name",
+        "release_date",
+        "track_count",
+        "popularity",
+    ]
+    search_fields = ["^name", "spotify_id__exact"]
+    raw_id_fields = ["artist", "genres"]
+    readonly_fields = Album.SUMMARY_FIELDS
+    inlines = [AlbumTrackInline]
+    actions = ["refresh_from_spotify"]
+
+    @admin.action(description="Refresh selected albums from Spotify")
+    def refresh_from_spotify(self, request, queryset):
+        """Re-fetch the albums in batches and run them through ingest."""
+        token = get_app_spotify_token()
+        if token is None:
+            self.message_user(
+                request, "Could not get a Spotify access token.", messages.ERROR
+            )
+            return
+
+        spotify_ids = list(
+            queryset.exclude(spotify_id=None).values_list("spotify_id", flat=True)
+        )
+        refreshed = refresh_albums(fetch_spotify_albums(token, spotify_ids))
+        self.message_user(
+            request, f"Refreshed {refreshed} of {len(spotify_ids)} albums from Spotify."
+        )
+
+
+@admin.register(Artist)
+class ArtistAdmin(EstimatedCountAdmin):
+    list_display = ["id", "name", "spotify_id"]
+    search_fields = ["^name", "spotify_id__exact"]
+
+
+@admin.register(Record)
+class RecordAdmin(EstimatedCountAdmin):
+    list_display = [
+        "id",
+        "album",
+        "userprofile",
+        "date_added",
+        "is_liked",
+        "is_loved",
+        "is_listened",
+        "want_to_listen",
+    ]
+    list_select_related = ["album", "userprofile__user"]
+    list_filter = ["is_liked", "is_loved", "is_listened", "want_to_listen"]
+    search_fields = ["album__spotify_id__exact", "userprofile__user__username__exact"]
+    raw_id_fields = ["album", "userprofile"]
+
+    def delete_model(self, request, obj):
+        """Keep a tombstone so delta sync can report the deletion."""
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for record in queryset:
+                record.soft_delete()
+
+
+@admin.register(Genre)
+class GenreAdmin(EstimatedCountAdmin):
+    list_display = ["id", "name"]
+    search_fields = ["^name"]
+
+
+@admin.register(Track)
+class TrackAdmin(EstimatedCountAdmin):
+    list_display = ["id", "name", "duration_ms", "track_number", "is_explicit"]
+    search_fields = ["^name", "spotify_id__exact"]
+    raw_id_fields = ["artist"]
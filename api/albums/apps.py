@@ -1,6 +1,14 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class AlbumsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "albums"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .coalescing import record_writes
+
+        atexit.register(record_writes.shutdown)
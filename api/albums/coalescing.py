@@ -0,0 +1,236 @@
+"""
+Short-window write coalescing for record toggles.
+
+Every like, love, listened and want-to-listen click sets one flag of the
+user's record to the value the client sends. Clicks on the same (user
+profile, album) arriving within RECORD_WRITE_WINDOW seconds are merged in
+memory, the last value of each flag winning, and written in one UPDATE once
+the window has passed. A record's first click creates it right away so it
+shows up in lists.
+
+Pending changes live in this process: record serializers overlay them with
+``RecordWriteBuffer.overlay``. They are flushed by a timer and at
+interpreter exit (see ``AlbumsConfig.ready``), and the toggles of flags that
+another write changes are dropped (see ``albums.signals``). A process killed
+without a chance to exit loses at most the last window of toggles.
+
+Buffers only hold absolute values, so clicks reaching different worker
+processes each write what the client asked for; no process merges against
+flags another one may have changed. A window of 0 writes every toggle
+straight through.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .events import publish_record_changed
+from .models import Record, next_library_version
+
+logger = logging.getLogger(__name__)
+
+RECORD_FLAGS = ("is_liked", "is_loved", "is_listened", "want_to_listen")
+
+Key = Tuple[int, int]
+
+
+@dataclass
+class PendingRecord:
+    """Record ID and flags as read when the window opened, and flag targets."""
+
+    stored: dict
+    values: dict = field(default_factory=dict)
+    since: float = field(default_factory=time.monotonic)
+
+
+class RecordWriteBuffer:
+    """Thread-safe buffer merging record toggles per (user profile, album)."""
+
+    def __init__(self, window: Optional[float] = None):
+        self._window = window
+        self._pending: Dict[Key, PendingRecord] = {}
+        # Taken out of _pending by a flush that has not committed yet.
+        self._flushing: Dict[Key, PendingRecord] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def window(self) -> float:
+        if self._window is not None:
+            return self._window
+        return getattr(settings, "RECORD_WRITE_WINDOW", 0)
+
+    def set(self, userprofile_id: int, album_id: int, flag: str, value: bool) -> None:
+        """Set ``flag`` on the user's record of the album to ``value``."""
+        key = (userprofile_id, album_id)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.values[flag] = value
+                return
+            flushing = self._flushing.get(key)
+
+        if flushing is not None:
+            stored = {**flushing.stored, **flushing.values}
+        else:
+            record, created = Record.objects.get_or_create(
+                userprofile_id=userprofile_id,
+                album_id=album_id,
+                defaults={flag: value},
+            )
+            if created:
+                return
+            stored = {
+                "id": record.pk,
+                **{name: getattr(record, name) for name in RECORD_FLAGS},
+            }
+
+        if not self.window:
+            self._write({key: PendingRecord(stored, {flag: value})})
+            return
+
+        with self._lock:
+            pending = self._pending.setdefault(key, PendingRecord(stored))
+            pending.values[flag] = value
+            self._schedule(self.window)
+
+    def overlay(self, record: Record) -> Record:
+        """Set the record's pending flag values on the instance, for reads."""
+        if not self._pending and not self._flushing:
+            return record
+        key = (record.userprofile_id, record.album_id)
+        with self._lock:
+            values = {
+                **getattr(self._flushing.get(key), "values", {}),
+                **getattr(self._pending.get(key), "values", {}),
+            }
+        deferred = record.get_deferred_fields()
+        for flag, value in values.items():
+            if flag not in deferred:
+                setattr(record, flag, value)
+        return record
+
+    def discard(
+        self, userprofile_id: int, album_id: int, written: Optional[dict] = None
+    ) -> None:
+        """
+        Drop pending toggles overridden by a write made by other means.
+
+        ``written`` maps the flags that write saved to their values; only
+        toggles of flags it changed are dropped. Without it every pending
+        toggle of the record is dropped.
+        """
+        key = (userprofile_id, album_id)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                return
+            if written is not None:
+                for flag, value in written.items():
+                    if value != pending.stored[flag]:
+                        pending.stored[flag] = value
+                        pending.values.pop(flag, None)
+                if pending.values:
+                    return
+            del self._pending[key]
+
+    def flush(self, older_than: Optional[float] = None) -> int:
+        """
+        Write pending changes and return the number of records updated.
+
+        Only entries pending for at least ``older_than`` seconds are written
+        when it is given. Failed writes are put back for the next flush.
+        """
+        now = time.monotonic()
+        with self._lock:
+            batch = {
+                key: pending
+                for key, pending in self._pending.items()
+                if older_than is None or now - pending.since >= older_than
+            }
+            for key in batch:
+                del self._pending[key]
+            self._flushing.update(batch)
+
+        try:
+            return self._write(batch)
+        except Exception:
+            with self._lock:
+                for key, pending in batch.items():
+                    newer = self._pending.get(key)
+                    if newer is not None:
+                        pending.values.update(newer.values)
+                    self._pending[key] = pending
+            raise
+        finally:
+            with self._lock:
+                for key in batch:
+                    self._flushing.pop(key, None)
+
+    def _write(self, batch: Dict[Key, PendingRecord]) -> int:
+        """
+        Write the target values, skipping records that already hold them.
+
+        The values are absolute, so they are written even if they match what
+        this process read: another process may have changed them since.
+        """
+        written = 0
+        with transaction.atomic():
+            for (userprofile_id, album_id), pending in batch.items():
+                if not pending.values:
+                    continue
+                record_id = pending.stored["id"]
+                records = Record.objects.filter(pk=record_id)
+                # exclude() keeps the row only if some flag differs.
+                if not records.exclude(**pending.values).update(
+                    date_added=datetime.date.today(), **pending.values
+                ):
+                    continue
+                records.update(version=next_library_version(userprofile_id))
+                publish_record_changed(
+                    userprofile_id, record_id, album_id, pending.values
+                )
+                written += 1
+        return written
+
+    def _schedule(self, delay: float) -> None:
+        # Called with the lock held.
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_due(self) -> None:
+        with self._lock:
+            self._timer = None
+        retry = None
+        try:
+            self.flush(older_than=self.window)
+        except Exception:
+            logger.exception("Flushing coalesced record writes failed")
+            retry = self.window
+        finally:
+            connections.close_all()
+
+        with self._lock:
+            if self._pending:
+                oldest = min(pending.since for pending in self._pending.values())
+                due = max(oldest + self.window - time.monotonic(), 0.05)
+                self._schedule(retry or due)
+
+    def shutdown(self) -> None:
+        """Stop the timer and write everything still pending."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+
+
+record_writes = RecordWriteBuffer()
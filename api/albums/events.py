@@ -0,0 +1,214 @@
+"""
+Per-user library events, so clients can update incrementally.
+
+Record saves and deletes (see ``albums.signals``), coalesced record writes
+(see ``albums.coalescing``) and the library sync publish rows into the
+LibraryEvent table. A client reads its events after a cursor, the ID of the
+last event it saw, from ``/events/``: as JSON, optionally long-polling, or
+as a server-sent event stream that resumes from ``Last-Event-ID``.
+
+Events are polled from the primary database, so every worker process sees
+events published by any other. Waiting readers are woken right away by
+events published in their own process and otherwise poll, backing off from
+LIBRARY_EVENT_POLL_INTERVAL to LIBRARY_EVENT_MAX_POLL_INTERVAL seconds while
+nothing arrives. Each waiting reader holds a request thread, so a process
+serves at most LIBRARY_EVENT_MAX_READERS of them at once (see
+``reader_slots``). Every LIBRARY_EVENT_PRUNE_EVERY-th event
+published prunes the events of all users older than LIBRARY_EVENT_RETENTION
+seconds.
+"""
+
+import json
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import LibraryEvent
+
+# Notified when an event published in this process commits.
+_published = threading.Condition()
+
+
+class ReaderSlots:
+    """Count of the readers waiting for events in this process, capped."""
+
+    def __init__(self):
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a slot, or return False if LIBRARY_EVENT_MAX_READERS are taken."""
+        with self._lock:
+            if self._open >= getattr(settings, "LIBRARY_EVENT_MAX_READERS", 8):
+                return False
+            self._open += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._open -= 1
+
+
+reader_slots = ReaderSlots()
+
+
+def _notify_published() -> None:
+    with _published:
+        _published.notify_all()
+
+
+def _poll_intervals() -> Iterator[float]:
+    """Yield the waits between polls, doubling while nothing arrives."""
+    interval = getattr(settings, "LIBRARY_EVENT_POLL_INTERVAL", 1)
+    longest = getattr(settings, "LIBRARY_EVENT_MAX_POLL_INTERVAL", 5)
+    while True:
+        yield interval
+        interval = min(interval * 2, longest)
+
+
+def _wait_for_publish(timeout: float) -> None:
+    with _published:
+        _published.wait(timeout)
+
+
+def publish(userprofile_id: int, kind: str, data: dict) -> None:
+    """Append an event to the user's stream."""
+    event = LibraryEvent.objects.create(
+        userprofile_id=userprofile_id, kind=kind, data=data
+    )
+    if event.pk % getattr(settings, "LIBRARY_EVENT_PRUNE_EVERY", 1000) == 0:
+        prune_events()
+    transaction.on_commit(_notify_published)
+
+
+def publish_record_changed(
+    userprofile_id: int,
+    record_id: int,
+    album_id: Optional[int],
+    fields: dict,
+    deleted: bool = False,
+) -> None:
+    """Publish the changed flags of a record, or its deletion."""
+    publish(
+        userprofile_id,
+        LibraryEvent.RECORD_CHANGED,
+        {"record": record_id, "album": album_id, "deleted": deleted, **fields},
+    )
+
+
+def publish_sync_progress(userprofile_id: int, state: str, albums: int = 0) -> None:
+    """Publish the state of a library sync and the albums imported so far."""
+    publish(
+        userprofile_id,
+        LibraryEvent.SYNC_PROGRESS,
+        {"state": state, "albums": albums},
+    )
+
+
+def prune_events(userprofile_id: Optional[int] = None) -> None:
+    """
+    Delete events older than LIBRARY_EVENT_RETENTION seconds, of one user
+    or of everyone.
+    """
+    cutoff = timezone.now() - timezone.timedelta(
+        seconds=getattr(settings, "LIBRARY_EVENT_RETENTION", 86400)
+    )
+    events = LibraryEvent.objects.filter(created_at__lt=cutoff)
+    if userprofile_id is not None:
+        events = events.filter(userprofile_id=userprofile_id)
+    events.delete()
+
+
+def latest_event_id(userprofile_id: int) -> int:
+    """Return the ID of the user's last event, the cursor for "from now on"."""
+    return (
+        LibraryEvent.objects.filter(userprofile_id=userprofile_id).aggregate(
+            latest=Max("id")
+        )["latest"]
+        or 0
+    )
+
+
+def events_after(userprofile_id: int, cursor: int, limit: int = 100) -> List[dict]:
+    """Return up to ``limit`` of the user's events after the cursor, oldest first."""
+    events = LibraryEvent.objects.filter(
+        userprofile_id=userprofile_id, id__gt=cursor
+    ).order_by("id")[:limit]
+    return [
+        {
+            "id": event.id,
+            "event": event.kind,
+            "data": event.data,
+            "created_at": event.created_at.isoformat(),
+        }
+        for event in events
+    ]
+
+
+def wait_for_events(userprofile_id: int, cursor: int, timeout: float) -> List[dict]:
+    """Return events after the cursor, waiting for up to ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    for interval in _poll_intervals():
+        events = events_after(userprofile_id, cursor)
+        if events or time.monotonic() >= deadline:
+            return events
+        _wait_for_publish(min(interval, max(deadline - time.monotonic(), 0)))
+
+
+def format_sse(event: dict) -> str:
+    """Format an event as a server-sent event message."""
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+    )
+
+
+def event_stream(userprofile_id: int, cursor: int) -> Iterator[str]:
+    """
+    Yield the user's events after the cursor as server-sent events.
+
+    The stream ends after LIBRARY_EVENT_STREAM_SECONDS; browsers reconnect
+    on their own and resume from the last ``id`` they received.
+    """
+    heartbeat = getattr(settings, "LIBRARY_EVENT_HEARTBEAT", 15)
+    deadline = time.monotonic() + getattr(settings, "LIBRARY_EVENT_STREAM_SECONDS", 55)
+    last_sent = time.monotonic()
+    intervals = _poll_intervals()
+    yield "retry: 1000\n\n"
+    while time.monotonic() < deadline:
+        events = events_after(userprofile_id, cursor)
+        for event in events:
+            yield format_sse(event)
+        if events:
+            cursor = events[-1]["id"]
+            last_sent = time.monotonic()
+            intervals = _poll_intervals()
+        elif time.monotonic() - last_sent >= heartbeat:
+            # Keeps proxies from closing an idle stream.
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        else:
+            _wait_for_publish(min(next(intervals), max(deadline - time.monotonic(), 0)))
+
+
+class EventStream:
+    """``event_stream`` that gives its reader slot back once it is closed."""
+
+    def __init__(self, userprofile_id: int, cursor: int):
+        self._events = event_stream(userprofile_id, cursor)
+        self._open = True
+
+    def __iter__(self):
+        return self._events
+
+    def close(self) -> None:
+        self._events.close()
+        if self._open:
+            self._open = False
+            reader_slots.release()
@@ -0,0 +1,97 @@
+"""
+In-process natural key to primary key caches used by ingest.
+
+A library sync sees the same artists and genres over and over; resolving
+them from these caches saves a ``get_or_create`` round trip per occurrence.
+Entries are only ever added for rows that exist, and are dropped when a row
+is deleted in this process (see ``albums.signals``). A row deleted by another
+process stays cached here; writes that use the caches run through
+``run_with_fresh_lookups``, which retries them once with the caches cleared
+when they fail on such a stale key.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from django.db import IntegrityError, models, transaction
+
+from .models import Artist, Genre
+
+
+class LookupCache:
+    """Thread-safe map from a unique field of ``model`` to primary keys."""
+
+    def __init__(self, model: type[models.Model], field: str, maxsize: int = 100_000):
+        self.model = model
+        self.field = field
+        self.maxsize = maxsize
+        self._ids: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, ids: Dict[Hashable, int]) -> None:
+        with self._lock:
+            if len(self._ids) + len(ids) > self.maxsize:
+                self._ids.clear()
+            self._ids.update(ids)
+
+    def resolve(
+        self,
+        keys: Iterable[Hashable],
+        defaults: Optional[Callable[[Hashable], dict]] = None,
+    ) -> Dict[Hashable, int]:
+        """
+        Return the primary key for every key, creating missing rows.
+
+        Cached keys cost nothing, the rest are loaded with one query and only
+        keys that are still missing go through ``get_or_create``.
+        """
+        keys = set(keys)
+        with self._lock:
+            ids = {key: self._ids[key] for key in keys if key in self._ids}
+
+        missing = keys - ids.keys()
+        if missing:
+            found = dict(
+                self.model.objects.filter(**{f"{self.field}__in": missing}).values_list(
+                    self.field, "pk"
+                )
+            )
+            for key in missing - found.keys():
+                found[key] = self.model.objects.get_or_create(
+                    **{self.field: key}, defaults=defaults(key) if defaults else None
+                )[0].pk
+            self._store(found)
+            ids.update(found)
+        return ids
+
+    def discard_ids(self, pks: Iterable[int]) -> None:
+        pks = set(pks)
+        with self._lock:
+            for key in [key for key, pk in self._ids.items() if pk in pks]:
+                del self._ids[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+
+genre_ids = LookupCache(Genre, "name")
+artist_ids = LookupCache(Artist, "spotify_id")
+
+
+def run_with_fresh_lookups(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run ``func`` in its own transaction, retrying it once with the lookup
+    caches cleared if it fails with an IntegrityError.
+
+    Foreign keys are checked when the transaction commits, so this must be
+    the outermost transaction; nesting it raises RuntimeError.
+    """
+    try:
+        with transaction.atomic(durable=True):
+            return func(*args, **kwargs)
+    except IntegrityError:
+        artist_ids.clear()
+        genre_ids.clear()
+    with transaction.atomic(durable=True):
+        return func(*args, **kwargs)
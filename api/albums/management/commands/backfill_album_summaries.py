@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from albums.models import Album, refresh_album_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized summary columns of every album."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        album_ids = list(Album.objects.order_by("id").values_list("id", flat=True))
+
+        for start in range(0, len(album_ids), batch_size):
+            batch = album_ids[start : start + batch_size]
+            refresh_album_summaries(Album.objects.filter(id__in=batch))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled summaries for {len(album_ids)} albums")
+        )
@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from rest_framework.test import APIClient
+
+from user.models import UserProfile
+
+DEFAULT_ENDPOINTS = ["/profile/", "/albums/", "/records/", "/recommendations/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency of read-heavy endpoints against the configured database. "
+        "Run it once per configuration to compare, e.g. with DB_CONN_MAX_AGE=0, "
+        "with the default persistent connections and with TURSO_REPLICA_PATH set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--username", help="Profile to authenticate as.")
+        parser.add_argument("endpoints", nargs="*", default=DEFAULT_ENDPOINTS)
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.select_related("user")
+        if options["username"]:
+            profiles = profiles.filter(user__username=options["username"])
+        profile = profiles.first()
+        if profile is None:
+            raise CommandError("No user profile to authenticate as")
+
+        database = settings.DATABASES["default"]
+        self.stdout.write(
+            f"{database['ENGINE']} CONN_MAX_AGE={database.get('CONN_MAX_AGE', 0)} "
+            f"as {profile.user.username}"
+        )
+
+        client = APIClient()
+        client.force_authenticate(profile.user)
+        for endpoint in options["endpoints"]:
+            timings = []
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                response = client.get(endpoint)
+                # The test client skips the request_finished signal, so close
+                # connections the way a real request boundary would.
+                close_old_connections()
+                timings.append((time.perf_counter() - started) * 1000)
+
+            percentiles = statistics.quantiles(timings, n=20)
+            self.stdout.write(
+                f"{endpoint:<20} status={response.status_code} "
+                f"p50={statistics.median(timings):.1f}ms "
+                f"p95={percentiles[18]:.1f}ms mean={statistics.fmean(timings):.1f}ms"
+            )
@@ -0,0 +1,104 @@
+import json
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from MyBeautifulAlbums import fastjson
+
+
+def _artist(i: int) -> dict:
+    return {
+        "id": i,
+        "spotify_id": f"{i:022d}",
+        "source_url": f"https://open.spotify.com/artist/{i:022d}",
+        "name": f"Artist {i}",
+    }
+
+
+def _album(i: int, tracks: int) -> dict:
+    artists = [_artist(i % 500), _artist((i * 7) % 500)]
+    return {
+        "id": i,
+        "artist": artists,
+        "genres": [{"id": g, "name": f"genre {g}"} for g in range(i % 4)],
+        "tracks": [
+            {
+                "id": i * 100 + t,
+                "artist": [a["id"] for a in artists],
+                "spotify_id": f"{i * 100 + t:022d}",
+                "name": f"Track {t} of album {i} ünïcödé",
+                "duration_ms": random.randint(90_000, 420_000),
+                "track_number": t + 1,
+                "source_url": f"https://open.spotify.com/track/{i * 100 + t:022d}",
+                "is_explicit": bool(t % 3),
+            }
+            for t in range(tracks)
+        ],
+        "spotify_id": f"{i:022d}",
+        "name": f"Album {i}",
+        "release_date": "2019-03-08",
+        "img_url": f"https://i.scdn.co/image/{i:040x}",
+        "source_url": f"https://open.spotify.com/album/{i:022d}",
+        "copyright": "(P) 2019 Some Label",
+        "label": "Some Label",
+        "popularity": i % 100,
+    }
+
+
+def profile_payload(records: int, tracks: int) -> dict:
+    """A /profile/ response shaped like UserProfileSerializer output."""
+    return {
+        "user": {"id": 1, "username": "bench", "email": "", "first_name": "Bench"},
+        "img_profile_url": "https://i.scdn.co/image/profile",
+        "records": [
+            {
+                "id": i,
+                "album": _album(i, tracks),
+                "date_added": "2024-09-01",
+                "is_liked": True,
+                "is_loved": bool(i % 5 == 0),
+                "is_listened": bool(i % 2),
+                "want_to_listen": False,
+                "userprofile": 1,
+            }
+            for i in range(records)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare stdlib and fast JSON encoding/decoding on realistic payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=1000)
+        parser.add_argument("--tracks", type=int, default=12)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _time(self, func) -> float:
+        return min(timeit.repeat(func, number=1, repeat=self.repeat)) * 1000
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        random.seed(0)
+        payloads = {
+            "profile": profile_payload(options["records"], options["tracks"]),
+            "album list": [_album(i, options["tracks"]) for i in range(100)],
+        }
+        if fastjson.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed"))
+
+        for name, payload in payloads.items():
+            encoded = fastjson.dumps(payload)
+            rows = {
+                "render (drf)": self._time(lambda: JSONRenderer().render(payload)),
+                "render (fast)": self._time(
+                    lambda: fastjson.FastJSONRenderer().render(payload)
+                ),
+                "decode (stdlib)": self._time(lambda: json.loads(encoded)),
+                "decode (fast)": self._time(lambda: fastjson.loads(encoded)),
+            }
+            self.stdout.write(f"{name}: {len(encoded) / 1024:.0f} KiB")
+            for label, elapsed in rows.items():
+                self.stdout.write(f"  {label:<16} {elapsed:8.2f} ms")
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from albums.recommendations import top_k_neighbours
+
+
+class Command(BaseCommand):
+    help = "Benchmark the neighbour computation on a synthetic records matrix."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--albums", type=int, default=20_000)
+        parser.add_argument("--records-per-user", type=int, default=50)
+        parser.add_argument("--features", type=int, default=2_000)
+        parser.add_argument("--top-k", type=int, default=20)
+        parser.add_argument(
+            "--dirty",
+            type=float,
+            default=0.05,
+            help="Share of albums recomputed by the incremental run.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        users, albums = options["users"], options["albums"]
+
+        nnz = users * options["records_per_user"]
+        popularity = rng.zipf(1.3, nnz) % albums
+        interactions = sparse.csr_matrix(
+            (
+                rng.choice([1.0, 2.0, 3.0, 6.0], nnz).astype(np.float32),
+                (rng.integers(0, users, nnz), popularity),
+            ),
+            shape=(users, albums),
+        )
+        features = sparse.csr_matrix(
+            (
+                np.ones(albums * 4, dtype=np.float32),
+                (
+                    np.repeat(np.arange(albums), 4),
+                    rng.integers(0, options["features"], albums * 4),
+                ),
+            ),
+            shape=(albums, options["features"]),
+        )
+        self.stdout.write(
+            f"{users} users x {albums} albums, {interactions.nnz} interactions"
+        )
+
+        dirty = rng.choice(albums, int(albums * options["dirty"]), replace=False)
+        for label, rows in (
+            ("full", np.arange(albums)),
+            ("incremental", np.sort(dirty)),
+        ):
+            started = time.perf_counter()
+            count = sum(
+                len(columns)
+                for _, columns, _ in top_k_neighbours(
+                    interactions, features, rows, options["top_k"], 0.3
+                )
+            )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label}: {len(rows)} albums, {count} neighbours in {elapsed:.2f}s"
+            )
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from albums.models import Album, Record
+from user.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query count, payload size and latency of full and sparse "
+        "(?fields=/?expand=) album and record responses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--username", help="Profile to authenticate as.")
+        parser.add_argument(
+            "--fields",
+            default="id,name,img_url,artist",
+            help="Sparse fieldset to compare against the full response.",
+        )
+        parser.add_argument("--expand", default="artist")
+
+    def _measure(self, client, url: str, requests: int):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}")
+
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        return len(queries), len(response.content), statistics.median(timings)
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.select_related("user")
+        if options["username"]:
+            profiles = profiles.filter(user__username=options["username"])
+        profile = profiles.first()
+        if profile is None:
+            raise CommandError("No user profile to authenticate as")
+
+        client = APIClient()
+        client.force_authenticate(profile.user)
+
+        sparse = f"?fields={options['fields']}&expand={options['expand']}"
+        endpoints = ["/albums/", "/records/"]
+        album = Album.objects.order_by("id").first()
+        if album is not None:
+            endpoints.append(f"/albums/{album.pk}/")
+        record = Record.objects.order_by("id").first()
+        if record is not None:
+            endpoints.append(f"/records/{record.pk}/")
+
+        self.stdout.write(f"sparse fieldset: {sparse}")
+        for endpoint in endpoints:
+            for label, url in (("full", endpoint), ("sparse", endpoint + sparse)):
+                queries, size, median = self._measure(
+                    client, url, options["requests"]
+                )
+                self.stdout.write(
+                    f"{endpoint:<16} {label:<7} queries={queries:<3} "
+                    f"bytes={size:<9} p50={median:.1f}ms"
+                )
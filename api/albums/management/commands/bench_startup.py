@@ -0,0 +1,76 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: everything a gunicorn worker does before its
+# first request (settings, apps, URLconf with every view, middleware).
+WORKER_BOOT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+get_resolver().url_patterns
+WSGIHandler()
+print(json.dumps({
+    "ms": (time.perf_counter() - started) * 1000,
+    "rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy": [
+        name
+        for name in ("numpy", "scipy", "PIL.Image", "drf_spectacular.views")
+        if name in sys.modules
+    ],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker boot time, peak RSS and module count for each settings "
+        "module, e.g. the default and production profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "settings_modules",
+            nargs="*",
+            default=[
+                "MyBeautifulAlbums.settings",
+                "MyBeautifulAlbums.settings_production",
+            ],
+        )
+
+    def _boot(self, settings_module: str) -> dict:
+        result = subprocess.run(
+            [sys.executable, "-c", WORKER_BOOT],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": settings_module,
+                "PYTHONPATH": str(settings.BASE_DIR),
+            },
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for settings_module in options["settings_modules"]:
+            runs = [self._boot(settings_module) for _ in range(options["runs"])]
+            self.stdout.write(
+                f"{settings_module:<40} "
+                f"boot p50={statistics.median(run['ms'] for run in runs):.0f}ms "
+                f"rss={max(run['rss_kib'] for run in runs) / 1024:.1f}MiB "
+                f"modules={runs[0]['modules']} "
+                f"heavy={','.join(runs[0]['heavy']) or '-'}"
+            )
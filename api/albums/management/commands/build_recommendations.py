@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from albums.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored top-K album neighbours used for recommendations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every album instead of only those changed since the last build.",
+        )
+
+    def handle(self, *args, **options):
+        build = build_recommendations(full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Full' if build.is_full else 'Incremental'} build updated "
+                f"{build.albums_updated} albums in {build.duration_ms} ms"
+            )
+        )
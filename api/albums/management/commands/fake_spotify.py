@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from MyBeautifulAlbums.fake_spotify import FakeSpotifyConfig, make_fake_spotify_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve an offline fake of the Spotify API and accounts service. Point "
+        "SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL at it for integration and "
+        "load tests."
+    )
+
+    def add_arguments(self, parser):
+        defaults = FakeSpotifyConfig()
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--catalog-size", type=int, default=defaults.catalog_size)
+        parser.add_argument("--library-size", type=int, default=defaults.library_size)
+        parser.add_argument(
+            "--tracks-per-album", type=int, default=defaults.tracks_per_album
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=defaults.latency_ms,
+            help="Delay added to every response.",
+        )
+        parser.add_argument(
+            "--jitter-ms",
+            type=float,
+            default=defaults.jitter_ms,
+            help="Random extra delay of up to this much per response.",
+        )
+        parser.add_argument(
+            "--rate-limit-ratio",
+            type=float,
+            default=defaults.rate_limit_ratio,
+            help="Share of requests answered with 429 Too Many Requests.",
+        )
+        parser.add_argument("--retry-after", type=int, default=defaults.retry_after)
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+
+    def handle(self, *args, **options):
+        config = FakeSpotifyConfig(
+            catalog_size=options["catalog_size"],
+            library_size=options["library_size"],
+            tracks_per_album=options["tracks_per_album"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            rate_limit_ratio=options["rate_limit_ratio"],
+            retry_after=options["retry_after"],
+            seed=options["seed"],
+        )
+        server = make_fake_spotify_server(options["host"], options["port"], config)
+        host, port = server.server_address[:2]
+        self.stdout.write(
+            f"Fake Spotify on http://{host}:{port}\n"
+            f"  SPOTIFY_API_URL=http://{host}:{port}/v1\n"
+            f"  SPOTIFY_ACCOUNTS_URL=http://{host}:{port}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from MyBeautifulAlbums.fake_spotify import FakeSpotifyConfig, make_fake_spotify_server
+from MyBeautifulAlbums.loadtest import MIXES, LoadTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running deployment with a mix of profile, album, record, "
+        "add_album and sync requests, and report throughput, p50/p95/p99 "
+        "latency and error rate per endpoint at increasing concurrency. Start "
+        "the server with SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL pointed at "
+        "the fake Spotify (see --fake-spotify)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+        parser.add_argument(
+            "--concurrency",
+            default="1,5,10,25,50",
+            help="Comma-separated concurrency levels, one stage each.",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=20.0, help="Seconds per stage."
+        )
+        parser.add_argument(
+            "--users", type=int, default=10, help="Virtual users to log in."
+        )
+        parser.add_argument("--think-ms", type=float, default=0.0)
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--seed-timeout",
+            type=float,
+            default=120.0,
+            help="Seconds to wait for a new user's library sync.",
+        )
+        parser.add_argument(
+            "--fake-spotify",
+            action="store_true",
+            help="Serve the fake Spotify from this process on --fake-port.",
+        )
+        parser.add_argument("--fake-port", type=int, default=8765)
+        parser.add_argument("--fake-latency-ms", type=float, default=0.0)
+        parser.add_argument("--library-size", type=int, default=50)
+        parser.add_argument("--json", dest="json_path", help="Write results here.")
+
+    def _start_fake_spotify(self, options):
+        server = make_fake_spotify_server(
+            "127.0.0.1",
+            options["fake_port"],
+            FakeSpotifyConfig(
+                library_size=options["library_size"],
+                latency_ms=options["fake_latency_ms"],
+            ),
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(
+            f"Fake Spotify on http://127.0.0.1:{server.server_address[1]}"
+        )
+        return server
+
+    def _write_stage(self, result: dict) -> None:
+        self.stdout.write(
+            f"\nconcurrency={result['concurrency']} ({result['seconds']}s)\n"
+            f"{'endpoint':<12} {'requests':>8} {'rps':>8} {'p50':>8} "
+            f"{'p95':>8} {'p99':>8} {'errors':>8}"
+        )
+        rows = [*result["endpoints"].items(), ("total", result["total"])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:<12} {row['requests']:>8} {row['rps']:>8} "
+                f"{row['p50_ms']:>6}ms {row['p95_ms']:>6}ms {row['p99_ms']:>6}ms "
+                f"{row['error_rate']:>8.1%}"
+            )
+
+    async def _run(self, load_test: LoadTest, options) -> list:
+        await load_test.setup(options["users"], options["seed_timeout"])
+        self.stdout.write(
+            f"{len(load_test.users)} users, "
+            f"{len(load_test.catalog.album_pks)} albums, mix={options['mix']}"
+        )
+        results = []
+        for concurrency in options["concurrency"]:
+            result = await load_test.run_stage(concurrency, options["duration"])
+            self._write_stage(result)
+            results.append(result)
+        return results
+
+    def handle(self, *args, **options):
+        try:
+            options["concurrency"] = [
+                int(level) for level in options["concurrency"].split(",")
+            ]
+            load_test = LoadTest(
+                options["base_url"],
+                MIXES[options["mix"]],
+                timeout=options["timeout"],
+                think_ms=options["think_ms"],
+                seed=options["seed"],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        fake = self._start_fake_spotify(options) if options["fake_spotify"] else None
+        try:
+            results = asyncio.run(self._run(load_test, options))
+        except (OSError, RuntimeError) as error:
+            raise CommandError(error)
+        finally:
+            if fake is not None:
+                fake.shutdown()
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as file:
+                json.dump({"mix": options["mix"], "stages": results}, file, indent=2)
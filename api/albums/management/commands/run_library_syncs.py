@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from albums.tasks import claim_library_sync, run_library_sync
+
+
+class Command(BaseCommand):
+    help = "Run the Spotify library syncs queued by new logins."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new requests.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=getattr(settings, "LIBRARY_SYNC_POLL_INTERVAL", 5),
+            help="Seconds to wait between polls of an empty queue.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            user_id = claim_library_sync()
+            if user_id is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            started = time.perf_counter()
+            synced = run_library_sync(user_id)
+            elapsed_ms = round((time.perf_counter() - started) * 1000)
+            if synced:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Synced user {user_id} in {elapsed_ms} ms")
+                )
+            else:
+                self.stderr.write(f"Sync of user {user_id} failed")
@@ -0,0 +1,95 @@
+# Generated by Django 5.0.8 on 2026-10-19 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Artist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(blank=True, db_index=True, max_length=100, null=True, unique=True)),
+                ('source_url', models.URLField(blank=True, null=True)),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Artist',
+                'verbose_name_plural': 'Artists',
+            },
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Genre',
+                'verbose_name_plural': 'Genres',
+            },
+        ),
+        migrations.CreateModel(
+            name='Album',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(blank=True, db_index=True, max_length=100, null=True, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('release_date', models.CharField(blank=True, max_length=100, null=True)),
+                ('img_url', models.URLField(blank=True, null=True)),
+                ('source_url', models.URLField(blank=True, null=True)),
+                ('copyright', models.CharField(blank=True, max_length=100, null=True)),
+                ('label', models.CharField(blank=True, max_length=100, null=True)),
+                ('popularity', models.IntegerField(blank=True, null=True)),
+                ('artist', models.ManyToManyField(related_name='albums', to='albums.artist')),
+                ('genres', models.ManyToManyField(related_name='genres', to='albums.genre')),
+            ],
+            options={
+                'verbose_name': 'Album',
+                'verbose_name_plural': 'Albums',
+            },
+        ),
+        migrations.CreateModel(
+            name='Record',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_added', models.DateField(auto_now=True)),
+                ('is_liked', models.BooleanField(default=False)),
+                ('is_loved', models.BooleanField(default=False)),
+                ('is_listened', models.BooleanField(default=False)),
+                ('want_to_listen', models.BooleanField(default=False)),
+                ('album', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='albums.album')),
+                ('userprofile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='user.userprofile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(blank=True, db_index=True, max_length=100, null=True, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('duration_ms', models.IntegerField()),
+                ('track_number', models.IntegerField(default=1)),
+                ('source_url', models.URLField(blank=True, null=True)),
+                ('is_explicit', models.BooleanField(default=False)),
+                ('artist', models.ManyToManyField(related_name='artists', to='albums.artist')),
+            ],
+            options={
+                'verbose_name': 'Track',
+                'verbose_name_plural': 'Tracks',
+            },
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='tracks',
+            field=models.ManyToManyField(related_name='tracks', to='albums.track'),
+        ),
+    ]
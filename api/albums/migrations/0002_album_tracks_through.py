@@ -0,0 +1,148 @@
+"""
+Move Album.tracks onto the AlbumTrack through model.
+
+Django cannot alter a many-to-many field into one with a custom through
+model, so AlbumTrack is created as a new table, the rows of the implicit
+``albums_album_tracks`` table are copied into it and the old table is
+dropped. Only the field's state is swapped. Copied tracks are placed on disc
+1 at their ``track_number``; the next sync or admin refresh fills in the
+real disc numbers.
+"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def copy_album_tracks(apps, schema_editor):
+    Album = apps.get_model("albums", "Album")
+    AlbumTrack = apps.get_model("albums", "AlbumTrack")
+    db_alias = schema_editor.connection.alias
+
+    links = Album.tracks.through.objects.using(db_alias).values_list(
+        "album_id", "track_id", "track__track_number"
+    )
+    AlbumTrack.objects.using(db_alias).bulk_create(
+        (
+            AlbumTrack(album_id=album_id, track_id=track_id, position=position)
+            for album_id, track_id, position in links.iterator(chunk_size=5000)
+        ),
+        batch_size=1000,
+    )
+    Album.objects.using(db_alias).update(
+        total_duration_ms=Coalesce(
+            Subquery(
+                AlbumTrack.objects.filter(album_id=OuterRef("pk"))
+                .values("album_id")
+                .annotate(total=Sum("track__duration_ms"))
+                .values("total")
+            ),
+            0,
+        )
+    )
+
+
+def drop_implicit_tracks_table(apps, schema_editor):
+    Album = apps.get_model("albums", "Album")
+    schema_editor.delete_model(Album.tracks.through)
+
+
+def restore_implicit_tracks_table(apps, schema_editor):
+    Album = apps.get_model("albums", "Album")
+    AlbumTrack = apps.get_model("albums", "AlbumTrack")
+    db_alias = schema_editor.connection.alias
+
+    through = Album.tracks.through
+    schema_editor.create_model(through)
+    through.objects.using(db_alias).bulk_create(
+        (
+            through(album_id=album_id, track_id=track_id)
+            for album_id, track_id in AlbumTrack.objects.using(db_alias)
+            .values_list("album_id", "track_id")
+            .iterator(chunk_size=5000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("albums", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="total_duration_ms",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="AlbumTrack",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("disc_number", models.PositiveSmallIntegerField(default=1)),
+                ("position", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "album",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="album_tracks",
+                        to="albums.album",
+                    ),
+                ),
+                (
+                    "track",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="album_tracks",
+                        to="albums.track",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Album Track",
+                "verbose_name_plural": "Album Tracks",
+                "ordering": ["disc_number", "position"],
+                "indexes": [
+                    models.Index(
+                        fields=["album", "disc_number", "position"],
+                        name="album_track_order_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("album", "track"), name="unique_album_track"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_album_tracks, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(
+                    drop_implicit_tracks_table, restore_implicit_tracks_table
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="album",
+                    name="tracks",
+                    field=models.ManyToManyField(
+                        related_name="tracks",
+                        through="albums.AlbumTrack",
+                        to="albums.track",
+                    ),
+                ),
+            ],
+        ),
+    ]
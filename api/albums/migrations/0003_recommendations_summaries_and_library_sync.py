@@ -0,0 +1,168 @@
+# Generated by Django 5.0.8 on 2026-10-19 19:20
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def merge_duplicate_genres(apps, schema_editor):
+    """Merge genres sharing a name into the oldest one before it becomes unique."""
+    Album = apps.get_model("albums", "Album")
+    Genre = apps.get_model("albums", "Genre")
+    db_alias = schema_editor.connection.alias
+    through = Album.genres.through
+
+    groups = defaultdict(list)
+    for genre_id, name in (
+        Genre.objects.using(db_alias).order_by("id").values_list("id", "name")
+    ):
+        groups[name].append(genre_id)
+
+    for keep_id, *merged_ids in (ids for ids in groups.values() if len(ids) > 1):
+        tagged = set(
+            through.objects.using(db_alias)
+            .filter(genre_id=keep_id)
+            .values_list("album_id", flat=True)
+        )
+        moved = set(
+            through.objects.using(db_alias)
+            .filter(genre_id__in=merged_ids)
+            .values_list("album_id", flat=True)
+        )
+        through.objects.using(db_alias).bulk_create(
+            through(album_id=album_id, genre_id=keep_id) for album_id in moved - tagged
+        )
+        through.objects.using(db_alias).filter(genre_id__in=merged_ids).delete()
+        Genre.objects.using(db_alias).filter(id__in=merged_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0002_album_tracks_through'),
+        ('user', '0002_userprofile_library_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlbumNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Album Neighbour',
+                'verbose_name_plural': 'Album Neighbours',
+            },
+        ),
+        migrations.CreateModel(
+            name='LibraryEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('record-changed', 'Record changed'), ('sync-progress', 'Sync progress')], max_length=20)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Library Event',
+                'verbose_name_plural': 'Library Events',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecommendationBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField(auto_now_add=True)),
+                ('is_full', models.BooleanField(default=False)),
+                ('max_album_id', models.BigIntegerField(default=0)),
+                ('albums_updated', models.IntegerField(default=0)),
+                ('duration_ms', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Recommendation Build',
+                'verbose_name_plural': 'Recommendation Builds',
+                'get_latest_by': 'built_at',
+            },
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='genre_names',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='images',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='primary_artist_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='track_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(merge_duplicate_genres, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='genre',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='album_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='artist_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='genre_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['userprofile', 'version'], name='record_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='track_name_nocase_idx'),
+        ),
+        migrations.AddField(
+            model_name='albumneighbour',
+            name='album',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='albums.album'),
+        ),
+        migrations.AddField(
+            model_name='albumneighbour',
+            name='neighbour',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='albums.album'),
+        ),
+        migrations.AddField(
+            model_name='libraryevent',
+            name='userprofile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='library_events', to='user.userprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='albumneighbour',
+            constraint=models.UniqueConstraint(fields=('album', 'neighbour'), name='unique_album_neighbour'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryevent',
+            index=models.Index(fields=['userprofile', 'id'], name='libraryevent_cursor_idx'),
+        ),
+    ]
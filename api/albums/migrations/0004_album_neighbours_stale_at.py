@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0003_recommendations_summaries_and_library_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='neighbours_stale_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,10 +1,17 @@
-from django.db import models
+from collections import defaultdict
+from functools import partial
+from typing import Iterable, Optional
+
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Collate
+from django.utils import timezone
 
 from user.models import UserProfile
 
 
 class Genre(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
         return self.name
@@ -12,6 +19,10 @@ class Genre(models.Model):
     class Meta:
         verbose_name = "Genre"
         verbose_name_plural = "Genres"
+        indexes = [
+            # NOCASE so the admin's case-insensitive prefix search can use it.
+            models.Index(Collate("name", "nocase"), name="genre_name_nocase_idx")
+        ]
 
 
 class Artist(models.Model):
@@ -27,6 +38,9 @@ class Artist(models.Model):
     class Meta:
         verbose_name = "Artist"
         verbose_name_plural = "Artists"
+        indexes = [
+            models.Index(Collate("name", "nocase"), name="artist_name_nocase_idx")
+        ]
 
 
 class Track(models.Model):
@@ -46,6 +60,9 @@ class Track(models.Model):
     class Meta:
         verbose_name = "Track"
         verbose_name_plural = "Tracks"
+        indexes = [
+            models.Index(Collate("name", "nocase"), name="track_name_nocase_idx")
+        ]
 
 
 class Album(models.Model):
@@ -56,19 +73,202 @@ class Album(models.Model):
     artist = models.ManyToManyField(Artist, related_name="albums")
     release_date = models.CharField(max_length=100, null=True, blank=True)
     img_url = models.URLField(null=True, blank=True)
+    images = models.JSONField(default=list, blank=True)
     source_url = models.URLField(null=True, blank=True)
-    tracks = models.ManyToManyField(Track, related_name="tracks")
+    tracks = models.ManyToManyField(Track, related_name="tracks", through="AlbumTrack")
     genres = models.ManyToManyField(Genre, related_name="genres")
     copyright = models.CharField(max_length=100, null=True, blank=True)
     label = models.CharField(max_length=100, null=True, blank=True)
     popularity = models.IntegerField(null=True, blank=True)
+    total_duration_ms = models.BigIntegerField(default=0)
+    primary_artist_name = models.CharField(max_length=100, blank=True, default="")
+    track_count = models.IntegerField(default=0)
+    genre_names = models.JSONField(default=list, blank=True)
+    # Set when the album's genres or artists change or one of its stored
+    # neighbours is deleted, so the next incremental build recomputes it.
+    neighbours_stale_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    SUMMARY_FIELDS = [
+        "primary_artist_name",
+        "track_count",
+        "total_duration_ms",
+        "genre_names",
+    ]
 
     def __str__(self):
         return self.name
 
+    def image_for(self, size: int) -> dict | None:
+        """Return the smallest stored image at least ``size`` pixels wide."""
+        images = sorted(self.images, key=lambda image: image.get("width") or 0)
+        for image in images:
+            if (image.get("width") or 0) >= size:
+                return image
+        return images[-1] if images else None
+
+    def refresh_summary(self, save: bool = True) -> None:
+        """
+        Recompute the denormalized columns served by list views, saving them
+        only if they changed.
+        """
+        before = [getattr(self, name) for name in self.SUMMARY_FIELDS]
+        self.primary_artist_name = (
+            Album.artist.through.objects.filter(album=self)
+            .order_by("id")
+            .values_list("artist__name", flat=True)
+            .first()
+            or ""
+        )
+        totals = self.album_tracks.aggregate(
+            count=models.Count("id"), duration=models.Sum("track__duration_ms")
+        )
+        self.track_count = totals["count"]
+        self.total_duration_ms = totals["duration"] or 0
+        self.genre_names = list(
+            Album.genres.through.objects.filter(album=self)
+            .order_by("id")
+            .values_list("genre__name", flat=True)
+        )
+        if save and before != [getattr(self, name) for name in self.SUMMARY_FIELDS]:
+            self.save(update_fields=self.SUMMARY_FIELDS)
+
     class Meta:
         verbose_name = "Album"
         verbose_name_plural = "Albums"
+        indexes = [
+            models.Index(Collate("name", "nocase"), name="album_name_nocase_idx")
+        ]
+
+
+class AlbumTrack(models.Model):
+    album = models.ForeignKey(
+        Album, on_delete=models.CASCADE, related_name="album_tracks"
+    )
+    track = models.ForeignKey(
+        Track, on_delete=models.CASCADE, related_name="album_tracks"
+    )
+    disc_number = models.PositiveSmallIntegerField(default=1)
+    position = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.album_id}: {self.disc_number}-{self.position}"
+
+    class Meta:
+        verbose_name = "Album Track"
+        verbose_name_plural = "Album Tracks"
+        ordering = ["disc_number", "position"]
+        constraints = [
+            models.UniqueConstraint(fields=["album", "track"], name="unique_album_track")
+        ]
+        indexes = [
+            models.Index(
+                fields=["album", "disc_number", "position"],
+                name="album_track_order_idx",
+            )
+        ]
+
+
+def ordered_tracks_prefetch() -> models.Prefetch:
+    """Prefetch an album's tracks in disc/position order in one indexed query."""
+    return models.Prefetch(
+        "album_tracks",
+        queryset=AlbumTrack.objects.select_related("track").prefetch_related(
+            "track__artist"
+        ),
+    )
+
+
+def refresh_album_summaries(
+    albums: models.QuerySet, fields: Optional[Iterable[str]] = None
+) -> None:
+    """
+    Recompute ``fields`` of ``Album.SUMMARY_FIELDS`` for every album in
+    ``albums`` in bulk, instead of calling ``refresh_summary`` per album.
+
+    Artist names and track totals are set with one UPDATE of correlated
+    subqueries. ``genre_names`` is a JSON list, so it is read in one query
+    and written with ``bulk_update``.
+    """
+    fields = set(Album.SUMMARY_FIELDS if fields is None else fields)
+    tracks = AlbumTrack.objects.filter(album=OuterRef("pk")).order_by().values("album")
+    expressions = {
+        "primary_artist_name": lambda: Coalesce(
+            Subquery(
+                Album.artist.through.objects.filter(album=OuterRef("pk"))
+                .order_by("id")
+                .values("artist__name")[:1]
+            ),
+            Value(""),
+        ),
+        "track_count": lambda: Coalesce(
+            Subquery(tracks.annotate(count=Count("id")).values("count")), 0
+        ),
+        "total_duration_ms": lambda: Coalesce(
+            Subquery(
+                tracks.annotate(duration=Sum("track__duration_ms")).values("duration")
+            ),
+            0,
+        ),
+    }
+    updates = {name: expressions[name]() for name in fields & expressions.keys()}
+    if updates:
+        albums.update(**updates)
+
+    if "genre_names" in fields:
+        names = defaultdict(list)
+        links = (
+            Album.genres.through.objects.filter(album__in=albums)
+            .order_by("id")
+            .values_list("album_id", "genre__name")
+        )
+        for album_id, name in links:
+            names[album_id].append(name)
+        Album.objects.bulk_update(
+            [
+                Album(pk=pk, genre_names=names[pk])
+                for pk in albums.values_list("pk", flat=True)
+            ],
+            ["genre_names"],
+            batch_size=500,
+        )
+
+
+def mark_neighbours_stale(albums: models.QuerySet) -> None:
+    """Flag ``albums`` for the next incremental recommendation build."""
+    albums.update(neighbours_stale_at=timezone.now())
+
+
+def next_library_version(userprofile_id: int) -> int:
+    """
+    Return the user's library version for a change; call it in a transaction.
+
+    The version is bumped once per transaction, so every change written in
+    it shares one version. Versions bumped in the open transaction are kept
+    on the connection until it commits, and reused only while the profile
+    row still holds them: a rolled back savepoint undoes the bump, and the
+    next change bumps again.
+    """
+    connection = transaction.get_connection(router.db_for_write(UserProfile))
+    bumped = connection.__dict__.setdefault("bumped_library_versions", {})
+    profiles = UserProfile.objects.using(connection.alias).filter(pk=userprofile_id)
+    version = bumped.get(userprofile_id)
+    if version is not None and profiles.filter(library_version=version).exists():
+        return version
+
+    profiles.update(library_version=F("library_version") + 1)
+    version = profiles.values_list("library_version", flat=True).get()
+    bumped[userprofile_id] = version
+    transaction.on_commit(
+        partial(bumped.pop, userprofile_id, None), using=connection.alias
+    )
+    return version
+
+
+class LiveRecordManager(models.Manager):
+    """Records that have not been deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Record(models.Model):
@@ -81,10 +281,99 @@ class Record(models.Model):
     userprofile = models.ForeignKey(
         UserProfile, on_delete=models.CASCADE, related_name="records"
     )
+    # The user's library version at the record's last change, for delta sync.
+    version = models.BigIntegerField(default=0)
+    # Deleted records stay behind as tombstones so delta sync can report them.
+    # Deleting an album still hard-deletes its records through the cascade;
+    # clients only see those go on their next full snapshot.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveRecordManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return f"{self.album.name} - {self.date_added}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["userprofile", "version"], name="record_version_idx")
+        ]
+
+    def save(self, *args, update_fields=None, **kwargs):
+        with transaction.atomic():
+            self.version = next_library_version(self.userprofile_id)
+            if update_fields is not None:
+                update_fields = {*update_fields, "version"}
+            super().save(*args, update_fields=update_fields, **kwargs)
+
+    def soft_delete(self) -> None:
+        """Mark the record deleted, keeping it as a tombstone."""
+        self.deleted_at = timezone.now()
+        self.save()
+
     @property
     def user(self):
         return self.userprofile.user
+
+
+class AlbumNeighbour(models.Model):
+    album = models.ForeignKey(
+        Album, on_delete=models.CASCADE, related_name="neighbours"
+    )
+    neighbour = models.ForeignKey(Album, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.album_id} -> {self.neighbour_id} ({self.score:.3f})"
+
+    class Meta:
+        verbose_name = "Album Neighbour"
+        verbose_name_plural = "Album Neighbours"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["album", "neighbour"], name="unique_album_neighbour"
+            )
+        ]
+
+
+class RecommendationBuild(models.Model):
+    built_at = models.DateTimeField(auto_now_add=True)
+    is_full = models.BooleanField(default=False)
+    max_album_id = models.BigIntegerField(default=0)
+    albums_updated = models.IntegerField(default=0)
+    duration_ms = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.built_at} ({self.albums_updated} albums)"
+
+    class Meta:
+        verbose_name = "Recommendation Build"
+        verbose_name_plural = "Recommendation Builds"
+        get_latest_by = "built_at"
+
+
+class LibraryEvent(models.Model):
+    RECORD_CHANGED = "record-changed"
+    SYNC_PROGRESS = "sync-progress"
+    KIND_CHOICES = [
+        (RECORD_CHANGED, "Record changed"),
+        (SYNC_PROGRESS, "Sync progress"),
+    ]
+
+    userprofile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="library_events"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.userprofile_id})"
+
+    class Meta:
+        verbose_name = "Library Event"
+        verbose_name_plural = "Library Events"
+        indexes = [
+            # Clients read their events after a cursor, in ID order.
+            models.Index(fields=["userprofile", "id"], name="libraryevent_cursor_idx")
+        ]
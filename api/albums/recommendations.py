@@ -0,0 +1,308 @@
+import time
+from datetime import timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from scipy import sparse
+
+from albums.models import Album, AlbumNeighbour, Record, RecommendationBuild
+from user.models import UserProfile
+
+BATCH_SIZE = 512
+
+
+def get_record_weights() -> dict:
+    """Return the interaction weight for each Record flag."""
+    return settings.RECOMMENDATION_RECORD_WEIGHTS
+
+
+def record_weight(is_loved: bool, is_liked: bool, is_listened: bool) -> float:
+    """Combine the Record flags into a single interaction weight."""
+    weights = get_record_weights()
+    return (
+        weights["is_loved"] * is_loved
+        + weights["is_liked"] * is_liked
+        + weights["is_listened"] * is_listened
+    )
+
+
+def build_interaction_matrix(
+    rows: Iterable[Tuple[int, int, float]], album_index: dict
+) -> sparse.csr_matrix:
+    """Build a sparse user x album matrix from (user, album, weight) rows."""
+    user_index: dict = {}
+    users, albums, values = [], [], []
+    for user_id, album_id, weight in rows:
+        if weight <= 0 or album_id not in album_index:
+            continue
+        users.append(user_index.setdefault(user_id, len(user_index)))
+        albums.append(album_index[album_id])
+        values.append(weight)
+
+    return sparse.csr_matrix(
+        (
+            np.asarray(values, dtype=np.float32),
+            (np.asarray(users, dtype=np.int64), np.asarray(albums, dtype=np.int64)),
+        ),
+        shape=(len(user_index), len(album_index)),
+    )
+
+
+def build_feature_matrix(
+    pairs: Iterable[Tuple[int, str]], album_index: dict
+) -> sparse.csr_matrix:
+    """Build a binary album x feature matrix from (album, feature key) pairs."""
+    feature_index: dict = {}
+    albums, features = [], []
+    for album_id, feature in pairs:
+        if album_id not in album_index:
+            continue
+        albums.append(album_index[album_id])
+        features.append(feature_index.setdefault(feature, len(feature_index)))
+
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(albums), dtype=np.float32),
+            (np.asarray(albums, dtype=np.int64), np.asarray(features, dtype=np.int64)),
+        ),
+        shape=(len(album_index), len(feature_index)),
+    )
+    matrix.data[:] = 1.0
+    return matrix
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms).astype(np.float32) @ matrix).tocsr()
+
+
+def similarity_batches(
+    interactions: sparse.csr_matrix,
+    features: sparse.csr_matrix,
+    rows: np.ndarray,
+    content_weight: float,
+) -> Iterator[Tuple[np.ndarray, sparse.csr_matrix]]:
+    """
+    Yield (album rows, similarity of each to every album) in batches.
+
+    Similarity is a blend of item-item cosine over user interactions and
+    cosine over genre/artist features, computed as sparse products.
+    """
+    items = _normalize_rows(interactions.T.tocsr())
+    content = _normalize_rows(features.tocsr())
+    items_t = items.T.tocsr()
+    content_t = content.T.tocsr()
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start : start + BATCH_SIZE]
+        scores = (1.0 - content_weight) * (items[batch] @ items_t)
+        if content_weight:
+            scores = scores + content_weight * (content[batch] @ content_t)
+        yield batch, scores.tocsr()
+
+
+def top_k_neighbours(
+    interactions: sparse.csr_matrix,
+    features: sparse.csr_matrix,
+    rows: np.ndarray,
+    top_k: int,
+    content_weight: float,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Yield (album row, neighbour rows, scores) for the given album rows."""
+    for batch, scores in similarity_batches(
+        interactions, features, rows, content_weight
+    ):
+        for offset, row in enumerate(batch):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = (columns != row) & (values > 0)
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k - 1)[:top_k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values)
+            yield int(row), columns[order], values[order]
+
+
+def _dirty_album_ids(last_build: RecommendationBuild) -> set:
+    """
+    Return albums whose interactions or features changed, that lost a
+    neighbour, or that are new since the build.
+    """
+    # Tombstones included: deleting a record changes its album's interactions.
+    changed = Record.all_objects.filter(
+        date_added__gte=last_build.built_at.date()
+    ).values_list("album_id", flat=True)
+    # From the start of the build, as changes during it may have been missed.
+    stale = Album.objects.filter(
+        neighbours_stale_at__gte=last_build.built_at
+        - timedelta(milliseconds=last_build.duration_ms)
+    ).values_list("id", flat=True)
+    new = Album.objects.filter(id__gt=last_build.max_album_id).values_list(
+        "id", flat=True
+    )
+    return {album_id for album_id in changed if album_id} | set(stale) | set(new)
+
+
+def _affected_rows(
+    interactions: sparse.csr_matrix,
+    features: sparse.csr_matrix,
+    dirty_rows: np.ndarray,
+    album_ids: np.ndarray,
+    album_index: dict,
+    top_k: int,
+    content_weight: float,
+) -> np.ndarray:
+    """
+    Return the dirty rows and the rows of untouched albums whose top-K they change.
+
+    Similarity between two untouched albums cannot change, so an untouched
+    album's list is stale only when it holds a dirty album, whose score may
+    have dropped, or when a dirty album now beats its K-th best score.
+    """
+    dirty_ids = album_ids[dirty_rows].tolist()
+    affected = set(dirty_rows.tolist())
+    # Albums deleted since album_ids was read are no longer indexed.
+    affected.update(
+        album_index[album_id]
+        for album_id in AlbumNeighbour.objects.filter(
+            neighbour_id__in=dirty_ids
+        ).values_list("album_id", flat=True)
+        if album_id in album_index
+    )
+
+    # Albums with fewer than K neighbours take any positive score.
+    thresholds = np.zeros(len(album_ids), dtype=np.float32)
+    for album_id, count, lowest in (
+        AlbumNeighbour.objects.values("album_id")
+        .annotate(count=Count("id"), lowest=Min("score"))
+        .values_list("album_id", "count", "lowest")
+    ):
+        if count >= top_k and album_id in album_index:
+            thresholds[album_index[album_id]] = lowest
+
+    # Similarity is symmetric: a dirty row's scores are its column's too.
+    for batch, scores in similarity_batches(
+        interactions, features, dirty_rows, content_weight
+    ):
+        scores = scores.tocoo()
+        beats = scores.data > thresholds[scores.col]
+        affected.update(scores.col[beats].tolist())
+    return np.asarray(sorted(affected), dtype=np.int64)
+
+
+def build_recommendations(full: bool = False) -> RecommendationBuild:
+    """
+    Recompute and store the top-K neighbours per album.
+
+    Incremental builds recompute the albums touched since the last build and
+    the untouched albums whose neighbours they change, so they store the same
+    neighbours as a full build.
+    """
+    started = time.perf_counter()
+    top_k = getattr(settings, "RECOMMENDATION_TOP_K", 20)
+    content_weight = getattr(settings, "RECOMMENDATION_CONTENT_WEIGHT", 0.3)
+
+    album_ids = np.fromiter(
+        Album.objects.order_by("id").values_list("id", flat=True), dtype=np.int64
+    )
+    album_index = {int(album_id): i for i, album_id in enumerate(album_ids)}
+
+    last_build = None if full else RecommendationBuild.objects.order_by(
+        "-built_at"
+    ).first()
+    if last_build is None:
+        full = True
+        dirty = album_ids
+    else:
+        dirty = np.fromiter(
+            sorted(_dirty_album_ids(last_build) & album_index.keys()), dtype=np.int64
+        )
+
+    interactions = build_interaction_matrix(
+        (
+            (user_id, album_id, record_weight(loved, liked, listened))
+            for user_id, album_id, loved, liked, listened in Record.objects.values_list(
+                "userprofile_id", "album_id", "is_loved", "is_liked", "is_listened"
+            ).iterator(chunk_size=5000)
+        ),
+        album_index,
+    )
+    features = build_feature_matrix(
+        [
+            *(
+                (album_id, f"genre:{genre_id}")
+                for album_id, genre_id in Album.genres.through.objects.values_list(
+                    "album_id", "genre_id"
+                )
+            ),
+            *(
+                (album_id, f"artist:{artist_id}")
+                for album_id, artist_id in Album.artist.through.objects.values_list(
+                    "album_id", "artist_id"
+                )
+            ),
+        ],
+        album_index,
+    )
+
+    rows = np.asarray([album_index[int(album_id)] for album_id in dirty], dtype=np.int64)
+    if not full:
+        rows = _affected_rows(
+            interactions, features, rows, album_ids, album_index, top_k, content_weight
+        )
+    neighbours: List[AlbumNeighbour] = []
+    for row, columns, scores in top_k_neighbours(
+        interactions, features, rows, top_k, content_weight
+    ):
+        neighbours.extend(
+            AlbumNeighbour(
+                album_id=int(album_ids[row]),
+                neighbour_id=int(album_ids[column]),
+                score=float(score),
+            )
+            for column, score in zip(columns, scores)
+        )
+
+    with transaction.atomic():
+        if full:
+            AlbumNeighbour.objects.all().delete()
+        else:
+            AlbumNeighbour.objects.filter(album_id__in=album_ids[rows].tolist()).delete()
+        AlbumNeighbour.objects.bulk_create(neighbours, batch_size=1000)
+        return RecommendationBuild.objects.create(
+            is_full=full,
+            max_album_id=Album.objects.aggregate(max_id=Max("id"))["max_id"] or 0,
+            albums_updated=len(rows),
+            duration_ms=int((time.perf_counter() - started) * 1000),
+        )
+
+
+def recommend_for_user(userprofile: UserProfile, limit: int = 20) -> List[Album]:
+    """Rank albums by the stored neighbours of the user's records."""
+    weights = {
+        album_id: record_weight(loved, liked, listened) or 1.0
+        for album_id, loved, liked, listened in userprofile.records.values_list(
+            "album_id", "is_loved", "is_liked", "is_listened"
+        )
+        if album_id
+    }
+    if not weights:
+        return []
+
+    ranking: dict = {}
+    for album_id, neighbour_id, score in AlbumNeighbour.objects.filter(
+        album_id__in=weights.keys()
+    ).values_list("album_id", "neighbour_id", "score"):
+        if neighbour_id in weights:
+            continue
+        ranking[neighbour_id] = ranking.get(neighbour_id, 0.0) + score * weights[album_id]
+
+    best = sorted(ranking, key=ranking.get, reverse=True)[:limit]
+    albums = Album.objects.in_bulk(best)
+    return [albums[album_id] for album_id in best if album_id in albums]
@@ -0,0 +1,70 @@
+from typing import Set
+
+from MyBeautifulAlbums.renderers import compact_renderer_classes
+
+from .sparse import parse_field_list
+
+SIDE_TABLES = {"artist": "artists", "genres": "genres"}
+
+
+def _collect(value, tables: dict):
+    if isinstance(value, list):
+        return [_collect(item, tables) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result = {}
+    for key, item in value.items():
+        table = SIDE_TABLES.get(key)
+        if table and isinstance(item, list) and all(
+            isinstance(entry, dict) and "id" in entry for entry in item
+        ):
+            for entry in item:
+                tables[table].setdefault(entry["id"], entry)
+            result[key] = [entry["id"] for entry in item]
+        else:
+            result[key] = _collect(item, tables)
+    return result
+
+
+def requested_shapes(request) -> Set[str]:
+    """Return the shapes listed in ``?shape=``, e.g. ``summary,normalized``."""
+    return parse_field_list(request.query_params.get("shape")) or set()
+
+
+def summary_requested(request) -> bool:
+    """
+    Whether albums in lists should be served from their summary columns
+    (``?shape=summary``) instead of with nested artists, genres and tracks.
+    """
+    return "summary" in requested_shapes(request)
+
+
+def normalize_payload(data) -> dict:
+    """
+    Move nested artists and genres into side tables keyed by ID.
+
+    Every occurrence in the payload is replaced by the ID, so each artist
+    and genre is sent once no matter how many albums reference it.
+    """
+    tables = {table: {} for table in SIDE_TABLES.values()}
+    return {"data": _collect(data, tables), **tables}
+
+
+class CompactResponseMixin:
+    """
+    Offer MessagePack rendering and an opt-in normalized response shape
+    selected with ``?shape=normalized``, which combines with
+    ``?shape=summary,normalized``.
+    """
+
+    renderer_classes = compact_renderer_classes()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            "normalized" in requested_shapes(request)
+            and response.status_code < 300
+            and getattr(response, "data", None) is not None
+        ):
+            response.data = normalize_payload(response.data)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Album, Artist, Record, Genre, Track
+
+from .coalescing import record_writes
+from .sparse import SparseFieldsetSerializerMixin, trim_fields
+from .models import Album, AlbumTrack, Artist, Record, Genre, Track
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -14,12 +17,17 @@ class TrackSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class RecordSerializer(serializers.ModelSerializer):
+class RecordSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Record
         fields = "__all__"
+        read_only_fields = ["version", "deleted_at"]
         depth = 2
 
+    def to_representation(self, instance):
+        """Show toggles that are still waiting to be written."""
+        return super().to_representation(record_writes.overlay(instance))
+
 
 class ArtistSerializer(serializers.ModelSerializer):
 
@@ -28,8 +36,83 @@ class ArtistSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class AlbumSerializer(serializers.ModelSerializer):
+class NestedTrackSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Track
+        fields = "__all__"
+        depth = 1
+
+
+class AlbumTrackSerializer(serializers.ModelSerializer):
+    """Track of an album, flattened with its disc number and position."""
+
+    track = NestedTrackSerializer(read_only=True)
+
+    class Meta:
+        model = AlbumTrack
+        fields = ["track", "disc_number", "position"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        return {**data.pop("track", {}), **data}
+
+    def trim_fields(self, names):
+        """Trim the flattened output; ``names`` may mix track and position fields."""
+        trim_fields(self.fields["track"], names)
+        if self.fields["track"].fields:
+            names = names | {"track"}
+        trim_fields(self, names)
+
+
+class AlbumSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    tracks = AlbumTrackSerializer(source="album_tracks", many=True, read_only=True)
+
     class Meta:
         model = Album
         fields = "__all__"
         depth = 2
+
+    def get_collapsed_field(self, name, field):
+        if name == "tracks":
+            return serializers.SlugRelatedField(
+                source="album_tracks", slug_field="track_id", many=True, read_only=True
+            )
+        return super().get_collapsed_field(name, field)
+
+
+class AlbumSummarySerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
+    """Album for list views, served from the denormalized summary columns."""
+
+    class Meta:
+        model = Album
+        fields = [
+            "id",
+            "spotify_id",
+            "name",
+            "primary_artist_name",
+            "release_date",
+            "img_url",
+            "images",
+            "source_url",
+            "track_count",
+            "total_duration_ms",
+            "genre_names",
+            "popularity",
+        ]
+
+
+class RecordSummarySerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
+    album = AlbumSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Record
+        fields = "__all__"
+        read_only_fields = ["version", "deleted_at"]
+
+    def to_representation(self, instance):
+        """Show toggles that are still waiting to be written."""
+        return super().to_representation(record_writes.overlay(instance))
@@ -1,8 +1,30 @@
-import requests
+from typing import List
+
+from django.conf import settings
 from django.contrib.auth.models import User
 
-from albums.models import Album, Artist, Genre, Record, Track
-from user.services import get_spotify_token
+from MyBeautifulAlbums import fastjson
+from MyBeautifulAlbums.profiling import profiled, span
+from albums.coalescing import record_writes
+from albums.events import publish_sync_progress
+from albums.lookups import artist_ids, genre_ids, run_with_fresh_lookups
+from albums.models import Album, Record, Track
+from albums.signals import summary_updates_suspended
+from user.services import (
+    SPOTIFY_LIBRARY_PAGE_SIZE,
+    get_spotify_token,
+    iter_user_spotify_albums,
+    spotify_session,
+)
+
+SPOTIFY_ALBUMS_BATCH_SIZE = 20
+
+RECORD_ACTION_FLAGS = {
+    "isLiked": "is_liked",
+    "isLoved": "is_loved",
+    "isListened": "is_listened",
+    "wantToListen": "want_to_listen",
+}
 
 
 def fetch_spotify_album(token: str, album_id: str) -> dict | None:
@@ -11,26 +33,52 @@ def fetch_spotify_album(token: str, album_id: str) -> dict | None:
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
-    url = f"https://api.spotify.com/v1/albums/{album_id}"
+    url = f"{settings.SPOTIFY_API_URL}/albums/{album_id}"
 
-    response = requests.get(url, headers=headers)
+    with span("fetch"):
+        response = spotify_session.get(url, headers=headers)
 
     if response.status_code == 200:
-        return response.json()
+        with span("parse"):
+            return fastjson.loads(response.content)
     else:
         print(f"Error fetching album data: {response.status_code}")
         return None
 
 
-def create_or_get_artist(artist_info: dict) -> Artist:
-    """Create or get an artist instance."""
-    return Artist.objects.get_or_create(
-        spotify_id=artist_info["id"],
-        defaults={
-            "name": artist_info["name"],
-            "source_url": artist_info["external_urls"]["spotify"],
-        },
-    )[0]
+def fetch_spotify_albums(token: str, album_ids: List[str]) -> List[dict]:
+    """Fetch albums from Spotify API, up to SPOTIFY_ALBUMS_BATCH_SIZE per request."""
+    headers = {"Authorization": f"Bearer {token}"}
+    albums = []
+    for start in range(0, len(album_ids), SPOTIFY_ALBUMS_BATCH_SIZE):
+        batch = album_ids[start : start + SPOTIFY_ALBUMS_BATCH_SIZE]
+        with span("fetch"):
+            response = spotify_session.get(
+                f"{settings.SPOTIFY_API_URL}/albums",
+                params={"ids": ",".join(batch)},
+                headers=headers,
+            )
+        if response.status_code != 200:
+            print(f"Error fetching album data: {response.status_code}")
+            continue
+        with span("parse"):
+            data = fastjson.loads(response.content)
+        albums.extend(album for album in data["albums"] if album)
+    return albums
+
+
+def album_fields(album_info: dict) -> dict:
+    """Map an album payload to the Album model fields."""
+    return {
+        "name": album_info["name"],
+        "release_date": album_info["release_date"],
+        "img_url": album_info["images"][0]["url"] if album_info["images"] else None,
+        "images": album_images(album_info),
+        "source_url": album_info["external_urls"]["spotify"],
+        "copyright": album_info["copyrights"][0]["text"],
+        "label": album_info["label"],
+        "popularity": album_info["popularity"],
+    }
 
 
 def create_or_get_track(track_info: dict) -> Track:
@@ -47,24 +95,77 @@ def create_or_get_track(track_info: dict) -> Track:
     )[0]
 
 
+def album_images(album_info: dict) -> list:
+    """Return every image size of the album, largest first."""
+    return sorted(
+        (
+            {
+                "url": image["url"],
+                "width": image.get("width"),
+                "height": image.get("height"),
+            }
+            for image in album_info.get("images") or []
+        ),
+        key=lambda image: image["width"] or 0,
+        reverse=True,
+    )
+
+
 def process_album(album_info: dict, album: Album) -> None:
     """Process album information and update the database."""
-    for track_info in album_info.get("tracks", {}).get("items", []):
-        track = create_or_get_track(track_info)
-        for artist_info in track_info["artists"]:
-            artist = create_or_get_artist(artist_info)
-            track.artist.add(artist)
-        album.tracks.add(track)
+    images = album_images(album_info)
+    if images != album.images:
+        with span("upsert.album"):
+            album.images = images
+            album.save(update_fields=["images"])
 
-    for artist_info in album_info["artists"]:
-        artist = create_or_get_artist(artist_info)
-        album.artist.add(artist)
+    tracks = album_info.get("tracks", {}).get("items", [])
+    artists = {
+        artist_info["id"]: artist_info
+        for artist_info in [
+            *album_info["artists"],
+            *(artist for track_info in tracks for artist in track_info["artists"]),
+        ]
+    }
+    with span("upsert.artists"):
+        artist_pks = artist_ids.resolve(
+            artists,
+            lambda spotify_id: {
+                "name": artists[spotify_id]["name"],
+                "source_url": artists[spotify_id]["external_urls"]["spotify"],
+            },
+        )
+    with span("upsert.genres"):
+        genre_pks = genre_ids.resolve(album_info["genres"])
+
+    with summary_updates_suspended():
+        with span("upsert.tracks"):
+            for track_info in tracks:
+                track = create_or_get_track(track_info)
+                track.artist.add(
+                    *(artist_pks[artist["id"]] for artist in track_info["artists"])
+                )
+                album.tracks.add(
+                    track,
+                    through_defaults={
+                        "disc_number": track_info.get("disc_number", 1),
+                        "position": track_info["track_number"],
+                    },
+                )
+
+        # One at a time: the first artist and genre order the album summary.
+        with span("upsert.album_relations"):
+            for artist_info in album_info["artists"]:
+                album.artist.add(artist_pks[artist_info["id"]])
 
-    for genre_name in album_info["genres"]:
-        genre, _ = Genre.objects.get_or_create(name=genre_name)
-        album.genres.add(genre)
+            for genre_name in album_info["genres"]:
+                album.genres.add(genre_pks[genre_name])
 
+    with span("upsert.summary"):
+        album.refresh_summary()
 
+
+@profiled("process_user_album")
 def process_user_album(album_id: str, user: User) -> None:
     """Process and save user album data."""
     token = get_spotify_token(user)
@@ -73,109 +174,128 @@ def process_user_album(album_id: str, user: User) -> None:
     if not album_data:
         return
 
-    album_info = album_data
-    album, _ = Album.objects.get_or_create(
-        spotify_id=album_info["id"],
-        defaults={
-            "name": album_info["name"],
-            "release_date": album_info["release_date"],
-            "img_url": (
-                album_info["images"][0]["url"] if album_info["images"] else None
-            ),
-            "source_url": album_info["external_urls"]["spotify"],
-            "copyright": album_info["copyrights"][0]["text"],
-            "label": album_info["label"],
-            "popularity": album_info["popularity"],
-        },
-    )
+    save_user_album(album_data, user)
+
+
+def save_user_album(album_info: dict, user: User) -> None:
+    """Save an album payload and mark it as liked by the user."""
+    run_with_fresh_lookups(_save_user_album, album_info, user)
+
+
+def save_user_albums(album_infos: List[dict], user: User) -> None:
+    """Save album payloads liked by the user in one transaction."""
+
+    def save_all():
+        for album_info in album_infos:
+            _save_user_album(album_info, user)
+
+    run_with_fresh_lookups(save_all)
+
+
+def _save_user_album(album_info: dict, user: User) -> None:
+    with span("upsert.album"):
+        album, _ = Album.objects.get_or_create(
+            spotify_id=album_info["id"], defaults=album_fields(album_info)
+        )
 
     process_album(album_info, album)
 
-    Record.objects.update_or_create(
-        album=album,
-        userprofile=user.userprofile,
-        defaults={"is_liked": True},
+    # Written only if it changes, so re-syncing a library bumps no versions.
+    with span("record"):
+        record, created = Record.objects.get_or_create(
+            album=album,
+            userprofile=user.userprofile,
+            defaults={"is_liked": True},
+        )
+        if not created and not record.is_liked:
+            record.is_liked = True
+            record.save(update_fields=["is_liked", "date_added"])
+
+
+def refresh_albums(album_infos: List[dict]) -> int:
+    """Update the stored albums matching the payloads and re-ingest their tracks."""
+    albums = Album.objects.in_bulk(
+        [album_info["id"] for album_info in album_infos], field_name="spotify_id"
     )
+    refreshed = []
+    for album_info in album_infos:
+        album = albums.get(album_info["id"])
+        if album is None:
+            continue
+        for field, value in album_fields(album_info).items():
+            setattr(album, field, value)
+        refreshed.append((album, album_info))
 
+    if not refreshed:
+        return 0
 
-def process_record_album(album_id: str, user: User, type: str) -> None:
-    """Process album record based on user interaction type."""
-    token = get_spotify_token(user)
-    album_data = fetch_spotify_album(token.s_access_token, album_id)
+    def save_refreshed():
+        Album.objects.bulk_update(
+            [album for album, _ in refreshed],
+            list(album_fields(refreshed[0][1])),
+            batch_size=100,
+        )
+        for album, album_info in refreshed:
+            process_album(album_info, album)
 
-    if not album_data:
-        return
+    run_with_fresh_lookups(save_refreshed)
+    return len(refreshed)
 
-    album_info = album_data
-    album, _ = Album.objects.get_or_create(
-        spotify_id=album_info["id"],
-        defaults={
-            "name": album_info["name"],
-            "release_date": album_info["release_date"],
-            "img_url": (
-                album_info["images"][0]["url"] if album_info["images"] else None
-            ),
-            "source_url": album_info["external_urls"]["spotify"],
-            "copyright": album_info["copyrights"][0]["text"],
-            "label": album_info["label"],
-            "popularity": album_info["popularity"],
-        },
-    )
 
-    process_album(album_info, album)
+@profiled("sync_spotify_library")
+def sync_user_library(user: User) -> bool:
+    """Import every album saved in the user's Spotify library."""
+    spotify_token = get_spotify_token(user)
+    if not spotify_token:
+        return False
 
-    match type:
-        case "isLiked":
-            Record.objects.update_or_create(
-                album=album,
-                userprofile=user.userprofile,
-                defaults={
-                    "is_liked": not Record.objects.filter(
-                        album=album, userprofile=user.userprofile
-                    )
-                    .values_list("is_liked", flat=True)
-                    .first()
-                    or False
-                },
-            )
-        case "isLoved":
-            Record.objects.update_or_create(
-                album=album,
-                userprofile=user.userprofile,
-                defaults={
-                    "is_loved": not Record.objects.filter(
-                        album=album, userprofile=user.userprofile
-                    )
-                    .values_list("is_loved", flat=True)
-                    .first()
-                    or False
-                },
-            )
-        case "isListened":
-            Record.objects.update_or_create(
-                album=album,
-                userprofile=user.userprofile,
-                defaults={
-                    "is_listened": not Record.objects.filter(
-                        album=album, userprofile=user.userprofile
-                    )
-                    .values_list("is_listened", flat=True)
-                    .first()
-                    or False
-                },
-            )
-        case "wantToListen":
-            Record.objects.update_or_create(
-                album=album,
-                userprofile=user.userprofile,
-                defaults={
-                    "want_to_listen": not Record.objects.filter(
-                        album=album, userprofile=user.userprofile
-                    )
-                    .values_list("want_to_listen", flat=True)
-                    .first()
-                    or False
-                },
+    userprofile_id = user.userprofile.pk
+    publish_sync_progress(userprofile_id, "started")
+    albums = 0
+    try:
+        # The library pages embed full album payloads, so no per-album fetch.
+        # Each page is saved in one transaction and so shares one version.
+        page = []
+        for album_info in iter_user_spotify_albums(spotify_token.s_access_token):
+            page.append(album_info)
+            if len(page) < SPOTIFY_LIBRARY_PAGE_SIZE:
+                continue
+            save_user_albums(page, user)
+            page, albums = [], albums + len(page)
+            publish_sync_progress(userprofile_id, "running", albums)
+        if page:
+            save_user_albums(page, user)
+            albums += len(page)
+    except Exception:
+        publish_sync_progress(userprofile_id, "failed", albums)
+        raise
+    publish_sync_progress(userprofile_id, "finished", albums)
+    return True
+
+
+@profiled("process_record_album")
+def process_record_album(album_id: str, user: User, type: str, value: bool) -> None:
+    """Set the record flag of the interaction type to ``value``."""
+    flag = RECORD_ACTION_FLAGS.get(type)
+    if flag is None:
+        return None
+
+    # Albums already in the catalog are updated without a Spotify round trip.
+    album = Album.objects.filter(spotify_id=album_id).first()
+    if album is None:
+        token = get_spotify_token(user)
+        album_data = fetch_spotify_album(token.s_access_token, album_id)
+
+        if not album_data:
+            return
+
+        album_info = album_data
+        with span("upsert.album"):
+            album, _ = Album.objects.get_or_create(
+                spotify_id=album_info["id"], defaults=album_fields(album_info)
             )
-        case _:
-            return None
+
+        process_album(album_info, album)
+
+    with span("record"):
+        record_writes.set(user.userprofile.pk, album.pk, flag, value)
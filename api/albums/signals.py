@@ -0,0 +1,167 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .coalescing import RECORD_FLAGS, record_writes
+from .events import publish_record_changed
+from .lookups import artist_ids, genre_ids
+from .models import (
+    Album,
+    AlbumNeighbour,
+    AlbumTrack,
+    Artist,
+    Genre,
+    Record,
+    Track,
+    mark_neighbours_stale,
+    refresh_album_summaries,
+)
+
+_summary_suspended: ContextVar[bool] = ContextVar("summary_suspended", default=False)
+
+
+@contextmanager
+def summary_updates_suspended():
+    """
+    Skip summary refreshes from signals, for callers that change many
+    relations at once and call ``Album.refresh_summary`` themselves.
+    """
+    token = _summary_suspended.set(True)
+    try:
+        yield
+    finally:
+        _summary_suspended.reset(token)
+
+
+def _refresh_albums(albums, fields=None) -> None:
+    if not _summary_suspended.get():
+        refresh_album_summaries(albums, fields)
+
+
+@receiver(m2m_changed, sender=Album.artist.through)
+@receiver(m2m_changed, sender=Album.genres.through)
+@receiver(m2m_changed, sender=Album.tracks.through)
+def refresh_summary_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep album summaries in sync when artists, genres or tracks change."""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        if not _summary_suspended.get():
+            instance.refresh_summary()
+    elif pk_set:
+        _refresh_albums(Album.objects.filter(pk__in=pk_set))
+
+
+def _albums_of(instance) -> QuerySet:
+    return instance.albums.all() if isinstance(instance, Artist) else instance.genres.all()
+
+
+@receiver(m2m_changed, sender=Album.artist.through)
+@receiver(m2m_changed, sender=Album.genres.through)
+def mark_neighbours_stale_on_feature_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Genres and artists are the recommendation features, so changing an
+    album's set of them makes its stored neighbours stale. Unlike summary
+    refreshes this is never suspended.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            mark_neighbours_stale(Album.objects.filter(pk=instance.pk))
+    elif action in ("post_add", "post_remove") and pk_set:
+        mark_neighbours_stale(Album.objects.filter(pk__in=pk_set))
+    elif action == "pre_clear":
+        # A reverse post_clear has no pk_set, so mark the albums beforehand.
+        mark_neighbours_stale(_albums_of(instance))
+
+
+@receiver(pre_delete, sender=Artist)
+@receiver(pre_delete, sender=Genre)
+def mark_neighbours_stale_on_feature_delete(sender, instance, **kwargs):
+    """Deleting a genre or artist removes it from its albums without m2m_changed."""
+    mark_neighbours_stale(_albums_of(instance))
+
+
+@receiver(pre_delete, sender=Album)
+def mark_neighbours_stale_on_album_delete(sender, instance, **kwargs):
+    """Albums listing a deleted album lose that neighbour and need a replacement."""
+    mark_neighbours_stale(
+        Album.objects.filter(
+            pk__in=AlbumNeighbour.objects.filter(neighbour=instance).values("album_id")
+        )
+    )
+
+
+@receiver([post_save, post_delete], sender=AlbumTrack)
+def refresh_summary_on_album_track_change(sender, instance, **kwargs):
+    _refresh_albums(
+        Album.objects.filter(pk=instance.album_id), ["track_count", "total_duration_ms"]
+    )
+
+
+@receiver(post_save, sender=Artist)
+def refresh_summary_on_artist_change(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_albums(instance.albums.all(), ["primary_artist_name"])
+
+
+@receiver(post_save, sender=Genre)
+def refresh_summary_on_genre_change(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_albums(instance.genres.all(), ["genre_names"])
+
+
+@receiver(post_save, sender=Track)
+def refresh_summary_on_track_change(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_albums(
+            Album.objects.filter(album_tracks__track=instance),
+            ["track_count", "total_duration_ms"],
+        )
+
+
+@receiver([post_save, post_delete], sender=Artist)
+@receiver([post_save, post_delete], sender=Genre)
+def forget_cached_lookup(sender, instance, created=False, **kwargs):
+    """Drop renamed or deleted rows from the ingest lookup caches."""
+    if not created:
+        (artist_ids if sender is Artist else genre_ids).discard_ids([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Record)
+def discard_coalesced_record_writes(sender, instance, update_fields=None, **kwargs):
+    """Let direct record writes win over toggles of the flags they change."""
+    if kwargs.get("signal") is post_delete or instance.deleted_at is not None:
+        record_writes.discard(instance.userprofile_id, instance.album_id)
+        return
+    flags = RECORD_FLAGS if update_fields is None else set(RECORD_FLAGS) & update_fields
+    if flags:
+        record_writes.discard(
+            instance.userprofile_id,
+            instance.album_id,
+            {flag: getattr(instance, flag) for flag in flags},
+        )
+
+
+@receiver(post_save, sender=Record)
+def publish_record_saved(sender, instance, **kwargs):
+    if instance.deleted_at is not None:
+        publish_record_deleted(sender, instance)
+        return
+    publish_record_changed(
+        instance.userprofile_id,
+        instance.pk,
+        instance.album_id,
+        {flag: getattr(instance, flag) for flag in RECORD_FLAGS},
+    )
+
+
+@receiver(post_delete, sender=Record)
+def publish_record_deleted(sender, instance, **kwargs):
+    publish_record_changed(
+        instance.userprofile_id, instance.pk, instance.album_id, {}, deleted=True
+    )
@@ -0,0 +1,133 @@
+"""
+Sparse fieldsets for album and record endpoints.
+
+``?fields=name,img_url,artist`` limits the output to the listed fields, with
+dotted names (``album.name``) selecting fields of a nested object.
+``?expand=artist`` lists the relations rendered as nested objects; the other
+requested relations are rendered as IDs. A dotted name expands its relation,
+so ``?fields=name,tracks.name`` needs no ``expand=tracks``. Without either
+parameter the output
+is unchanged. The view trims its queryset to match, so fields that are not
+requested are neither selected nor prefetched.
+"""
+
+from functools import partial
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from django.db.models import QuerySet
+from rest_framework import serializers
+
+
+def parse_field_list(value: Optional[str]) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def trim_fields(serializer: serializers.Serializer, names: Set[str]) -> None:
+    """Drop the serializer fields that are not listed in ``names``."""
+    for name in list(serializer.fields):
+        if name not in names:
+            serializer.fields.pop(name)
+
+
+class SparseFieldsetSerializerMixin:
+    """Serializer side: drop unrequested fields and collapse unexpanded relations."""
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            self._trim_fields(fields)
+        if fields is not None or expand is not None:
+            self._collapse_relations(expand or set())
+
+    def _trim_fields(self, fields: Set[str]) -> None:
+        trim_fields(self, {name.split(".", 1)[0] for name in fields})
+
+        for name, field in self.fields.items():
+            nested = {
+                path.split(".", 1)[1] for path in fields if path.startswith(f"{name}.")
+            }
+            field = getattr(field, "child", field)
+            if nested and isinstance(field, serializers.Serializer):
+                getattr(field, "trim_fields", partial(trim_fields, field))(nested)
+
+    def _collapse_relations(self, expand: Set[str]) -> None:
+        for name, field in list(self.fields.items()):
+            if name not in expand and isinstance(field, serializers.BaseSerializer):
+                self.fields[name] = self.get_collapsed_field(name, field)
+
+    def get_collapsed_field(self, name: str, field) -> serializers.Field:
+        """Return the field rendering an unexpanded relation as IDs."""
+        kwargs = {"source": field.source} if field.source != name else {}
+        return serializers.PrimaryKeyRelatedField(
+            many=isinstance(field, serializers.ListSerializer), read_only=True, **kwargs
+        )
+
+
+class SparseFieldsetMixin:
+    """View side: pass ``fields``/``expand`` to the serializer and trim the queryset."""
+
+    def get_sparse_params(self) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        params = self.request.query_params
+        fields = parse_field_list(params.get("fields"))
+        expand = parse_field_list(params.get("expand"))
+        if fields is not None:
+            # Fields of a related object can only be selected if it is expanded.
+            dotted = {path.split(".", 1)[0] for path in fields if "." in path}
+            if dotted:
+                expand = (expand or set()) | dotted
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_params()
+        if issubclass(self.get_serializer_class(), SparseFieldsetSerializerMixin):
+            kwargs.setdefault("fields", fields)
+            kwargs.setdefault("expand", expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def sparse_queryset(
+        self,
+        queryset: QuerySet,
+        relations: Dict[str, Tuple[Callable, Callable]],
+        default: Callable,
+    ) -> QuerySet:
+        """
+        Trim the queryset to the requested fields.
+
+        ``relations`` maps each relation field to a pair of callables that
+        add the lookups needed when it is expanded and when only its IDs are
+        rendered. ``default`` is applied when no sparse fieldset was asked for.
+        """
+        fields, expand = self.get_sparse_params()
+        if fields is None and expand is None:
+            return default(queryset)
+
+        expand = expand or set()
+        requested = set(self.get_serializer_class()().fields)
+        if fields is not None:
+            requested &= {path.split(".", 1)[0] for path in fields}
+
+        model_fields = {
+            field.name: field for field in queryset.model._meta.concrete_fields
+        }
+        only = {queryset.model._meta.pk.name}
+        for name in requested & model_fields.keys():
+            only.add(name)
+            field = model_fields[name]
+            if field.is_relation and name in expand:
+                related_meta = field.related_model._meta
+                concrete = {related.name for related in related_meta.concrete_fields}
+                nested = concrete & {
+                    path.split(".", 1)[1]
+                    for path in fields or ()
+                    if path.startswith(f"{name}.")
+                }
+                only.update(f"{name}__{path}" for path in nested or concrete)
+                only.add(f"{name}__{related_meta.pk.name}")
+        queryset = queryset.only(*only)
+
+        for name, (expanded, ids) in relations.items():
+            if name in requested:
+                queryset = expanded(queryset) if name in expand else ids(queryset)
+        return queryset
@@ -0,0 +1,79 @@
+import logging
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.utils import timezone
+
+from albums.services import sync_user_library
+from user.models import UserProfile
+from user.services import retry_after
+
+logger = logging.getLogger(__name__)
+
+
+def submit_library_sync(user_id: int, delay: float = 0) -> bool:
+    """
+    Queue a sync of the user's Spotify library, due in ``delay`` seconds.
+
+    The request is stored on the profile and picked up by the
+    ``run_library_syncs`` command, so it survives worker restarts. Returns
+    False if a sync is already queued.
+    """
+    due = timezone.now() + timezone.timedelta(seconds=delay)
+    return bool(
+        UserProfile.objects.filter(
+            user_id=user_id, library_sync_requested_at__isnull=True
+        ).update(library_sync_requested_at=due)
+    )
+
+
+def claim_library_sync() -> Optional[int]:
+    """
+    Take the oldest due sync off the queue and return its user ID.
+
+    The request is cleared with a conditional update, so concurrent runners
+    never claim the same one.
+    """
+    queued = UserProfile.objects.filter(library_sync_requested_at__isnull=False)
+    while True:
+        pending = (
+            queued.filter(library_sync_requested_at__lte=timezone.now())
+            .order_by("library_sync_requested_at", "pk")
+            .values_list("pk", "user_id", "library_sync_requested_at")
+            .first()
+        )
+        if pending is None:
+            return None
+        pk, user_id, requested_at = pending
+        if queued.filter(pk=pk, library_sync_requested_at=requested_at).update(
+            library_sync_requested_at=None
+        ):
+            return user_id
+
+
+def run_library_sync(user_id: int) -> bool:
+    """
+    Run one claimed sync.
+
+    Syncs that fail talking to Spotify, e.g. still rate limited after the
+    page retries, are queued again for after Retry-After or
+    LIBRARY_SYNC_RETRY_DELAY, whichever is later.
+    """
+    close_old_connections()
+    try:
+        return sync_user_library(User.objects.get(pk=user_id))
+    except requests.RequestException as e:
+        delay = getattr(settings, "LIBRARY_SYNC_RETRY_DELAY", 60)
+        if e.response is not None:
+            delay = max(delay, retry_after(e.response, default=0))
+        logger.warning(
+            "Library sync failed for user %s, retrying in %s s: %s", user_id, delay, e
+        )
+        submit_library_sync(user_id, delay)
+        return False
+    except Exception:
+        logger.exception("Library sync failed for user %s", user_id)
+        return False
@@ -1,3 +1,879 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from user.models import UserProfile
+from .events import latest_event_id, publish, reader_slots
+from .models import (
+    Album,
+    AlbumNeighbour,
+    AlbumTrack,
+    Artist,
+    Genre,
+    LibraryEvent,
+    Record,
+    RecommendationBuild,
+    Track,
+)
+from .recommendations import build_interaction_matrix, build_recommendations
+from .thumbnails import get_thumbnail, thumbnail_path
+
+
+def create_profile(username: str) -> UserProfile:
+    return UserProfile.objects.create(user=User.objects.create(username=username))
+
+
+def stored_neighbour_scores() -> dict:
+    """Map each album to its sorted neighbour scores, which ties cannot reorder."""
+    scores = defaultdict(list)
+    for album_id, score in AlbumNeighbour.objects.values_list("album_id", "score"):
+        scores[album_id].append(round(score, 4))
+    return {album_id: sorted(values) for album_id, values in scores.items()}
+
+
+class InteractionMatrixTests(TestCase):
+    def test_weights_users_and_skips_empty_interactions(self):
+        matrix = build_interaction_matrix(
+            [(7, 10, 3.0), (7, 11, 0.0), (9, 11, 2.0), (9, 12, 1.0)],
+            {10: 0, 11: 1},
+        )
+
+        self.assertEqual(matrix.shape, (2, 2))
+        np.testing.assert_array_equal(matrix.toarray(), [[3.0, 0.0], [0.0, 2.0]])
+
+
+@override_settings(RECOMMENDATION_TOP_K=3)
+class RecommendationBuildTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        genres = [Genre.objects.create(name=f"genre {i}") for i in range(4)]
+        artists = [Artist.objects.create(name=f"artist {i}") for i in range(5)]
+        self.albums = []
+        for i in range(24):
+            album = Album.objects.create(name=f"album {i}", spotify_id=f"album{i}")
+            album.genres.add(genres[i % len(genres)])
+            album.artist.add(artists[i % len(artists)])
+            self.albums.append(album)
+
+        self.profiles = [create_profile(f"user{i}") for i in range(30)]
+        for profile in self.profiles:
+            for index in rng.choice(len(self.albums), 5, replace=False):
+                Record.objects.create(
+                    userprofile=profile,
+                    album=self.albums[index],
+                    is_liked=True,
+                    is_loved=bool(rng.random() < 0.3),
+                    is_listened=bool(rng.random() < 0.5),
+                )
+        # Everything so far predates the first build.
+        Record.all_objects.update(
+            date_added=datetime.date.today() - datetime.timedelta(days=7)
+        )
+        Album.objects.update(neighbours_stale_at=None)
+
+    def build_then_age(self):
+        build_recommendations(full=True)
+        RecommendationBuild.objects.update(
+            built_at=datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(days=1)
+        )
+
+    def assert_incremental_build_matches_full_build(self):
+        incremental = build_recommendations()
+        incremental_scores = stored_neighbour_scores()
+        build_recommendations(full=True)
+
+        self.assertFalse(incremental.is_full)
+        self.assertLess(incremental.albums_updated, len(self.albums))
+        self.assertEqual(incremental_scores, stored_neighbour_scores())
+
+    def test_full_build_stores_top_k_best_first(self):
+        build = build_recommendations(full=True)
+
+        self.assertTrue(build.is_full)
+        self.assertEqual(build.albums_updated, len(self.albums))
+        for album in self.albums:
+            scores = list(album.neighbours.values_list("score", flat=True))
+            self.assertLessEqual(len(scores), 3)
+            self.assertEqual(scores, sorted(scores, reverse=True))
+            self.assertFalse(album.neighbours.filter(neighbour=album).exists())
+
+    def test_incremental_build_matches_full_build(self):
+        self.build_then_age()
+
+        changed = self.albums[:2]
+        for profile in self.profiles[:12]:
+            Record.objects.update_or_create(
+                userprofile=profile,
+                album=changed[0],
+                defaults={"is_loved": True},
+            )
+        Record.objects.filter(album=changed[1]).first().soft_delete()
+        Album.objects.create(name="new album", spotify_id="new")
+
+        self.assert_incremental_build_matches_full_build()
+
+    def test_incremental_build_picks_up_genre_changes(self):
+        self.build_then_age()
+
+        album = self.albums[0]
+        album.genres.set(Genre.objects.exclude(genres=album)[:1])
+
+        self.assertIsNotNone(Album.objects.get(pk=album.pk).neighbours_stale_at)
+        self.assert_incremental_build_matches_full_build()
+
+    def test_incremental_build_picks_up_deleted_genres(self):
+        self.build_then_age()
+
+        self.albums[0].genres.get().delete()
+
+        self.assert_incremental_build_matches_full_build()
+
+    def test_incremental_build_replaces_deleted_neighbours(self):
+        self.build_then_age()
+
+        deleted = AlbumNeighbour.objects.values_list("neighbour", flat=True).first()
+        Album.objects.filter(pk=deleted).delete()
+        self.albums = [album for album in self.albums if album.pk != deleted]
+
+        self.assert_incremental_build_matches_full_build()
+
+
+class RecommendationViewTests(TestCase):
+    def setUp(self):
+        self.albums = [
+            Album.objects.create(name=f"album {i}", spotify_id=f"album{i}")
+            for i in range(4)
+        ]
+        self.profile = create_profile("listener")
+        other = create_profile("other")
+        for album in self.albums:
+            Record.objects.create(userprofile=other, album=album, is_liked=True)
+        Record.objects.create(
+            userprofile=self.profile, album=self.albums[0], is_loved=True
+        )
+        build_recommendations(full=True)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_recommends_neighbours_outside_the_users_records(self):
+        response = self.client.get("/recommendations/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {album["id"] for album in response.json()},
+            {album.id for album in self.albums[1:]},
+        )
+
+    def test_limit_is_clamped(self):
+        for limit, expected in (("-5", 1), ("0", 1), ("2", 2), ("1000", 3)):
+            with self.subTest(limit=limit):
+                response = self.client.get("/recommendations/", {"limit": limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()), expected)
+
+    def test_rejects_non_integer_limit(self):
+        response = self.client.get("/recommendations/", {"limit": "many"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        response = APIClient().get("/recommendations/")
+
+        self.assertEqual(response.status_code, 401)
+
+
+class AlbumSummaryTests(TestCase):
+    def setUp(self):
+        self.artist = Artist.objects.create(name="Artist")
+        self.genre = Genre.objects.create(name="rock")
+        self.track = Track.objects.create(name="Track", duration_ms=1000)
+        self.albums = []
+        for i in range(5):
+            album = Album.objects.create(name=f"album {i}", spotify_id=f"album{i}")
+            album.artist.add(self.artist)
+            album.genres.add(self.genre)
+            AlbumTrack.objects.create(album=album, track=self.track, position=1)
+            self.albums.append(album)
+
+    def summaries(self):
+        return set(
+            Album.objects.values_list(
+                "primary_artist_name", "track_count", "total_duration_ms"
+            )
+        )
+
+    def test_related_renames_refresh_every_album_in_constant_queries(self):
+        self.artist.name = "Renamed"
+        with self.assertNumQueries(2):  # The save and one summary UPDATE.
+            self.artist.save()
+
+        self.genre.name = "pop"
+        self.genre.save()
+        self.track.duration_ms = 2500
+        self.track.save()
+
+        self.assertEqual(self.summaries(), {("Renamed", 1, 2500)})
+        self.assertEqual(
+            list(Album.objects.values_list("genre_names", flat=True)), [["pop"]] * 5
+        )
+
+    def test_backfill_fills_empty_summary_columns(self):
+        from django.core.management import call_command
+
+        Album.objects.update(
+            primary_artist_name="", track_count=0, total_duration_ms=0, genre_names=[]
+        )
+
+        call_command("backfill_album_summaries", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(self.summaries(), {("Artist", 1, 1000)})
+        self.assertEqual(
+            list(Album.objects.values_list("genre_names", flat=True)), [["rock"]] * 5
+        )
+
+
+class ResponseShapeTests(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(name="Album", spotify_id="album")
+        self.album.artist.add(Artist.objects.create(name="Artist"))
+        self.profile = create_profile("listener")
+        Record.objects.create(userprofile=self.profile, album=self.album, is_liked=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_lists_keep_nested_albums_by_default(self):
+        album = self.client.get("/albums/").json()[0]
+        record_album = self.client.get("/records/").json()[0]["album"]
+        profile_album = self.client.get("/profile/").json()["records"][0]["album"]
+
+        for data in (album, record_album, profile_album):
+            self.assertEqual(data["artist"][0]["name"], "Artist")
+
+    def test_summary_shape_is_opt_in(self):
+        album = self.client.get("/albums/", {"shape": "summary"}).json()[0]
+        profile_album = self.client.get("/profile/", {"shape": "summary"}).json()[
+            "records"
+        ][0]["album"]
+
+        for data in (album, profile_album):
+            self.assertEqual(data["primary_artist_name"], "Artist")
+            self.assertNotIn("artist", data)
+
+    def test_summary_combines_with_normalized(self):
+        response = self.client.get("/albums/", {"shape": "summary,normalized"})
+
+        self.assertEqual(response.json()["data"][0]["primary_artist_name"], "Artist")
+
+    def test_normalized_shape_sends_each_artist_and_genre_once(self):
+        genre = Genre.objects.create(name="rock")
+        self.album.genres.add(genre)
+        other = Album.objects.create(name="Other", spotify_id="other")
+        other.artist.add(self.album.artist.get())
+        other.genres.add(genre)
+
+        data = self.client.get("/albums/", {"shape": "normalized"}).json()
+
+        artist = self.album.artist.get()
+        self.assertEqual([album["artist"] for album in data["data"]], [[artist.pk]] * 2)
+        self.assertEqual([album["genres"] for album in data["data"]], [[genre.pk]] * 2)
+        self.assertEqual(list(data["artists"]), [str(artist.pk)])
+        self.assertEqual(data["artists"][str(artist.pk)]["name"], "Artist")
+        self.assertEqual(data["genres"], {str(genre.pk): {"id": genre.pk, "name": "rock"}})
+
+    def test_msgpack_is_rendered_on_request(self):
+        import msgpack
+
+        response = self.client.get("/albums/", HTTP_ACCEPT="application/msgpack")
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content), self.client.get("/albums/").json()
+        )
+
+    def test_brotli_is_negotiated(self):
+        import brotli
+
+        response = self.client.get("/albums/", HTTP_ACCEPT_ENCODING="gzip, br")
+        plain = self.client.get("/albums/")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+        self.assertNotIn("Content-Encoding", plain)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(name="Album", spotify_id="album")
+        self.album.artist.add(Artist.objects.create(name="Artist"))
+        track = Track.objects.create(name="Track", duration_ms=1000)
+        AlbumTrack.objects.create(album=self.album, track=track, position=1)
+        self.profile = create_profile("listener")
+        Record.objects.create(userprofile=self.profile, album=self.album)
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_unexpanded_relations_are_ids(self):
+        response = self.client.get(
+            f"/albums/{self.album.pk}/", {"fields": "name,artist"}
+        )
+
+        self.assertEqual(
+            response.json(), {"name": "Album", "artist": [self.album.artist.get().pk]}
+        )
+
+    def test_dotted_fields_expand_their_relation(self):
+        album = self.client.get(
+            f"/albums/{self.album.pk}/", {"fields": "name,tracks.name"}
+        ).json()
+        record = self.client.get("/records/", {"fields": "id,album.name"}).json()[0]
+
+        self.assertEqual(album, {"name": "Album", "tracks": [{"name": "Track"}]})
+        self.assertEqual(record["album"], {"name": "Album"})
+
+
+class ImageServer(ThreadingHTTPServer):
+    """Local fixture server answering every GET with one JPEG."""
+
+    def __init__(self):
+        output = io.BytesIO()
+        Image.new("RGB", (640, 480), "red").save(output, "JPEG")
+        self.image = output.getvalue()
+        self.hits = 0
+        super().__init__(("127.0.0.1", 0), ImageHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/cover.jpg"
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits += 1
+        if self.path == "/redirect.jpg":
+            self.send_response(302)
+            self.send_header("Location", "/cover.jpg")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.server.image)))
+        self.end_headers()
+        self.wfile.write(self.server.image)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AlbumThumbnailTests(TestCase):
+    def setUp(self):
+        self.server = ImageServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(
+            THUMBNAILS_ENABLED=True,
+            THUMBNAIL_CACHE_DIR=directory,
+            THUMBNAIL_SIZES=[64, 300],
+            THUMBNAIL_BUILD_RATE="2/min",
+            THUMBNAIL_SOURCE_HOSTS=["127.0.0.1"],
+            THUMBNAIL_SOURCE_SCHEMES=["http"],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+        self.albums = [
+            Album.objects.create(
+                name=f"album {i}", spotify_id=f"album{i}", img_url=self.server.url
+            )
+            for i in range(3)
+        ]
+
+    def get(self, album, size=64):
+        return self.client.get(f"/albums/{album.pk}/thumbnail/{size}/")
+
+    def test_builds_every_size_once_and_serves_from_disk(self):
+        first = self.get(self.albums[0])
+        second = self.get(self.albums[0], 300)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(self.server.hits, 1)
+        image = Image.open(io.BytesIO(b"".join(first.streaming_content)))
+        self.assertEqual(image.size, (64, 48))
+
+    def test_unknown_sizes_are_not_served(self):
+        self.assertEqual(self.get(self.albums[0], 65).status_code, 404)
+        self.assertEqual(self.server.hits, 0)
+
+    def test_concurrent_misses_fetch_the_image_once(self):
+        album = self.albums[0]
+        threads = [
+            threading.Thread(target=get_thumbnail, args=(album, 64)) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.hits, 1)
+        self.assertTrue(thumbnail_path(album.pk, 300).exists())
+
+    def test_builds_are_throttled_but_cached_thumbnails_are_not(self):
+        self.assertEqual(self.get(self.albums[0]).status_code, 200)
+        self.assertEqual(self.get(self.albums[1]).status_code, 200)
+
+        self.assertEqual(self.get(self.albums[2]).status_code, 429)
+        self.assertEqual(self.get(self.albums[0], 300).status_code, 200)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_untrusted_sources_are_not_fetched(self):
+        album = self.albums[0]
+        for url in [
+            self.server.url.replace("127.0.0.1", "localhost"),
+            self.server.url.replace("http://", "ftp://"),
+        ]:
+            Album.objects.filter(pk=album.pk).update(img_url=url)
+            self.assertEqual(self.get(album).status_code, 404)
+
+        self.assertEqual(self.server.hits, 0)
+
+    def test_redirects_are_not_followed(self):
+        album = self.albums[0]
+        Album.objects.filter(pk=album.pk).update(
+            img_url=self.server.url.replace("cover", "redirect")
+        )
+
+        self.assertEqual(self.get(album).status_code, 404)
+        self.assertEqual(self.server.hits, 1)
+
+
+class StaleLookupTests(TransactionTestCase):
+    def test_ingest_recovers_from_rows_deleted_by_another_process(self):
+        from MyBeautifulAlbums.fake_spotify import FakeSpotify
+
+        from .lookups import artist_ids
+        from .services import save_user_album
+
+        spotify = FakeSpotify()
+        profile = create_profile("listener")
+        first, second = spotify._build_album(1), spotify._build_album(2)
+        second["artists"] = first["artists"]
+        save_user_album(first, profile.user)
+
+        # Deleted without signals, so only this process's cache still has it.
+        artist = Artist.objects.get(spotify_id=first["artists"][0]["id"])
+        Album.artist.through.objects.filter(artist=artist)._raw_delete("default")
+        Track.artist.through.objects.filter(artist=artist)._raw_delete("default")
+        Artist.objects.filter(pk=artist.pk)._raw_delete("default")
+        self.assertEqual(
+            artist_ids.resolve([artist.spotify_id])[artist.spotify_id], artist.pk
+        )
+
+        save_user_album(second, profile.user)
+
+        album = Album.objects.get(spotify_id=second["id"])
+        self.assertEqual(
+            list(album.artist.values_list("spotify_id", flat=True)),
+            [artist.spotify_id],
+        )
+        self.assertNotEqual(album.artist.get().pk, artist.pk)
+
+
+@override_settings(RECORD_WRITE_WINDOW=60)
+class RecordWriteCoalescingTests(TestCase):
+    def setUp(self):
+        from .coalescing import record_writes
+
+        self.buffer = record_writes
+        self.addCleanup(self.buffer.shutdown)
+        self.profile = create_profile("listener")
+        self.record = Record.objects.create(
+            userprofile=self.profile,
+            album=Album.objects.create(name="Album", spotify_id="album"),
+        )
+        self.events = LibraryEvent.objects.filter(id__gt=latest_event_id(self.profile.pk))
+
+    def set(self, flag: str, value: bool) -> None:
+        self.buffer.set(self.profile.pk, self.record.album_id, flag, value)
+
+    def flags(self) -> tuple:
+        self.record.refresh_from_db()
+        return self.record.is_liked, self.record.is_loved, self.record.is_listened
+
+    def test_last_value_wins_in_one_write(self):
+        self.set("is_loved", True)
+        self.set("is_loved", False)
+        self.set("is_loved", True)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.flags(), (False, True, False))
+        self.assertEqual(self.events.count(), 1)
+
+    def test_values_already_stored_are_not_rewritten(self):
+        self.set("is_loved", True)
+        self.set("is_loved", False)
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertFalse(self.events.exists())
+
+    def test_values_are_written_over_changes_made_elsewhere(self):
+        self.set("is_loved", True)
+        # Another process already wrote the opposite of what this one read.
+        Record.objects.filter(pk=self.record.pk).update(is_loved=True)
+        self.set("is_loved", False)
+        self.buffer.flush()
+
+        self.assertEqual(self.flags(), (False, False, False))
+
+    def test_writes_of_other_flags_keep_pending_values(self):
+        self.set("is_loved", True)
+
+        self.record.is_liked = True
+        self.record.save(update_fields=["is_liked"])
+        self.buffer.flush()
+
+        self.assertEqual(self.flags(), (True, True, False))
+
+    def test_writes_changing_a_flag_override_its_pending_value(self):
+        self.set("is_loved", True)
+        self.set("is_listened", True)
+
+        self.record.is_loved = True
+        self.record.save()
+        self.set("is_loved", False)
+        self.buffer.flush()
+
+        self.assertEqual(self.flags(), (False, False, True))
+
+
+class AddAlbumToRecordViewTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("listener")
+        self.album = Album.objects.create(name="Album", spotify_id="album")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def post(self, value):
+        return self.client.post(
+            "/add_album/",
+            {"album_id": "album", "action": {"type": "isLoved", "value": value}},
+            format="json",
+        )
+
+    def test_sets_the_value_sent(self):
+        for value in (True, True, False):
+            self.assertEqual(self.post(value).status_code, 200)
+            self.assertEqual(Record.objects.get().is_loved, value)
+
+    def test_rejects_non_boolean_values(self):
+        self.assertEqual(self.post("yes").status_code, 400)
+
+    def test_only_staff_requests_are_profiled(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with override_settings(INGEST_PROFILER="cprofile", INGEST_PROFILE_DIR=directory):
+            self.client.credentials(HTTP_X_PROFILE_INGEST="1")
+            self.assertNotIn("profile", self.post(True).json())
+
+            self.profile.user.is_staff = True
+            self.profile.user.save()
+            outputs = [self.post(value).json()["profile"]["output"] for value in (True, False)]
+
+        self.assertEqual(len(set(outputs)), 2)
+        self.assertEqual(
+            sorted(str(path) for path in Path(directory).iterdir()), sorted(outputs)
+        )
+
+
+class LibraryEventsTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("listener")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_rejects_non_finite_waits(self):
+        for wait in ("nan", "inf", "-inf", "soon"):
+            with self.subTest(wait=wait):
+                response = self.client.get("/events/", {"wait": wait})
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(LIBRARY_EVENT_MAX_WAIT=0.2, LIBRARY_EVENT_POLL_INTERVAL=0.05)
+    def test_clamps_the_wait(self):
+        started = time.monotonic()
+        response = self.client.get("/events/", {"wait": "1e9"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_returns_events_after_the_cursor(self):
+        publish(self.profile.pk, LibraryEvent.SYNC_PROGRESS, {"state": "started"})
+        cursor = latest_event_id(self.profile.pk)
+        publish(self.profile.pk, LibraryEvent.SYNC_PROGRESS, {"state": "finished"})
+
+        response = self.client.get("/events/", {"after": cursor, "wait": 1})
+
+        self.assertEqual(response.status_code, 200)
+        events = response.json()["events"]
+        self.assertEqual([event["data"]["state"] for event in events], ["finished"])
+        self.assertEqual(response.json()["cursor"], events[-1]["id"])
+
+    @override_settings(LIBRARY_EVENT_MAX_READERS=1)
+    def test_waiting_readers_past_the_cap_are_asked_to_retry(self):
+        self.assertTrue(reader_slots.acquire())
+        self.addCleanup(reader_slots.release)
+
+        waiting = self.client.get("/events/", {"wait": 1})
+        streaming = self.client.get("/events/", HTTP_ACCEPT="text/event-stream")
+
+        for response in (waiting, streaming):
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(self.client.get("/events/").status_code, 200)
+
+    @override_settings(
+        LIBRARY_EVENT_STREAM_SECONDS=0.3,
+        LIBRARY_EVENT_POLL_INTERVAL=0.05,
+        LIBRARY_EVENT_MAX_READERS=1,
+    )
+    def test_streams_events_as_server_sent_events(self):
+        publish(self.profile.pk, LibraryEvent.SYNC_PROGRESS, {"state": "started"})
+        event_id = latest_event_id(self.profile.pk)
+
+        response = self.client.get(
+            "/events/", HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID="0"
+        )
+        body = b"".join(response.streaming_content).decode()
+        # Closing sends request_finished, which would close the test database.
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn(
+            f'id: {event_id}\nevent: sync-progress\ndata: {{"state":"started"}}\n\n',
+            body,
+        )
+        # The closed stream gave its slot back.
+        self.assertTrue(reader_slots.acquire())
+        reader_slots.release()
+
+    @override_settings(LIBRARY_EVENT_PRUNE_EVERY=1)
+    def test_publishing_prunes_expired_events_of_every_user(self):
+        other = create_profile("other")
+        publish(other.pk, LibraryEvent.SYNC_PROGRESS, {})
+        LibraryEvent.objects.update(
+            created_at=datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(days=2)
+        )
+
+        publish(self.profile.pk, LibraryEvent.SYNC_PROGRESS, {})
+
+        self.assertEqual(
+            list(LibraryEvent.objects.values_list("userprofile_id", flat=True)),
+            [self.profile.pk],
+        )
+
+
+class RecordChangesTests(TransactionTestCase):
+    """Delta sync, with each write in its own transaction and version."""
+
+    def setUp(self):
+        self.profile = create_profile("listener")
+        self.albums = [
+            Album.objects.create(name=f"album {i}", spotify_id=f"album{i}")
+            for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def changes(self, **params) -> dict:
+        response = self.client.get("/records/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_a_version(self):
+        first = Record.objects.create(userprofile=self.profile, album=self.albums[0])
+        snapshot = self.changes()
+        self.assertEqual(
+            (snapshot["version"], snapshot["reset"], len(snapshot["records"])),
+            (1, False, 1),
+        )
+
+        second = Record.objects.create(userprofile=self.profile, album=self.albums[1])
+        response = self.client.patch(
+            f"/records/{first.pk}/", {"is_loved": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        delta = self.changes(since=snapshot["version"])
+        self.assertEqual(delta["version"], 3)
+        self.assertEqual(
+            {record["id"] for record in delta["records"]}, {first.pk, second.pk}
+        )
+        self.assertEqual(delta["deleted"], [])
+
+        self.assertEqual(self.client.delete(f"/records/{second.pk}/").status_code, 204)
+        delta = self.changes(since=delta["version"])
+        self.assertEqual((delta["records"], delta["deleted"]), ([], [second.pk]))
+
+        delta = self.changes(since=delta["version"])
+        self.assertEqual((delta["records"], delta["deleted"]), ([], []))
+
+    def test_unknown_versions_get_a_full_snapshot(self):
+        Record.objects.create(userprofile=self.profile, album=self.albums[0])
+
+        data = self.changes(since=99)
+
+        self.assertEqual((data["version"], data["reset"]), (1, True))
+        self.assertEqual(len(data["records"]), 1)
+
+    def test_bumps_rolled_back_with_a_savepoint_are_not_reused(self):
+        from django.db import transaction
+
+        from .models import next_library_version
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    next_library_version(self.profile.pk)
+                    raise ValueError
+            except ValueError:
+                pass
+            version = next_library_version(self.profile.pk)
+            self.assertEqual(next_library_version(self.profile.pk), version)
+        self.profile.refresh_from_db()
+
+        self.assertEqual((version, self.profile.library_version), (1, 1))
+        with transaction.atomic():
+            self.assertEqual(next_library_version(self.profile.pk), 2)
+
+    def test_malformed_versions_are_rejected(self):
+        for since in ["0", "-1", "1.5", "abc", ""]:
+            response = self.client.get("/records/changes/", {"since": since})
+            self.assertEqual(response.status_code, 400, since)
+
+
+class LibrarySyncTests(TransactionTestCase):
+    def setUp(self):
+        from MyBeautifulAlbums.fake_spotify import TOKEN_PREFIX
+        from user.models import SpotifyToken
+
+        self.serve()
+        self.profile = create_profile("listener")
+        SpotifyToken.objects.create(
+            user=self.profile.user,
+            s_access_token=f"{TOKEN_PREFIX}listener.0",
+            s_refresh_token="refresh",
+            s_expires_in=3600,
+        )
+
+    def serve(self, **config):
+        from MyBeautifulAlbums.fake_spotify import (
+            FakeSpotifyConfig,
+            make_fake_spotify_server,
+        )
+
+        self.spotify = make_fake_spotify_server(
+            config=FakeSpotifyConfig(
+                catalog_size=200, library_size=60, tracks_per_album=2, **config
+            )
+        )
+        threading.Thread(target=self.spotify.serve_forever, daemon=True).start()
+        self.addCleanup(self.spotify.server_close)
+        self.addCleanup(self.spotify.shutdown)
+        settings = override_settings(
+            SPOTIFY_API_URL=f"http://127.0.0.1:{self.spotify.server_port}/v1"
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def sync(self):
+        from .services import sync_user_library
+
+        self.assertTrue(sync_user_library(self.profile.user))
+        self.profile.refresh_from_db()
+        return self.profile.library_version
+
+    def test_each_page_shares_one_version(self):
+        version = self.sync()
+
+        versions = set(Record.objects.values_list("version", flat=True))
+        self.assertEqual(Record.objects.filter(is_liked=True).count(), 60)
+        self.assertEqual(version, 2)
+        self.assertEqual(versions, {1, 2})
+
+    def progress(self):
+        event = LibraryEvent.objects.filter(kind=LibraryEvent.SYNC_PROGRESS).latest("id")
+        return event.data["state"], event.data["albums"]
+
+    @override_settings(SPOTIFY_MAX_RETRIES=10)
+    def test_rate_limited_pages_are_retried(self):
+        self.serve(rate_limit_ratio=0.9, retry_after=0)
+
+        self.sync()
+
+        self.assertGreater(self.spotify.application.rate_limited, 0)
+        self.assertEqual(Record.objects.filter(is_liked=True).count(), 60)
+        self.assertEqual(self.progress(), ("finished", 60))
+
+    @override_settings(SPOTIFY_MAX_RETRIES=2, LIBRARY_SYNC_RETRY_DELAY=0)
+    def test_sync_fails_and_is_requeued_when_retries_run_out(self):
+        from .tasks import claim_library_sync, run_library_sync
+
+        self.serve(rate_limit_ratio=1, retry_after=0)
+
+        with self.assertLogs("albums.tasks", "WARNING"):
+            self.assertFalse(run_library_sync(self.profile.user_id))
+
+        self.assertEqual(self.spotify.application.rate_limited, 3)
+        self.assertEqual(self.progress(), ("failed", 0))
+        self.assertEqual(claim_library_sync(), self.profile.user_id)
+
+    def test_resyncing_an_unchanged_library_writes_nothing(self):
+        version = self.sync()
+        events = LibraryEvent.objects.filter(kind=LibraryEvent.RECORD_CHANGED).count()
+
+        self.assertEqual(self.sync(), version)
+        self.assertEqual(
+            LibraryEvent.objects.filter(kind=LibraryEvent.RECORD_CHANGED).count(),
+            events,
+        )
+
+    def test_admin_deletes_leave_tombstones(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        self.sync()
+        admin = site._registry[Record]
+        pks = list(Record.objects.order_by("pk").values_list("pk", flat=True)[:3])
+        admin.delete_model(RequestFactory().get("/"), Record.objects.get(pk=pks[0]))
+        admin.delete_queryset(
+            RequestFactory().get("/"), Record.objects.filter(pk__in=pks[1:])
+        )
+
+        self.assertEqual(Record.objects.count(), 57)
+        self.assertEqual(Record.all_objects.filter(deleted_at__isnull=False).count(), 3)
@@ -0,0 +1,130 @@
+"""
+Local album art thumbnails.
+
+The first request for an album fetches its source image once, resizes it to
+every THUMBNAIL_SIZES entry and stores the results under THUMBNAIL_CACHE_DIR.
+Later requests are served from disk. Requires Pillow.
+
+Builds of one album are serialized with a lock file next to its thumbnails,
+so worker processes sharing the directory fetch each image once.
+
+Source images are only fetched from THUMBNAIL_SOURCE_HOSTS over
+THUMBNAIL_SOURCE_SCHEMES, and redirects are not followed, because album image
+URLs come from client-writable fields.
+"""
+
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from albums.models import Album
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+image_session = requests.Session()
+image_session.mount("https://", HTTPAdapter(pool_maxsize=10))
+image_session.mount("http://", HTTPAdapter(pool_maxsize=10))
+
+# Striped, so the number of locks stays fixed however many albums are built.
+_album_locks = [threading.Lock() for _ in range(64)]
+
+
+def thumbnails_enabled() -> bool:
+    return Image is not None and getattr(settings, "THUMBNAILS_ENABLED", False)
+
+
+def thumbnail_sizes() -> list:
+    return getattr(settings, "THUMBNAIL_SIZES", [64, 150, 300, 640])
+
+
+def thumbnail_path(album_id: int, size: int) -> Path:
+    return Path(settings.THUMBNAIL_CACHE_DIR) / str(album_id) / f"{size}.jpg"
+
+
+@contextmanager
+def _album_lock(album_id: int):
+    """Hold the album's build lock, across threads and worker processes."""
+    with _album_locks[album_id % len(_album_locks)]:
+        if fcntl is None:
+            yield
+            return
+        lock_path = thumbnail_path(album_id, 0).with_name(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def source_allowed(url: str) -> bool:
+    """Whether an album image URL points at a trusted image host."""
+    parts = urlsplit(url)
+    return parts.scheme in getattr(
+        settings, "THUMBNAIL_SOURCE_SCHEMES", ["https"]
+    ) and parts.hostname in getattr(settings, "THUMBNAIL_SOURCE_HOSTS", ["i.scdn.co"])
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp, path)
+
+
+def build_thumbnails(album: Album) -> bool:
+    """Fetch the album's largest image and store every thumbnail size."""
+    source = album.image_for(max(thumbnail_sizes())) or (
+        {"url": album.img_url} if album.img_url else None
+    )
+    if source is None or not source_allowed(source["url"]):
+        return False
+
+    try:
+        response = image_session.get(source["url"], timeout=10, allow_redirects=False)
+        response.raise_for_status()
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Unexpected status {response.status_code}")
+        image = Image.open(io.BytesIO(response.content))
+        image.load()
+    except (requests.RequestException, OSError) as e:
+        print(f"Error fetching album image: {e}")
+        return False
+
+    image = image.convert("RGB")
+    for size in thumbnail_sizes():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, "JPEG", quality=85, optimize=True)
+        _write_atomic(thumbnail_path(album.pk, size), output.getvalue())
+    return True
+
+
+def get_thumbnail(album: Album, size: int) -> Path | None:
+    """Return the cached thumbnail, building the album's thumbnails on a miss."""
+    path = thumbnail_path(album.pk, size)
+    if path.exists():
+        return path
+    with _album_lock(album.pk):
+        if not path.exists() and not build_thumbnails(album):
+            return None
+    return path
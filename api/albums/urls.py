@@ -6,6 +6,9 @@ from .views import (
     GenreViewSet,
     TrackViewSet,
     AddAlbumToRecordView,
+    RecommendationView,
+    AlbumThumbnailView,
+    LibraryEventsView,
 )
 from rest_framework import routers
 
@@ -19,6 +22,15 @@ router.register("tracks", TrackViewSet, basename="track.views")
 urlpatterns = [
     path("", include(router.urls)),
     path("add_album/", AddAlbumToRecordView.as_view(), name="record-album"),
+    path(
+        "recommendations/", RecommendationView.as_view(), name="recommendations"
+    ),
+    path("events/", LibraryEventsView.as_view(), name="library-events"),
+    path(
+        "albums/<int:pk>/thumbnail/<int:size>/",
+        AlbumThumbnailView.as_view(),
+        name="album-thumbnail",
+    ),
 ]
 
 
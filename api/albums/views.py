@@ -1,19 +1,89 @@
+import math
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.settings import api_settings
+from rest_framework.throttling import AnonRateThrottle
 from rest_framework.views import APIView
-from .models import Album, Artist, Genre, Record, Track
+
+from MyBeautifulAlbums.db.routing import ReadYourWritesMixin
+from MyBeautifulAlbums.profiling import profiled, profiling_requested
+from MyBeautifulAlbums.renderers import EventStreamRenderer
+from user.models import UserProfile
+from .events import EventStream, latest_event_id, reader_slots, wait_for_events
+from .models import (
+    Album,
+    AlbumTrack,
+    Artist,
+    Genre,
+    Record,
+    Track,
+    ordered_tracks_prefetch,
+)
+from .responses import CompactResponseMixin, summary_requested
 from .services import process_record_album
+from .sparse import SparseFieldsetMixin
 from .serializers import (
     AlbumSerializer,
+    AlbumSummarySerializer,
     ArtistSerializer,
     GenreSerializer,
     RecordSerializer,
+    RecordSummarySerializer,
     TrackSerializer,
 )
 
 
+# Lookups for each relation of the album and record serializers, as
+# (expanded, IDs only) pairs for SparseFieldsetMixin.sparse_queryset.
+ALBUM_RELATIONS = {
+    "artist": (
+        lambda qs: qs.prefetch_related("artist"),
+        lambda qs: qs.prefetch_related(
+            Prefetch("artist", queryset=Artist.objects.only("id"))
+        ),
+    ),
+    "genres": (
+        lambda qs: qs.prefetch_related("genres"),
+        lambda qs: qs.prefetch_related(
+            Prefetch("genres", queryset=Genre.objects.only("id"))
+        ),
+    ),
+    "tracks": (
+        lambda qs: qs.prefetch_related(ordered_tracks_prefetch()),
+        lambda qs: qs.prefetch_related(
+            Prefetch(
+                "album_tracks",
+                queryset=AlbumTrack.objects.only("album_id", "track_id"),
+            )
+        ),
+    ),
+}
+RECORD_RELATIONS = {
+    "album": (
+        lambda qs: qs.select_related("album").prefetch_related(
+            "album__artist", "album__genres", "album__tracks"
+        ),
+        lambda qs: qs,
+    ),
+    "userprofile": (
+        lambda qs: qs.select_related("userprofile__user"),
+        lambda qs: qs,
+    ),
+}
+RECORD_SUMMARY_ALBUM_RELATION = (lambda qs: qs.select_related("album"), lambda qs: qs)
+
+
 class GenreViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -32,6 +102,8 @@ class GenreViewSet(
 
 
 class TrackViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -50,6 +122,9 @@ class TrackViewSet(
 
 
 class AlbumViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
+    SparseFieldsetMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -61,12 +136,28 @@ class AlbumViewSet(
 
     serializer_class = AlbumSerializer
 
+    def get_serializer_class(self):
+        """Serialize lists from the summary columns with ``?shape=summary``."""
+        if self.action == "list" and summary_requested(self.request):
+            return AlbumSummarySerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         """Return all albums with related artists, genres, and tracks."""
-        return Album.objects.prefetch_related("artist", "genres", "tracks")
+        if self.action == "list" and summary_requested(self.request):
+            return self.sparse_queryset(Album.objects.all(), {}, lambda qs: qs)
+        return self.sparse_queryset(
+            Album.objects.all(),
+            ALBUM_RELATIONS,
+            lambda qs: qs.prefetch_related(
+                "artist", "genres", ordered_tracks_prefetch()
+            ),
+        )
 
 
 class ArtistViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -86,6 +177,9 @@ class ArtistViewSet(
 
 
 class RecordViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
+    SparseFieldsetMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -98,12 +192,84 @@ class RecordViewSet(
     serializer_class = RecordSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_class(self):
+        """Serialize lists with album summaries with ``?shape=summary``."""
+        if self.action in ("list", "changes") and summary_requested(self.request):
+            return RecordSummarySerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         """Return all records with related albums."""
-        return Record.objects.select_related("album")
+        relations = RECORD_RELATIONS
+        if self.action in ("list", "changes") and summary_requested(self.request):
+            relations = {**relations, "album": RECORD_SUMMARY_ALBUM_RELATION}
+        return self.sparse_queryset(
+            Record.objects.all(), relations, lambda qs: qs.select_related("album")
+        )
+
+    def perform_destroy(self, instance):
+        """Keep a tombstone so delta sync can report the deletion."""
+        instance.soft_delete()
+
+    @action(detail=False, methods=["GET"])
+    def changes(self, request):
+        """
+        Return the user's records changed since a library version.
+
+        Pass the ``version`` of the previous response as ``since``, or leave
+        it out for a full snapshot. ``deleted`` lists the IDs of records
+        deleted since then. ``reset`` means ``since`` was unknown and the
+        response is a full snapshot to replace the client's copy with.
+        """
+        since = 0
+        if "since" in request.query_params:
+            try:
+                since = int(request.query_params["since"])
+            except ValueError:
+                pass
+            if since <= 0:
+                return Response(
+                    {"error": "since must be a positive library version"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        userprofile_id = request.user.userprofile.pk
+        # Read before the records: rows written in between are sent again
+        # next time instead of being skipped.
+        version = (
+            UserProfile.objects.filter(pk=userprofile_id)
+            .values_list("library_version", flat=True)
+            .get()
+        )
+        reset = since > version
+        if reset:
+            since = 0
+
+        records = self.get_queryset().filter(userprofile_id=userprofile_id)
+        deleted = []
+        if since:
+            records = records.filter(version__gt=since)
+            deleted = list(
+                Record.all_objects.filter(
+                    userprofile_id=userprofile_id,
+                    version__gt=since,
+                    deleted_at__isnull=False,
+                ).values_list("id", flat=True)
+            )
+
+        serializer = self.get_serializer(records, many=True)
+        return Response(
+            {
+                "version": version,
+                "reset": reset,
+                "records": serializer.data,
+                "deleted": deleted,
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
-class AddAlbumToRecordView(APIView):
+class AddAlbumToRecordView(ReadYourWritesMixin, APIView):
     """API view for adding albums to records."""
 
     permission_classes = [IsAuthenticated]
@@ -123,7 +289,164 @@ class AddAlbumToRecordView(APIView):
                 {"error": "Action type and value are required"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if not isinstance(action["value"], bool):
+            return Response(
+                {"error": "Action value must be true or false"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         action_type = action["type"]
-        process_record_album(album_id, request.user, action_type)
-        return Response({"success": True}, status=status.HTTP_200_OK)
+        with profiled(
+            "process_record_album", enabled=profiling_requested(request)
+        ) as profile:
+            process_record_album(album_id, request.user, action_type, action["value"])
+
+        data = {"success": True}
+        if profile is not None:
+            data["profile"] = profile.breakdown()
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class RecommendationView(ReadYourWritesMixin, CompactResponseMixin, APIView):
+    """API view for album recommendations based on the user's records."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Return albums similar to the ones in the user's records."""
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            return Response(
+                {"error": "Limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Imported here so numpy and scipy load on first use, not at boot.
+        from .recommendations import recommend_for_user
+
+        albums = recommend_for_user(request.user.userprofile, limit=limit)
+        if summary_requested(request):
+            serializer_class = AlbumSummarySerializer
+        else:
+            prefetch_related_objects(
+                albums, "artist", "genres", ordered_tracks_prefetch()
+            )
+            serializer_class = AlbumSerializer
+        serializer = serializer_class(albums, many=True, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class LibraryEventsView(APIView):
+    """
+    API view for the user's record-changed and sync-progress events.
+
+    Events after the cursor, the ``after`` parameter or ``Last-Event-ID``
+    header, are returned as JSON, waiting up to ``wait`` seconds for one to
+    arrive, or streamed when the client accepts ``text/event-stream``.
+    Without a cursor only events from now on are returned. The browser's
+    EventSource cannot send the Authorization header, so read the stream
+    with fetch(). Streams and waiting polls past the per-process cap get a
+    503 with ``Retry-After``.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+
+    def get(self, request):
+        """Return or stream the user's events after the cursor."""
+        cursor = request.query_params.get("after") or request.META.get(
+            "HTTP_LAST_EVENT_ID"
+        )
+        try:
+            cursor = int(cursor) if cursor else None
+            wait = float(request.query_params.get("wait", 0))
+            if not math.isfinite(wait):
+                raise ValueError(wait)
+        except ValueError:
+            return Response(
+                {"error": "Cursor must be an event ID and wait a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        userprofile_id = request.user.userprofile.pk
+        if cursor is None:
+            cursor = latest_event_id(userprofile_id)
+
+        streaming = request.accepted_renderer.format == EventStreamRenderer.format
+        wait = min(max(wait, 0), settings.LIBRARY_EVENT_MAX_WAIT)
+        if (streaming or wait) and not reader_slots.acquire():
+            response = Response(
+                {"error": "Too many open event readers, retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response["Retry-After"] = str(settings.LIBRARY_EVENT_RETRY_AFTER)
+            return response
+
+        if streaming:
+            response = StreamingHttpResponse(
+                EventStream(userprofile_id, cursor), content_type="text/event-stream"
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        try:
+            events = wait_for_events(userprofile_id, cursor, wait)
+        finally:
+            if wait:
+                reader_slots.release()
+        return Response(
+            {"events": events, "cursor": events[-1]["id"] if events else cursor},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ThumbnailBuildThrottle(AnonRateThrottle):
+    """Limit how often one client can make the server fetch and resize images."""
+
+    scope = "thumbnail_build"
+
+    def get_rate(self):
+        return getattr(settings, "THUMBNAIL_BUILD_RATE", "30/min")
+
+
+class AlbumThumbnailView(APIView):
+    """
+    API view serving locally cached album art thumbnails.
+
+    Public so ``<img>`` tags can load it. Only the configured sizes are
+    served, and requests that have to build thumbnails are throttled per
+    client; cached thumbnails are not.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk, size):
+        """Return the album's thumbnail, resized and cached on first use."""
+        from .thumbnails import (
+            get_thumbnail,
+            thumbnail_path,
+            thumbnail_sizes,
+            thumbnails_enabled,
+        )
+
+        if not thumbnails_enabled() or size not in thumbnail_sizes():
+            raise Http404
+
+        if not thumbnail_path(pk, size).exists():
+            throttle = ThumbnailBuildThrottle()
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
+        album = get_object_or_404(Album.objects.only("id", "img_url", "images"), pk=pk)
+        path = get_thumbnail(album, size)
+        if path is None:
+            raise Http404
+
+        response = FileResponse(path.open("rb"), content_type="image/jpeg")
+        patch_cache_control(
+            response, public=True, max_age=settings.THUMBNAIL_MAX_AGE, immutable=True
+        )
+        return response
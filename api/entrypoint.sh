@@ -1,6 +1,10 @@
 #!/bin/sh
-python manage.py makemigrations user albums
-pyththon manage.py makemigrations
-python manage.py migrate user albums
+export DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-MyBeautifulAlbums.settings_production}"
 python manage.py migrate
-gunicorn MyBeautifulAlbums.wsgi:application
+# Fills the album summary columns, e.g. right after they are added.
+python manage.py backfill_album_summaries
+python manage.py createcachetable
+python manage.py spectacular --file openapi.yaml
+# Runs the library syncs queued by logins, outside the web workers.
+python manage.py run_library_syncs &
+gunicorn -c gunicorn.conf.py MyBeautifulAlbums.wsgi:application
@@ -0,0 +1,13 @@
+"""
+Gunicorn settings, loaded from the working directory by ``entrypoint.sh``.
+
+The worker count comes from WEB_CONCURRENCY as usual. Each worker serves
+requests on GUNICORN_THREADS threads, as every open event stream or long
+poll on ``/events/`` holds one for up to a minute. LIBRARY_EVENT_MAX_READERS
+caps those, keeping the other threads free for regular requests.
+"""
+
+import os
+
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
@@ -1,5 +1,20 @@
 from django.contrib import admin
+
+from MyBeautifulAlbums.admin import EstimatedCountAdmin
 from .models import UserProfile, SpotifyToken
 
-admin.site.register(UserProfile)
-admin.site.register(SpotifyToken)
+
+@admin.register(UserProfile)
+class UserProfileAdmin(EstimatedCountAdmin):
+    list_display = ["id", "user"]
+    list_select_related = ["user"]
+    search_fields = ["user__username__exact"]
+    raw_id_fields = ["user"]
+
+
+@admin.register(SpotifyToken)
+class SpotifyTokenAdmin(EstimatedCountAdmin):
+    list_display = ["id", "user", "expires_at"]
+    list_select_related = ["user"]
+    search_fields = ["user__username__exact"]
+    raw_id_fields = ["user"]
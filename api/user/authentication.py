@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from MyBeautifulAlbums.db.routing import PRIMARY
+
+from .models import ClaimsUser, UserProfile
+
+USERPROFILE_CLAIM = "userprofile_id"
+
+PROFILE_FIELDS = [field.attname for field in UserProfile._meta.concrete_fields]
+
+# Least recently used first, so the oldest entries are evicted past
+# USERPROFILE_CACHE_SIZE.
+_profile_cache: OrderedDict = OrderedDict()
+_profile_cache_lock = threading.Lock()
+
+
+def get_cached_userprofile(
+    user_id, userprofile_id=None
+) -> Tuple[bool, UserProfile]:
+    """
+    Return whether the user is active and their profile, served from a
+    short-TTL in-process cache.
+
+    Only the column values are cached; every call builds a fresh instance so
+    nothing loaded onto it leaks between requests. Misses read the primary:
+    this runs before the request is pinned to it, and a replica lagging
+    behind a first login would not have the profile yet.
+    """
+    now = time.monotonic()
+    with _profile_cache_lock:
+        cached = _profile_cache.get(user_id)
+        if cached is not None:
+            _profile_cache.move_to_end(user_id)
+    if cached is None or cached[0] <= now:
+        profiles = UserProfile.objects.using(PRIMARY).filter(user_id=user_id)
+        if userprofile_id is not None:
+            profiles = profiles.filter(pk=userprofile_id)
+        values = profiles.values(*PROFILE_FIELDS, "user__is_active").first()
+        if values is None:
+            raise UserProfile.DoesNotExist
+        cached = (now + getattr(settings, "USERPROFILE_CACHE_TTL", 30), values)
+        with _profile_cache_lock:
+            _profile_cache[user_id] = cached
+            _profile_cache.move_to_end(user_id)
+            while len(_profile_cache) > getattr(
+                settings, "USERPROFILE_CACHE_SIZE", 10_000
+            ):
+                _profile_cache.popitem(last=False)
+
+    values = cached[1]
+    profile = UserProfile.from_db(
+        router.db_for_read(UserProfile),
+        PROFILE_FIELDS,
+        [values[field] for field in PROFILE_FIELDS],
+    )
+    return values["user__is_active"], profile
+
+
+def invalidate_cached_userprofile(user_id) -> None:
+    with _profile_cache_lock:
+        _profile_cache.pop(user_id, None)
+
+
+def claims_user(user_id, profile: UserProfile) -> ClaimsUser:
+    """
+    Return a user with only its ID loaded and the profile attached.
+
+    It is a ``User`` model instance, so it can be passed to the ORM; the
+    other fields are loaded when a view first reads one of them.
+    """
+    user = ClaimsUser.from_db(profile._state.db, ["id", "is_active"], [user_id, True])
+    User.userprofile.related.set_cached_value(user, profile)
+    UserProfile.user.field.set_cached_value(profile, user)
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that skips the per-request ``User`` lookup."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            is_active, profile = get_cached_userprofile(
+                user_id, validated_token.get(USERPROFILE_CLAIM)
+            )
+        except UserProfile.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return claims_user(user_id, profile)
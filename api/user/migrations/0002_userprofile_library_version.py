@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='library_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_claimsuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='library_sync_requested_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -8,6 +8,12 @@ class UserProfile(models.Model):
         User, related_name="userprofile", on_delete=models.CASCADE
     )
     img_profile_url = models.URLField(blank=True, null=True)
+    # Bumped on every change to the user's records; see Record.version.
+    library_version = models.BigIntegerField(default=0)
+    # When the library sync queued for run_library_syncs is due, if any.
+    library_sync_requested_at = models.DateTimeField(
+        blank=True, null=True, db_index=True
+    )
 
     def __str__(self):
         return self.user.username
@@ -17,6 +23,23 @@ class UserProfile(models.Model):
         verbose_name_plural = "User Profiles"
 
 
+class ClaimsUser(User):
+    """
+    User authenticated from access token claims, with only its ID loaded.
+
+    Reading any other field loads the rest of the row in one query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred:
+            fields = {*fields, *deferred}
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+
 class SpotifyToken(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     s_access_token = models.CharField(max_length=255)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import UserProfile
 from django.contrib.auth.models import User
-from albums.serializers import RecordSerializer
+from albums.responses import summary_requested
+from albums.serializers import RecordSerializer, RecordSummarySerializer
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -19,6 +20,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ["user", "img_profile_url", "records"]
 
     def get_records(self, obj):
+        request = self.context.get("request")
+        if request is not None and summary_requested(request):
+            records = obj.records.select_related("album")
+            return RecordSummarySerializer(
+                records, many=True, context=self.context
+            ).data
+
         records = (
             obj.records.all()
             .select_related("album")
@@ -1,12 +1,47 @@
-from typing import Tuple, Any, Dict, List, Optional
+import time
+from typing import Tuple, Any, Dict, Iterator, List, Optional
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router, transaction
 from django.utils import timezone
 from rest_framework.exceptions import status
 from rest_framework.response import Response
 import requests
+from requests.adapters import HTTPAdapter
 
+from MyBeautifulAlbums import fastjson
+from MyBeautifulAlbums.profiling import span
 
-from .models import SpotifyToken
+from .authentication import invalidate_cached_userprofile
+from .models import SpotifyToken, UserProfile
+
+
+def _create_spotify_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=getattr(settings, "SPOTIFY_POOL_SIZE", 20)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared by every Spotify call so connections and TLS sessions are reused.
+spotify_session = _create_spotify_session()
+
+# The largest page /me/albums allows.
+SPOTIFY_LIBRARY_PAGE_SIZE = 50
+
+# Statuses worth retrying after Retry-After, or a second by default.
+SPOTIFY_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after(response: requests.Response, default: float = 1) -> float:
+    """Seconds Spotify asked us to wait before the next request."""
+    try:
+        return max(float(response.headers["Retry-After"]), 0)
+    except (KeyError, ValueError):
+        return default
 
 
 def requests_token_spotify(request) -> Response | Tuple[str, int, int]:
@@ -19,7 +54,7 @@ def requests_token_spotify(request) -> Response | Tuple[str, int, int]:
             {"error": "No code provided"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    token_url = "https://accounts.spotify.com/api/token"
+    token_url = f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token"
     payload = {
         "grant_type": "authorization_code",
         "code": code,
@@ -30,9 +65,9 @@ def requests_token_spotify(request) -> Response | Tuple[str, int, int]:
     }
 
     try:
-        response = requests.post(token_url, data=payload)
+        response = spotify_session.post(token_url, data=payload)
         response.raise_for_status()
-        response_data = response.json()
+        response_data = fastjson.loads(response.content)
 
         if "error" in response_data:
             return Response(
@@ -52,7 +87,7 @@ def requests_token_spotify(request) -> Response | Tuple[str, int, int]:
 
         return access_token, refresh_token, expires_in
 
-    except requests.RequestException:
+    except (requests.RequestException, ValueError):
         return Response(
             {"error": "Failed to communicate with Spotify API"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -63,10 +98,10 @@ def fetch_user_spotify(request, access_token: str) -> Response | Dict[str, Any]:
     """
     Fetch user information from Spotify API.
     """
-    user_info_url = "https://api.spotify.com/v1/me"
+    user_info_url = f"{settings.SPOTIFY_API_URL}/me"
     headers = {"Authorization": f"Bearer {access_token}"}
-    user_info_response = requests.get(user_info_url, headers=headers)
-    user_info = user_info_response.json()
+    user_info_response = spotify_session.get(user_info_url, headers=headers)
+    user_info = fastjson.loads(user_info_response.content)
 
     if "error" in user_info:
         return Response(
@@ -80,8 +115,8 @@ def refresh_spotify_token(refresh_token: str) -> Optional[Tuple[str, str, int]]:
     """
     Refresh the Spotify access token using the refresh token.
     """
-    response = requests.post(
-        "https://accounts.spotify.com/api/token",
+    response = spotify_session.post(
+        f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token",
         data={
             "grant_type": "refresh_token",
             "refresh_token": refresh_token,
@@ -91,7 +126,7 @@ def refresh_spotify_token(refresh_token: str) -> Optional[Tuple[str, str, int]]:
     )
 
     if response.status_code == 200:
-        data = response.json()
+        data = fastjson.loads(response.content)
         return (
             data["access_token"],
             data.get("refresh_token", refresh_token),
@@ -100,12 +135,48 @@ def refresh_spotify_token(refresh_token: str) -> Optional[Tuple[str, str, int]]:
     return None
 
 
+_app_token: Dict[str, Any] = {}
+
+
+def get_app_spotify_token() -> Optional[str]:
+    """
+    Get an app access token with the client credentials flow.
+
+    Used for catalog reads that are not made on behalf of a user, e.g. admin
+    refreshes. The token is cached until shortly before it expires.
+    """
+    if _app_token and _app_token["expires_at"] > timezone.now():
+        return _app_token["access_token"]
+
+    try:
+        response = spotify_session.post(
+            f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token",
+            data={
+                "grant_type": "client_credentials",
+                "client_id": settings.SPOTIFY_CLIENT_ID,
+                "client_secret": settings.SPOTIFY_CLIENT_SECRET,
+            },
+        )
+        response.raise_for_status()
+        data = fastjson.loads(response.content)
+    except (requests.RequestException, ValueError):
+        return None
+
+    _app_token.update(
+        access_token=data["access_token"],
+        expires_at=timezone.now()
+        + timezone.timedelta(seconds=data.get("expires_in", 3600) - 60),
+    )
+    return _app_token["access_token"]
+
+
+@span("token")
 def get_spotify_token(user) -> Optional[SpotifyToken]:
     """
     Get a valid Spotify token for the given user, refreshing if necessary.
     """
     try:
-        token = SpotifyToken.objects.get(user=user)
+        token = SpotifyToken.objects.get(user_id=user.pk)
         if token.expires_at <= timezone.now():
             new_token = refresh_spotify_token(token.s_refresh_token)
             if new_token is None:
@@ -120,28 +191,105 @@ def get_spotify_token(user) -> Optional[SpotifyToken]:
         return None
 
 
-def fetch_user_spotify_albums(access_token: str) -> List[str]:
+def iter_user_spotify_albums(access_token: str) -> Iterator[Dict[str, Any]]:
     """
-    Fetch the user's saved albums from Spotify.
+    Yield the album payloads embedded in the user's saved albums, page by page.
+
+    Pages are requested SPOTIFY_LIBRARY_PAGE_SIZE at a time over the shared
+    session, and each album is yielded as soon as its page is parsed.
+
+    Rate-limited and failed pages are retried up to SPOTIFY_MAX_RETRIES times,
+    waiting as long as Retry-After asks unless that exceeds
+    SPOTIFY_MAX_RETRY_AFTER. Past that an HTTPError is raised, so a library is
+    never reported as complete when pages are missing.
     """
-    url = "https://api.spotify.com/v1/me/albums"
+    url = f"{settings.SPOTIFY_API_URL}/me/albums"
+    params = {"limit": SPOTIFY_LIBRARY_PAGE_SIZE}
     headers = {"Authorization": f"Bearer {access_token}"}
-    album_ids = []
+    max_retries = getattr(settings, "SPOTIFY_MAX_RETRIES", 3)
+    max_retry_after = getattr(settings, "SPOTIFY_MAX_RETRY_AFTER", 30)
 
     while url:
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            break
+        for attempt in range(max_retries + 1):
+            with span("fetch.library"):
+                response = spotify_session.get(url, params=params, headers=headers)
+            if response.status_code not in SPOTIFY_RETRY_STATUSES:
+                break
+            wait = retry_after(response)
+            if attempt == max_retries or wait > max_retry_after:
+                break
+            time.sleep(wait)
+        response.raise_for_status()
 
-        data = response.json()
-        items = data.get("items", [])
+        with span("parse"):
+            data = fastjson.loads(response.content)
+        for item in data.get("items", []):
+            album = item.get("album")
+            if album and album.get("id"):
+                yield album
+
+        # The next URL already carries limit and offset.
+        url, params = data.get("next"), None
 
-        album_ids.extend(
-            item.get("album", {}).get("id")
-            for item in items
-            if item.get("album", {}).get("id")
-        )
 
-        url = data.get("next")
+def fetch_user_spotify_albums(access_token: str) -> List[str]:
+    """
+    Fetch the IDs of the user's saved albums from Spotify.
+    """
+    return [album["id"] for album in iter_user_spotify_albums(access_token)]
+
+
+def login_spotify_user(
+    user_info: Dict[str, Any], access_token: str, refresh_token: str, expires_in: int
+) -> Tuple[User, UserProfile, bool]:
+    """
+    Create or update the user, profile and Spotify token in one transaction.
+
+    The profile and token are written with single-statement upserts instead
+    of a lookup followed by an update.
+    """
+    images = user_info.get("images") or [{}]
+    img_profile_url = images[min(1, len(images) - 1)].get("url", "")
+
+    with transaction.atomic():
+        user, created = User.objects.get_or_create(
+            username=user_info["id"],
+            defaults={
+                "first_name": user_info.get("display_name") or "",
+                "email": user_info.get("email", ""),
+            },
+        )
+        (userprofile,) = UserProfile.objects.bulk_create(
+            [UserProfile(user=user, img_profile_url=img_profile_url)],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["img_profile_url"],
+        )
+        if userprofile.pk is None:
+            # Backends without RETURNING on upserts leave the pk unset.
+            userprofile = UserProfile.objects.using(
+                router.db_for_write(UserProfile)
+            ).get(user=user)
+        SpotifyToken.objects.bulk_create(
+            [
+                SpotifyToken(
+                    user=user,
+                    s_access_token=access_token,
+                    s_refresh_token=refresh_token,
+                    s_expires_in=expires_in,
+                    expires_at=timezone.now()
+                    + timezone.timedelta(seconds=expires_in),
+                )
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=[
+                "s_access_token",
+                "s_refresh_token",
+                "s_expires_in",
+                "expires_at",
+            ],
+        )
 
-    return album_ids
+    invalidate_cached_userprofile(user.pk)
+    return user, userprofile, created
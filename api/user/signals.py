@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_userprofile
+from .models import ClaimsUser, UserProfile
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_userprofile_cache(sender, instance, **kwargs):
+    """Drop the cached profile so this process stops serving stale values."""
+    invalidate_cached_userprofile(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def invalidate_userprofile_cache_on_user_change(sender, instance, **kwargs):
+    """Drop the cached profile so a deactivated user is rejected right away."""
+    invalidate_cached_userprofile(instance.pk)
@@ -1,3 +1,146 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from albums.models import Album, Record
+from albums.tasks import claim_library_sync, submit_library_sync
+from .authentication import USERPROFILE_CLAIM, _profile_cache, get_cached_userprofile
+from .models import SpotifyToken, UserProfile
+from .services import login_spotify_user
+
+
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="listener")
+        self.profile = UserProfile.objects.create(user=self.user)
+        token = RefreshToken.for_user(self.user)
+        token[USERPROFILE_CLAIM] = self.profile.pk
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.access_token}")
+
+    def test_profile_requests_skip_the_user_and_profile_lookups(self):
+        self.client.get("/profile/")
+
+        # The serialized user row, loaded once, and the records feed.
+        with self.assertNumQueries(2):
+            response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["username"], "listener")
+
+    def test_request_user_can_be_passed_to_the_orm(self):
+        SpotifyToken.objects.create(
+            user=self.user, s_access_token="access", s_refresh_token="refresh"
+        )
+
+        response = self.client.post(
+            "/spotify/refresh-token/", {"refresh_token": ""}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        request_user = response.wsgi_request.user
+        self.assertIsInstance(request_user, User)
+        self.assertTrue(SpotifyToken.objects.filter(user=request_user).exists())
+        Record.objects.create(
+            userprofile=request_user.userprofile,
+            album=Album.objects.create(name="Album"),
+        )
+        self.assertEqual(
+            Record.objects.filter(userprofile__user=request_user).count(), 1
+        )
+
+    def test_deactivated_users_are_rejected(self):
+        self.assertEqual(self.client.get("/profile/").status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "user_inactive")
+
+    @override_settings(USERPROFILE_CACHE_SIZE=2)
+    def test_profile_cache_evicts_the_least_recently_used(self):
+        _profile_cache.clear()
+        others = [
+            UserProfile.objects.create(user=User.objects.create(username=name))
+            for name in ["first", "second"]
+        ]
+
+        get_cached_userprofile(self.user.pk)
+        get_cached_userprofile(others[0].user_id)
+        get_cached_userprofile(self.user.pk)
+        get_cached_userprofile(others[1].user_id)
+
+        self.assertEqual(list(_profile_cache), [self.user.pk, others[1].user_id])
+
+
+class TokenResponseTests(TestCase):
+    def test_token_responses_are_not_cached_or_compressed_with_brotli(self):
+        import gzip
+
+        user = User.objects.create(username="listener")
+        UserProfile.objects.create(user=user)
+        SpotifyToken.objects.create(
+            user=user, s_access_token="access", s_refresh_token="refresh"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch(
+            "user.views.refresh_spotify_token",
+            return_value=("a" * 200, "r" * 200, 3600),
+        ):
+            response = client.post(
+                "/spotify/refresh-token/",
+                {"refresh_token": "refresh"},
+                format="json",
+                HTTP_ACCEPT_ENCODING="gzip, br",
+            )
+
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn(b"a" * 200, gzip.decompress(response.content))
+
+
+class LoginSpotifyUserTests(TestCase):
+    user_info = {"id": "listener", "display_name": "Listener", "images": []}
+
+    def test_returns_the_existing_profile_on_later_logins(self):
+        _, first, created = login_spotify_user(self.user_info, "a1", "r1", 3600)
+        _, second, created_again = login_spotify_user(self.user_info, "a2", "r2", 3600)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(SpotifyToken.objects.get().s_access_token, "a2")
+
+    def test_reads_the_profile_back_when_the_upsert_returns_no_pk(self):
+        _, existing, _ = login_spotify_user(self.user_info, "a1", "r1", 3600)
+
+        with mock.patch.object(
+            UserProfile.objects,
+            "bulk_create",
+            side_effect=lambda profiles, **kwargs: profiles,
+        ):
+            _, profile, _ = login_spotify_user(self.user_info, "a2", "r2", 3600)
+
+        self.assertEqual(profile.pk, existing.pk)
+
+
+class LibrarySyncQueueTests(TestCase):
+    def test_queued_syncs_are_claimed_once_oldest_first(self):
+        first = UserProfile.objects.create(user=User.objects.create(username="first"))
+        second = UserProfile.objects.create(
+            user=User.objects.create(username="second")
+        )
+
+        self.assertTrue(submit_library_sync(first.user_id))
+        self.assertTrue(submit_library_sync(second.user_id))
+        self.assertFalse(submit_library_sync(first.user_id))
+
+        self.assertEqual(claim_library_sync(), first.user_id)
+        self.assertEqual(claim_library_sync(), second.user_id)
+        self.assertIsNone(claim_library_sync())
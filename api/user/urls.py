@@ -1,5 +1,6 @@
 from rest_framework import routers
 from django.urls import include, path
+from django.views.decorators.cache import never_cache
 from .views import (
     SpotifyAuthView,
     SpotifyCallbackView,
@@ -15,7 +16,7 @@ urlpatterns = [
     path("", include(router.urls)),
     path("spotify/login/", SpotifyAuthView.as_view(), name="spotify-login"),
     path("spotify/callback/", SpotifyCallbackView.as_view(), name="spotify-callback"),
-    path("refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("refresh/", never_cache(TokenRefreshView.as_view()), name="token_refresh"),
     path(
         "spotify/refresh-token/",
         SpotifyRefreshTokenView.as_view(),
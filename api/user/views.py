@@ -1,4 +1,5 @@
-from django.contrib.auth.models import User, timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
@@ -8,7 +9,12 @@ from rest_framework.settings import settings
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from albums.services import process_user_album
+from MyBeautifulAlbums.db.routing import ReadYourWritesMixin
+from MyBeautifulAlbums.profiling import profiled, profiling_requested
+from albums.responses import CompactResponseMixin
+from albums.services import sync_user_library
+from albums.tasks import submit_library_sync
+from .authentication import USERPROFILE_CLAIM
 from .models import SpotifyToken, UserProfile
 from .serializers import (
     SpotifyAuthSerializer,
@@ -17,14 +23,15 @@ from .serializers import (
 )
 from .services import (
     fetch_user_spotify,
-    fetch_user_spotify_albums,
-    get_spotify_token,
+    login_spotify_user,
     refresh_spotify_token,
     requests_token_spotify,
 )
 
 
 class UserProfileViewSet(
+    ReadYourWritesMixin,
+    CompactResponseMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -54,24 +61,20 @@ class UserProfileViewSet(
     @action(detail=False, methods=["POST"])
     def sync_spotify_library(self, request):
         """Sync the user's Spotify library."""
-        user = request.user
-        spotify_token = get_spotify_token(user)
-
-        if not spotify_token:
+        with profiled(
+            "sync_spotify_library", enabled=profiling_requested(request)
+        ) as profile:
+            synced = sync_user_library(request.user)
+        if not synced:
             return Response(
                 {"error": "No Spotify token found"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        albums = fetch_user_spotify_albums(spotify_token.s_access_token)
-
-        for album_id in albums:
-            process_user_album(album_id, user)
-
-        return Response(
-            {"message": "Library synced successfully"},
-            status=status.HTTP_200_OK,
-        )
+        data = {"message": "Library synced successfully"}
+        if profile is not None:
+            data["profile"] = profile.breakdown()
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class SpotifyAuthView(GenericAPIView):
@@ -83,7 +86,7 @@ class SpotifyAuthView(GenericAPIView):
         """Get the Spotify authentication URL."""
         scope = "user-library-read user-read-private user-read-email"
         auth_url = (
-            "https://accounts.spotify.com/authorize"
+            f"{settings.SPOTIFY_ACCOUNTS_URL}/authorize"
             "?response_type=code"
             f"&client_id={settings.SPOTIFY_CLIENT_ID}"
             f"&redirect_uri={settings.SPOTIFY_REDIRECT_URI}"
@@ -94,6 +97,7 @@ class SpotifyAuthView(GenericAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@method_decorator(never_cache, name="dispatch")
 class SpotifyCallbackView(GenericAPIView):
     """View for handling Spotify callback."""
 
@@ -110,31 +114,14 @@ class SpotifyCallbackView(GenericAPIView):
         if isinstance(user_info, Response):
             return user_info
 
-        user, created = User.objects.get_or_create(
-            username=user_info["id"], first_name=user_info["display_name"]
+        user, userprofile, created = login_spotify_user(
+            user_info, s_access_token, s_refresh_token, s_expires_in
         )
         if created:
-            user.email = user_info.get("email", "")
-            user.save()
-
-        UserProfile.objects.update_or_create(
-            user=user,
-            defaults={
-                "img_profile_url": user_info.get("images", [{}])[1].get("url", "")
-            },
-        )
-
-        SpotifyToken.objects.update_or_create(
-            user=user,
-            defaults={
-                "s_access_token": s_access_token,
-                "s_refresh_token": s_refresh_token,
-                "s_expires_in": s_expires_in,
-                "expires_at": timezone.now() + timezone.timedelta(seconds=s_expires_in),
-            },
-        )
+            submit_library_sync(user.pk)
 
         refresh = RefreshToken.for_user(user)
+        refresh[USERPROFILE_CLAIM] = userprofile.pk
         access_token = str(refresh.access_token)
 
         response_data = {
@@ -148,6 +135,7 @@ class SpotifyCallbackView(GenericAPIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+@method_decorator(never_cache, name="dispatch")
 class SpotifyRefreshTokenView(APIView):
     """View for refreshing Spotify token."""
 
@@ -156,7 +144,7 @@ class SpotifyRefreshTokenView(APIView):
     def post(self, request):
         """Refresh the Spotify access token."""
         user = request.user
-        spotify_token = SpotifyToken.objects.get(user=user)
+        spotify_token = SpotifyToken.objects.get(user_id=user.pk)
 
         refresh_token = request.data.get("refresh_token")
         if not refresh_token:
@@ -13,6 +13,7 @@ import { AlbumCard } from "@/components/album-card";
 import { withAuth } from "@/components/withAuth";
 import { useAuth } from "@/hooks/useAuth";
 import { syncSpotifyLibrary } from "@/api/spotify";
+import { AlbumImage, pickAlbumImage } from "@/types";
 import {
   HeadphonesIcon,
   HeartIcon,
@@ -32,8 +33,9 @@ interface UserProfile {
       id: string;
       spotify_id: string;
       name: string;
-      artist: Array<{ name: string }>;
+      primary_artist_name: string;
       img_url: string;
+      images?: AlbumImage[];
       release_date: string;
     };
     is_liked: boolean;
@@ -75,7 +77,7 @@ function ProfilePage() {
   const fetchProfile = async () => {
     try {
       console.log("Fetching profile...");
-      const data = await fetchWithToken(false, `${BASE_URL}/profile/`);
+      const data = await fetchWithToken(false, `${BASE_URL}/profile/?shape=summary`);
 
       console.log("Fetched profile data:", data);
       setProfile(data);
@@ -246,9 +248,13 @@ function ProfilePage() {
           <AlbumCard
             key={index}
             albumId={record.album.spotify_id.toString()}
-            artist={record.album.artist[0]?.name || "Unknown Artist"}
+            artist={record.album.primary_artist_name || "Unknown Artist"}
             id={record.album.id}
-            imageUrl={record.album.img_url}
+            imageUrl={pickAlbumImage(
+              record.album.images,
+              300,
+              record.album.img_url,
+            )}
             isLiked={record.is_liked}
             isListened={record.is_listened}
             isLoved={record.is_loved}
@@ -3,3 +3,25 @@ import { SVGProps } from "react";
 export type IconSvgProps = SVGProps<SVGSVGElement> & {
   size?: number;
 };
+
+export interface AlbumImage {
+  url: string;
+  width: number | null;
+  height: number | null;
+}
+
+export const pickAlbumImage = (
+  images: AlbumImage[] | undefined,
+  minWidth: number,
+  fallback: string,
+): string => {
+  const sorted = [...(images ?? [])].sort(
+    (a, b) => (a.width ?? 0) - (b.width ?? 0),
+  );
+
+  return (
+    sorted.find((image) => (image.width ?? 0) >= minWidth)?.url ??
+    sorted[sorted.length - 1]?.url ??
+    fallback
+  );
+};